@@ -131,6 +131,61 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# キャッシュ（既定はファイルベース。gunicorn の全ワーカーで共有される）
+# 複数台構成では CACHE_BACKEND に django.core.cache.backends.redis.RedisCache などを指定する
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        # ページ・API のキャッシュは条件ごとにキーが増えるため、既定の 300 件より多く保持する
+        # （追い出された世代番号は新しい番号で始め直すので、古いキャッシュは使われない）
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '20000')),
+        },
+    }
+}
+
+# かな正規化 n-gram インデックス（全ワーカーで mmap して共有）
+KANA_INDEX_PATH = Path(os.environ.get('KANA_INDEX_PATH', BASE_DIR / 'kana_index' / 'ngram.idx'))
+# 追記ログがこの件数に達したらインデックスを統合し直す
+KANA_INDEX_DELTA_LIMIT = int(os.environ.get('KANA_INDEX_DELTA_LIMIT', '500'))
+
+# Supabase Storage へのアップロード
+# SUPABASE_RESUMABLE_THRESHOLD を超えるファイルは TUS 方式で分割し、失敗時は続きから再開する
+# （Supabase の TUS エンドポイントは最後以外のチャンクを 6MB にする必要がある）
+SUPABASE_UPLOAD_CHUNK_SIZE = int(os.environ.get('SUPABASE_UPLOAD_CHUNK_SIZE', str(6 * 1024 * 1024)))
+SUPABASE_RESUMABLE_THRESHOLD = int(os.environ.get('SUPABASE_RESUMABLE_THRESHOLD', str(6 * 1024 * 1024)))
+SUPABASE_UPLOAD_MAX_RETRIES = int(os.environ.get('SUPABASE_UPLOAD_MAX_RETRIES', '5'))
+# 一括アップロード・削除などで同時に使う接続数（ワーカープロセスごと）
+SUPABASE_STORAGE_MAX_WORKERS = int(os.environ.get('SUPABASE_STORAGE_MAX_WORKERS', '8'))
+
+# アップロードされたファイルをワーカーが送信するまで置いておくディレクトリ
+# （Web とワーカーを別のサーバーで動かす場合は共有ストレージを指定する）
+UPLOAD_SPOOL_DIR = Path(os.environ.get('UPLOAD_SPOOL_DIR', BASE_DIR / 'upload_spool'))
+
+# メディア配信（/files/）のローカルキャッシュ。Supabase Storage から取得したファイルを置き、
+# 合計サイズが MEDIA_CACHE_MAX_SIZE を超えたら最後に使われたのが古いものから削除する
+# MEDIA_CACHE_MAX_OBJECT_SIZE を超えるファイルはキャッシュせず、ストレージの公開URLへ転送する
+MEDIA_CACHE_DIR = Path(os.environ.get('MEDIA_CACHE_DIR', BASE_DIR / 'media_cache'))
+MEDIA_CACHE_MAX_SIZE = int(os.environ.get('MEDIA_CACHE_MAX_SIZE', str(10 * 1024 * 1024 * 1024)))
+MEDIA_CACHE_MAX_OBJECT_SIZE = int(os.environ.get('MEDIA_CACHE_MAX_OBJECT_SIZE', str(1024 * 1024 * 1024)))
+
+# 動画のポスターフレームの切り出しに使う ffmpeg（画像のサムネイルは Pillow で作成）
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+# テスト用データベースはモデルから作る（language_archive/test_runner.py を参照）
+TEST_RUNNER = 'language_archive.test_runner.ArchiveTestRunner'
+
+# 音声波形の作成に使うデコーダー（先頭から順に対応できるものを使う）
+AUDIO_DECODERS = [
+    'language_archive.waveforms.WavDecoder',
+    'language_archive.waveforms.FFmpegDecoder',
+]
+
+# 住所・座標の変換（国土地理院API）。結果は GeocodeCache テーブルにキャッシュする
+# 1 にするとAPIに問い合わせず、キャッシュと集落テーブルだけで答える（オフライン環境・テスト用）
+GEOCODING_OFFLINE = os.environ.get('GEOCODING_OFFLINE', '0') == '1'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
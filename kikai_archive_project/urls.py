@@ -42,6 +42,12 @@ urlpatterns = [
     path('geographic/', views.geographic_list, name='geographic_list'),
     path('geographic/upload/', views.upload_geographic_record, name='upload_geographic_record'),
     
+    # 一括ダウンロード
+    path('export/<str:kind>/', views.export_records, name='export_records'),
+    
+    # メディアファイルの配信（ローカルキャッシュ経由）
+    path('files/<str:kind>/<int:object_id>/', views.media_file, name='media_file'),
+    
     # 集落関連
     path('village/<int:village_id>/records/', views.village_records, name='village_records'),
     
@@ -50,6 +56,14 @@ urlpatterns = [
     
     # API
     path('api/village/<int:village_id>/records/', views.get_village_records_api, name='api_village_records'),
+    path('api/map/features/', views.map_features_api, name='api_map_features'),
+    path('api/map/clusters/', views.map_clusters_api, name='api_map_clusters'),
+    path('api/map/popup/<str:kind>/<int:object_id>/', views.map_popup, name='api_map_popup'),
+    path('api/records/<int:record_id>/waveform/', views.record_waveform_api, name='api_record_waveform'),
+    path('api/uploads/<int:job_id>/', views.upload_job_status_api, name='api_upload_status'),
+    path('api/stats/', views.stats_api, name='api_stats'),
+    path('api/v2/<str:resource>/', views.api_v2_list, name='api_v2_list'),
+    path('api/v2/<str:resource>/<int:object_id>/', views.api_v2_detail, name='api_v2_detail'),
 ]
 # 開発環境でのメディアファイル配信
 if settings.DEBUG:
@@ -1,7 +1,7 @@
 # language_archive/admin.py
 
 from django.contrib import admin
-from .models import Village, Speaker, OnomatopoeiaType, LanguageRecord, GeographicRecord
+from .models import Village, Speaker, OnomatopoeiaType, LanguageRecord, GeographicRecord, UploadJob, AudioWaveform, GeocodeCache, ArchiveStatistic
 
 @admin.register(Village)
 class VillageAdmin(admin.ModelAdmin):
@@ -28,11 +28,11 @@ class OnomatopoeiaTypeAdmin(admin.ModelAdmin):
 @admin.register(LanguageRecord)
 class LanguageRecordAdmin(admin.ModelAdmin):
     list_display = ['onomatopoeia_text', 'file_type', 'village', 'speaker', 'language_frequency','recorded_date']
-    list_filter = ['file_type', 'speaker__village', 'recorded_date', 'onomatopoeia_type','language_frequency']
+    list_filter = ['file_type', 'upload_status', 'speaker__village', 'recorded_date', 'onomatopoeia_type','language_frequency']
     search_fields = ['onomatopoeia_text', 'meaning']
     date_hierarchy = 'recorded_date'
     list_per_page = 20
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['mora_pattern', 'created_at', 'updated_at']
 
     autocomplete_fields = ['speaker', 'village', 'onomatopoeia_type']
     
@@ -94,11 +94,45 @@ def save_model(self, request, obj, form, change):
 @admin.register(GeographicRecord)
 class GeographicRecordAdmin(admin.ModelAdmin):
     list_display = ['title', 'content_type', 'village', 'captured_date']
-    list_filter = ['content_type', 'village', 'captured_date']
+    list_filter = ['content_type', 'upload_status', 'village', 'captured_date']
     search_fields = ['title', 'description']
     date_hierarchy = 'captured_date'
     list_per_page = 20
-    readonly_fields = ['created_at']
+    readonly_fields = ['geohash', 'created_at']
     autocomplete_fields = ['village']
 
+
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ['original_name', 'status', 'progress', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status']
+    search_fields = ['original_name', 'object_name']
+    list_per_page = 20
+    readonly_fields = ['language_record', 'geographic_record', 'bytes_sent', 'upload_url', 'attempts', 'error', 'locked_at', 'created_at', 'updated_at']
+
+
+@admin.register(AudioWaveform)
+class AudioWaveformAdmin(admin.ModelAdmin):
+    list_display = ['record', 'duration', 'sample_rate', 'updated_at']
+    list_per_page = 20
+    exclude = ['peaks']
+    readonly_fields = ['record', 'duration', 'sample_rate', 'resolutions', 'created_at', 'updated_at']
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ['key', 'kind', 'address', 'latitude', 'longitude', 'found', 'updated_at']
+    list_filter = ['kind', 'found']
+    search_fields = ['key', 'address']
+    list_per_page = 20
+
+
+@admin.register(ArchiveStatistic)
+class ArchiveStatisticAdmin(admin.ModelAdmin):
+    list_display = ['key', 'value', 'updated_at']
+    search_fields = ['key']
+    list_per_page = 50
+    readonly_fields = ['key', 'value', 'updated_at']
+
+
 # Register your models here.
@@ -0,0 +1,344 @@
+# language_archive/api_v2.py
+
+import hashlib
+import json
+from urllib.parse import urlencode
+from django.core.serializers.json import DjangoJSONEncoder
+from .caching import PAGE_TIMEOUT, get_or_build, versioned_key
+from .exports import filter_geographic_records, filter_language_records
+from .models import GeographicRecord, LanguageRecord, Speaker, Village
+
+# 1ページの件数（?limit= の既定値と上限）
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# ?ids= で一度に指定できる件数
+MAX_IDS = 500
+
+# 整数の指定の上限（データベースの 64 ビット整数に収まらない値は 400 にする）
+MAX_ID = 2 ** 63 - 1
+
+# ページ送り・項目選択の条件（全リソース共通）
+PAGE_PARAMETERS = ('fields', 'cursor', 'limit', 'ids')
+
+# リソースごとの絞り込み条件。キャッシュキーにはこれと PAGE_PARAMETERS だけを含める
+FILTER_PARAMETERS = {
+    'records': ('village', 'file_type', 'onomatopoeia_type', 'pattern', 'speaker'),
+    'speakers': ('village',),
+    'villages': (),
+    'geographic': ('content_type', 'village'),
+}
+
+# 公開する項目 {項目名: (参照するフィールド, 表示名の選択肢)}。
+# 関連先の項目も values() の結合で1回のクエリにまとめる
+API_FIELDS = {
+    'records': {
+        'id': ('id', None),
+        'onomatopoeia': ('onomatopoeia_text', None),
+        'mora_pattern': ('mora_pattern', None),
+        'meaning': ('meaning', None),
+        'usage_example': ('usage_example', None),
+        'phonetic_notation': ('phonetic_notation', None),
+        'language_frequency': ('language_frequency', None),
+        'language_frequency_display': ('language_frequency', dict(LanguageRecord.FREQUENCY_CHOICES)),
+        'file_type': ('file_type', None),
+        'file_path': ('file_path', None),
+        'thumbnail_path': ('thumbnail_path', None),
+        'recorded_date': ('recorded_date', None),
+        'speaker_id': ('speaker_id', None),
+        'speaker_code': ('speaker__speaker_id', None),
+        'speaker_age_range': ('speaker__age_range', None),
+        'speaker_gender': ('speaker__gender', None),
+        'village_id': ('speaker__village_id', None),
+        'village_name': ('speaker__village__name', None),
+        'related_village_id': ('village_id', None),
+        'type_code': ('onomatopoeia_type__type_code', None),
+        'type_name': ('onomatopoeia_type__type_name', None),
+        'notes': ('notes', None),
+        'created_at': ('created_at', None),
+        'updated_at': ('updated_at', None),
+    },
+    'speakers': {
+        'id': ('id', None),
+        'speaker_code': ('speaker_id', None),
+        'age_range': ('age_range', None),
+        'age_range_display': ('age_range', dict(Speaker.AGE_RANGE_CHOICES)),
+        'gender': ('gender', None),
+        'gender_display': ('gender', dict(Speaker.GENDER_CHOICES)),
+        'village_id': ('village_id', None),
+        'village_name': ('village__name', None),
+        'consent_video': ('consent_video', None),
+    },
+    'villages': {
+        'id': ('id', None),
+        'name': ('name', None),
+        'latitude': ('latitude', None),
+        'longitude': ('longitude', None),
+        'description': ('description', None),
+    },
+    'geographic': {
+        'id': ('id', None),
+        'title': ('title', None),
+        'content_type': ('content_type', None),
+        'content_type_display': ('content_type', dict(GeographicRecord.CONTENT_TYPE_CHOICES)),
+        'description': ('description', None),
+        'file_path': ('file_path', None),
+        'thumbnail_path': ('thumbnail_path', None),
+        'latitude': ('latitude', None),
+        'longitude': ('longitude', None),
+        'geohash': ('geohash', None),
+        'village_id': ('village_id', None),
+        'village_name': ('village__name', None),
+        'captured_date': ('captured_date', None),
+        'created_at': ('created_at', None),
+    },
+}
+
+# ?fields= を省略したときの項目（一覧の表示に必要なものだけにして通信量を抑える）
+DEFAULT_FIELDS = {
+    'records': [
+        'id', 'onomatopoeia', 'mora_pattern', 'meaning', 'language_frequency', 'file_type',
+        'thumbnail_path', 'recorded_date', 'speaker_id', 'village_id', 'type_code',
+    ],
+    'speakers': ['id', 'speaker_code', 'age_range', 'gender', 'village_id'],
+    'villages': ['id', 'name', 'latitude', 'longitude'],
+    'geographic': [
+        'id', 'title', 'content_type', 'thumbnail_path', 'latitude', 'longitude', 'village_id', 'captured_date',
+    ],
+}
+
+
+class ApiError(Exception):
+    """リクエストの指定が不正なエラー（400 を返す）"""
+
+
+def _filter_speakers(speakers, params):
+    village_id = _parse_id(params.get('village'), 'village')
+    if village_id is not None:
+        speakers = speakers.filter(village_id=village_id)
+    return speakers
+
+
+def _filter_records(records, params):
+    _parse_id(params.get('village'), 'village')
+    records = filter_language_records(records, params)
+    speaker_id = _parse_id(params.get('speaker'), 'speaker')
+    if speaker_id is not None:
+        records = records.filter(speaker_id=speaker_id)
+    return records
+
+
+def _filter_geographic(geo_records, params):
+    _parse_id(params.get('village'), 'village')
+    return filter_geographic_records(geo_records, params)
+
+
+def base_queryset(resource, params):
+    """
+    リソースの公開対象を絞り込み条件付きで返す（一覧ページ・書き出しと同じ条件）
+
+    Raises:
+        ApiError: 不明なリソース・不正な条件
+    """
+    if resource == 'records':
+        queryset = _filter_records(LanguageRecord.objects.filter(upload_status='ready'), params)
+    elif resource == 'speakers':
+        queryset = _filter_speakers(Speaker.objects.all(), params)
+    elif resource == 'villages':
+        queryset = Village.objects.all()
+    elif resource == 'geographic':
+        queryset = _filter_geographic(GeographicRecord.objects.filter(upload_status='ready'), params)
+    else:
+        raise ApiError(f'リソースは {", ".join(API_FIELDS)} のいずれかを指定してください')
+
+    ids = params.get('ids')
+    if ids:
+        ids = _parse_ints(ids, 'ids')
+        if len(ids) > MAX_IDS:
+            raise ApiError(f'ids は {MAX_IDS} 件までです')
+        queryset = queryset.filter(id__in=ids)
+    return queryset
+
+
+def _parse_ints(value, name):
+    try:
+        values = [int(part) for part in value.split(',') if part]
+    except ValueError:
+        raise ApiError(f'{name} は整数で指定してください')
+    if any(not 0 <= number <= MAX_ID for number in values):
+        raise ApiError(f'{name} が範囲外です')
+    return values
+
+
+def _parse_id(value, name):
+    """1つのIDの指定を整数にする（空の場合は None）"""
+    if not value:
+        return None
+    values = _parse_ints(value, name)
+    if len(values) != 1:
+        raise ApiError(f'{name} は1つの整数で指定してください')
+    return values[0]
+
+
+def parse_fields(resource, value):
+    """
+    ?fields= を項目名のリストにする（省略時は DEFAULT_FIELDS、'all' で全項目）
+
+    Raises:
+        ApiError: 不明な項目
+    """
+    available = API_FIELDS[resource]
+    if not value:
+        return DEFAULT_FIELDS[resource]
+    if value == 'all':
+        return list(available)
+    fields = list(dict.fromkeys(name for name in value.split(',') if name))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f'不明な項目です: {", ".join(unknown)}（{", ".join(available)}）')
+    return fields
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError('limit は整数で指定してください')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def encode_cursor(pk):
+    """次のページのカーソル（主キー順なので最後の行のID）"""
+    return str(pk)
+
+
+def decode_cursor(cursor):
+    """
+    カーソルを主キーに戻す
+
+    Raises:
+        ApiError: 不正なカーソル
+    """
+    try:
+        pk = int(cursor)
+    except (TypeError, ValueError):
+        raise ApiError('cursor が不正です')
+    if not 0 <= pk <= MAX_ID:
+        raise ApiError('cursor が不正です')
+    return pk
+
+
+def _rows(queryset, resource, fields):
+    """選んだ項目だけを values() で読み込み、API の項目名の辞書にする"""
+    spec = API_FIELDS[resource]
+    lookups = list(dict.fromkeys(spec[name][0] for name in fields))
+    rows = []
+    for values in queryset.values(*lookups):
+        row = {}
+        for name in fields:
+            lookup, choices = spec[name]
+            value = values[lookup]
+            row[name] = choices.get(value, value) if choices else value
+        rows.append(row)
+    return rows
+
+
+def build_page(resource, params):
+    """
+    リソースの一覧の1ページ分を作る
+
+    主キー順のカーソルページネーションで、?cursor= より後ろの行だけを
+    ?limit= + 1 件読み込む（何ページ目でもコストが一定で、件数を数えるクエリもない）。
+
+    Args:
+        resource: 'records'・'speakers'・'villages'・'geographic'
+        params: request.GET などの条件（fields, cursor, limit, ids と各リソースの絞り込み条件）
+
+    Returns:
+        {'results': [...], 'next_cursor': カーソルまたは None} の辞書
+
+    Raises:
+        ApiError: 不正な指定
+    """
+    queryset = base_queryset(resource, params)
+    fields = parse_fields(resource, params.get('fields'))
+    limit = parse_limit(params.get('limit'))
+    cursor = params.get('cursor')
+    if cursor:
+        queryset = queryset.filter(id__gt=decode_cursor(cursor))
+
+    # カーソルを作るため、fields に含まれなくても id は読み込む
+    selected = fields if 'id' in fields else ['id', *fields]
+    rows = _rows(queryset.order_by('id')[:limit + 1], resource, selected)
+    next_cursor = encode_cursor(rows[limit - 1]['id']) if len(rows) > limit else None
+    rows = rows[:limit]
+    if selected is not fields:
+        for row in rows:
+            del row['id']
+    return {'results': rows, 'next_cursor': next_cursor}
+
+
+def build_detail(resource, object_id, params):
+    """
+    1件分を作る
+
+    Returns:
+        項目の辞書。存在しない（公開されていない）場合は None
+
+    Raises:
+        ApiError: 不正な指定
+    """
+    fields = parse_fields(resource, params.get('fields'))
+    if object_id > MAX_ID:
+        return None
+    rows = _rows(base_queryset(resource, {}).filter(id=object_id), resource, fields)
+    return rows[0] if rows else None
+
+
+def render(payload):
+    """
+    レスポンスの本文と強い ETag を作る
+
+    Returns:
+        (本文のバイト列, ETag)
+    """
+    content = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return content, f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def query_parameters(resource):
+    """一覧で使う条件の名前（これ以外のクエリ文字列は無視する）"""
+    return (*PAGE_PARAMETERS, *FILTER_PARAMETERS[resource])
+
+
+def cached_render(path, params, builder, names):
+    """
+    本文と ETag をデータ世代ごとにキャッシュする
+
+    同じ条件の再リクエスト（ポーリング）はデータベースに問い合わせずに
+    ETag を比べて 304 を返せる。エラーはキャッシュしない。
+    キーには names の条件だけを含め、無関係なクエリ文字列でエントリが増えないようにする。
+
+    Args:
+        path: リクエストのパス
+        params: request.GET
+        builder: 本文にする値を作る関数（引数なし）
+        names: 本文に影響する条件の名前
+
+    Returns:
+        {'content', 'etag', 'status'} の辞書
+    """
+    # 各条件は params.get() で最後の値だけを使うため、キーも同じ値で作る
+    query = urlencode(sorted((name, params.get(name)) for name in names if params.get(name)))
+    key = versioned_key('api_v2', hashlib.md5(f'{path}?{query}'.encode('utf-8')).hexdigest())
+
+    def build():
+        payload = builder()
+        if payload is None:
+            return {'content': b'{"error":"not found"}', 'etag': None, 'status': 404}
+        content, etag = render(payload)
+        return {'content': content, 'etag': etag, 'status': 200}
+
+    return get_or_build(key, build, PAGE_TIMEOUT)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LanguageArchiveConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'language_archive'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,153 @@
+# language_archive/archive_stats.py
+
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from .models import ArchiveStatistic, LanguageRecord, Speaker
+
+RECORDS = 'records'
+SPEAKERS = 'speakers'
+FILE_TYPE_PREFIX = 'file_type:'
+FREQUENCY_PREFIX = 'frequency:'
+# 話者の集落ごとの言語記録数（1件以上ある集落の数が「登録集落数」になる）
+VILLAGE_PREFIX = 'village:'
+
+
+def record_keys(village_id, file_type, frequency):
+    """
+    言語記録1件が数えられる集計キー
+
+    Args:
+        village_id: 話者の集落ID（None 可）
+        file_type: ファイル種類
+        frequency: 言語使用頻度
+
+    Returns:
+        キーのリスト
+    """
+    keys = [RECORDS, f'{FILE_TYPE_PREFIX}{file_type}', f'{FREQUENCY_PREFIX}{frequency}']
+    if village_id is not None:
+        keys.append(f'{VILLAGE_PREFIX}{village_id}')
+    return keys
+
+
+def adjust(changes):
+    """
+    集計値を増減する（同時に更新されても F 式で正しく加算する）
+
+    Args:
+        changes: {キー: 増減数} の辞書
+    """
+    for key, delta in changes.items():
+        if not delta:
+            continue
+        rows = ArchiveStatistic.objects.filter(key=key)
+        if rows.update(value=F('value') + delta):
+            continue
+        if delta < 0:
+            # 行がないまま減らすことはない（reconcile で作り直される）
+            continue
+        try:
+            with transaction.atomic():
+                ArchiveStatistic.objects.create(key=key, value=delta)
+        except IntegrityError:
+            # 同時に作成された場合は加算し直す
+            rows.update(value=F('value') + delta)
+
+
+def move_record(before, after):
+    """
+    言語記録の集計キーの変化を反映する
+
+    Args:
+        before: 変更前の record_keys の引数の組（新規の場合は None）
+        after: 変更後の record_keys の引数の組（削除の場合は None）
+    """
+    changes = Counter()
+    if before is not None:
+        changes.subtract(record_keys(*before))
+    if after is not None:
+        changes.update(record_keys(*after))
+    adjust(changes)
+
+
+def village_removed(village_id):
+    """集落の削除時に、その集落の言語記録数を取り除く（話者の集落は NULL になる）"""
+    ArchiveStatistic.objects.filter(key=f'{VILLAGE_PREFIX}{village_id}').delete()
+
+
+def compute():
+    """
+    集計値をデータベースから数え直す
+
+    Returns:
+        {キー: 値} の辞書
+    """
+    values = {
+        RECORDS: LanguageRecord.objects.count(),
+        SPEAKERS: Speaker.objects.count(),
+    }
+    for file_type, count in LanguageRecord.objects.values_list('file_type').annotate(n=Count('id')).order_by():
+        values[f'{FILE_TYPE_PREFIX}{file_type}'] = count
+    for frequency, count in LanguageRecord.objects.values_list('language_frequency').annotate(n=Count('id')).order_by():
+        values[f'{FREQUENCY_PREFIX}{frequency}'] = count
+    villages = (
+        LanguageRecord.objects.filter(speaker__village__isnull=False)
+        .values_list('speaker__village').annotate(n=Count('id')).order_by()
+    )
+    for village_id, count in villages:
+        values[f'{VILLAGE_PREFIX}{village_id}'] = count
+    return values
+
+
+def reconcile(apply=True):
+    """
+    数え直した値と集計テーブルを比べ、ずれていれば直す
+
+    Args:
+        apply: False の場合はずれを調べるだけ
+
+    Returns:
+        {キー: (テーブルの値, 正しい値)} のずれていたキーの辞書
+    """
+    with transaction.atomic():
+        expected = compute()
+        stored = dict(ArchiveStatistic.objects.select_for_update().values_list('key', 'value'))
+        drift = {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
+        # テーブルが空の場合（初回）は件数が 0 でも行を作る
+        if apply and (drift or not stored):
+            ArchiveStatistic.objects.filter(key__in=[key for key in drift if key not in expected]).delete()
+            ArchiveStatistic.objects.bulk_create(
+                [ArchiveStatistic(key=key, value=value) for key, value in expected.items()],
+                update_conflicts=True, unique_fields=['key'], update_fields=['value', 'updated_at'],
+            )
+    return drift
+
+
+def get_statistics():
+    """
+    トップページ用の集計値を1回のクエリで読み込む（テーブルが空なら数え直して作る）
+
+    Returns:
+        {'total_records', 'total_speakers', 'total_villages',
+         'file_types': {種類: 件数}, 'frequencies': {頻度: 件数}} の辞書
+    """
+    values = dict(ArchiveStatistic.objects.values_list('key', 'value'))
+    if not values:
+        reconcile()
+        values = dict(ArchiveStatistic.objects.values_list('key', 'value'))
+    return {
+        'total_records': values.get(RECORDS, 0),
+        'total_speakers': values.get(SPEAKERS, 0),
+        'total_villages': sum(1 for key, value in values.items() if key.startswith(VILLAGE_PREFIX) and value > 0),
+        'file_types': {
+            key[len(FILE_TYPE_PREFIX):]: value for key, value in values.items() if key.startswith(FILE_TYPE_PREFIX)
+        },
+        'frequencies': {
+            key[len(FREQUENCY_PREFIX):]: value for key, value in values.items() if key.startswith(FREQUENCY_PREFIX)
+        },
+    }
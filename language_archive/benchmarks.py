@@ -0,0 +1,284 @@
+# language_archive/benchmarks.py
+
+import fnmatch
+import gc
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import Counter
+import django
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from .models import GeographicRecord, LanguageRecord, OnomatopoeiaType, Speaker, Village
+from .search import SearchResults
+from .utils import format_record_for_api
+from . import api_v2, archive_stats, documents, rollup
+
+# 1つの測定の既定の回数と、測定を打ち切る時間（秒）。重い測定は最低 MIN_ITERATIONS 回で止める
+BENCHMARK_ITERATIONS = 20
+BENCHMARK_MAX_SECONDS = 10.0
+MIN_ITERATIONS = 3
+
+# 比較で「変化あり」とする p50 の比率
+REGRESSION_THRESHOLD = 1.2
+
+# キャッシュを無効にして、毎回ビュー・クエリを実行した場合を測る
+UNCACHED = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# シリアライザーの測定で整形する件数
+SERIALIZE_COUNT = 1000
+
+# 結果の形式のバージョン（項目を変えたら上げる）
+RESULT_FORMAT = 1
+
+
+class Benchmark:
+    """1つの測定（func は引数なしで呼び出す）"""
+
+    def __init__(self, name, group, func):
+        self.name = name
+        self.group = group
+        self.func = func
+
+
+def _most_common(values):
+    counts = Counter(values)
+    return counts.most_common(1)[0][0] if counts else None
+
+
+def _fixtures():
+    """データに応じた測定の引数（最も記録の多い集落・話者、よく出る語など）"""
+    village_id = _most_common(
+        LanguageRecord.objects.filter(speaker__village__isnull=False).values_list('speaker__village_id', flat=True)[:10000]
+    )
+    speaker_id = _most_common(LanguageRecord.objects.values_list('speaker_id', flat=True)[:10000])
+    word = _most_common(LanguageRecord.objects.values_list('onomatopoeia_text', flat=True)[:10000])
+    middle = LanguageRecord.objects.count() // 2
+    cursor = (
+        LanguageRecord.objects.order_by('-recorded_date', '-id').values_list('recorded_date', 'id')[middle:middle + 1].first()
+    )
+    year = GeographicRecord.objects.order_by('-captured_date').values_list('captured_date', flat=True).first()
+    return {
+        'village_id': village_id,
+        'speaker_id': speaker_id,
+        'word': word or 'ごろごろ',
+        'cursor': f'{cursor[0].isoformat()}_{cursor[1]}' if cursor else '',
+        'year': year.year if year else timezone.now().year,
+    }
+
+
+def _view(client, url):
+    def run():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise AssertionError(f'{url} が {response.status_code} を返しました')
+        # ストリーミングのレスポンスも最後まで読み込む
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+    return run
+
+
+def build_benchmarks():
+    """
+    測定の一覧を作る
+
+    Returns:
+        Benchmark のリスト
+    """
+    fixtures = _fixtures()
+    client = Client()
+    village_id = fixtures['village_id'] or 0
+    speaker_id = fixtures['speaker_id'] or 0
+    word = fixtures['word']
+    year = fixtures['year']
+
+    views = [
+        ('view.index', '/'),
+        ('view.record_list', '/records/'),
+        ('view.record_list.filtered', f'/records/?village={village_id}&file_type=audio'),
+        ('view.record_list.middle_page', f'/records/?after={fixtures["cursor"]}'),
+        ('view.search_records', f'/records/search/?q={word}'),
+        ('view.geographic_list', '/geographic/'),
+        ('view.village_records', f'/village/{village_id}/records/'),
+        ('view.speaker_records', f'/speaker/{speaker_id}/records/'),
+        ('view.map_view', '/map/'),
+        ('view.map_view.folium', f'/map/?renderer=folium&year={year}'),
+        ('view.map_features_api', f'/api/map/features/?year={year}'),
+        ('view.api_village_records', f'/api/village/{village_id}/records/'),
+        ('view.api_v2_records', '/api/v2/records/?fields=all&limit=500'),
+        ('view.api_stats', '/api/stats/?group_by=village,year'),
+    ]
+    benchmarks = [Benchmark(name, 'view', _view(client, url)) for name, url in views]
+
+    related = LanguageRecord.objects.select_related('speaker', 'speaker__village', 'onomatopoeia_type', 'village')
+    queries = [
+        ('query.record_list_page', lambda: list(related.order_by('-recorded_date', '-id')[:25])),
+        ('query.record_count', lambda: LanguageRecord.objects.count()),
+        ('query.record_count.filtered', lambda: LanguageRecord.objects.filter(
+            speaker__village_id=village_id, file_type='audio').count()),
+        ('query.search', lambda: SearchResults(word, related)[:24]),
+        ('query.search_count', lambda: SearchResults(word).count()),
+        ('query.map_year', lambda: list(GeographicRecord.objects.filter(
+            captured_date__year=year, latitude__isnull=False).values_list('id', 'latitude', 'longitude'))),
+        ('query.statistics', archive_stats.get_statistics),
+        ('query.rollup', lambda: rollup.query(['village', 'year'])),
+    ]
+    benchmarks += [Benchmark(name, 'query', func) for name, func in queries]
+
+    # シリアライザーはデータベースの読み込みを含めずに測る
+    records = list(related.order_by('id')[:SERIALIZE_COUNT])
+    record_ids = [record.id for record in records]
+    documents.get_documents(record_ids)
+    serializers = [
+        ('serializer.format_record_for_api', lambda: json.dumps(
+            [format_record_for_api(record) for record in records], ensure_ascii=False, default=str)),
+        ('serializer.document_join', lambda: documents.join_documents(record_ids)),
+        ('serializer.api_v2_page', lambda: api_v2.render(api_v2.build_page('records', {'fields': 'all', 'limit': '500'}))),
+    ]
+    benchmarks += [Benchmark(name, 'serializer', func) for name, func in serializers]
+    return benchmarks
+
+
+def measure(func, iterations=BENCHMARK_ITERATIONS, max_seconds=BENCHMARK_MAX_SECONDS):
+    """
+    実行時間の分布、ピークメモリ、クエリ数を測る
+
+    1回目はウォームアップとして捨てる。時間の測定とは別に、tracemalloc で
+    Python のメモリ確保のピークを、CaptureQueriesContext でクエリ数を測る
+    （どちらも測定の負荷がかかるため、時間の測定には含めない）。
+
+    Returns:
+        {'iterations', 'p50_ms', 'p95_ms', 'mean_ms', 'min_ms', 'max_ms', 'peak_memory_kb', 'queries'} の辞書
+    """
+    func()
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    while len(timings) < iterations and (len(timings) < MIN_ITERATIONS or time.perf_counter() < deadline):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    with CaptureQueriesContext(connection) as captured:
+        func()
+
+    timings = np.array(timings)
+    return {
+        'iterations': len(timings),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'mean_ms': round(float(timings.mean()), 3),
+        'min_ms': round(float(timings.min()), 3),
+        'max_ms': round(float(timings.max()), 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'queries': len(captured.captured_queries),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment(cached):
+    return {
+        'format': RESULT_FORMAT,
+        'revision': _git_revision(),
+        'created_at': timezone.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cached': cached,
+        'corpus': {
+            'villages': Village.objects.count(),
+            'speakers': Speaker.objects.count(),
+            'types': OnomatopoeiaType.objects.count(),
+            'records': LanguageRecord.objects.count(),
+            'geographic': GeographicRecord.objects.count(),
+        },
+    }
+
+
+def run_benchmarks(patterns=None, iterations=BENCHMARK_ITERATIONS, max_seconds=BENCHMARK_MAX_SECONDS,
+                   cached=False, progress=None):
+    """
+    測定をすべて（または patterns に一致するものだけ）実行する
+
+    Args:
+        patterns: 測定名のパターン（fnmatch 形式、例: 'view.*'）のリスト
+        iterations: 1つの測定の回数
+        max_seconds: 1つの測定を打ち切る時間（秒）
+        cached: True の場合はキャッシュを有効にしたまま測る（既定は毎回作り直す場合を測る）
+        progress: 測定ごとの結果を受け取る関数（測定名, 結果）
+
+    Returns:
+        {'environment': {...}, 'results': {測定名: measure の戻り値}} の辞書
+    """
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'GEOCODING_OFFLINE': True}
+    if not cached:
+        overrides['CACHES'] = UNCACHED
+    results = {}
+    with override_settings(**overrides):
+        for benchmark in build_benchmarks():
+            if patterns and not any(fnmatch.fnmatch(benchmark.name, pattern) for pattern in patterns):
+                continue
+            try:
+                result = {'group': benchmark.group, **measure(benchmark.func, iterations, max_seconds)}
+            except Exception as e:
+                # 1つが失敗しても（folium が入っていないなど）残りは測る
+                result = {'group': benchmark.group, 'error': f'{type(e).__name__}: {e}'}
+            results[benchmark.name] = result
+            if progress:
+                progress(benchmark.name, result)
+    return {'environment': _environment(cached), 'results': results}
+
+
+def write_results(report, path):
+    """差分を取りやすいよう、キーを並べて書き出す"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    2つの結果の p50・ピークメモリ・クエリ数を比べる
+
+    Returns:
+        [(測定名, 項目, 基準の値, 今回の値, 比率, 悪化したか)] のリスト（両方にある測定のみ）
+    """
+    rows = []
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        for key in ('p50_ms', 'peak_memory_kb', 'queries'):
+            old, new = before.get(key), result.get(key)
+            if old is None or new is None:
+                continue
+            ratio = new / old if old else (1.0 if not new else float('inf'))
+            worse = new > old if key == 'queries' else ratio > threshold
+            rows.append((name, key, old, new, ratio, worse))
+    return rows
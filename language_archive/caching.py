@@ -0,0 +1,182 @@
+# language_archive/caching.py
+
+import hashlib
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+# データ更新のたびに進める世代番号のキー
+DATA_VERSION_KEY = 'archive:data_version'
+
+# 断片キャッシュの有効期間（秒）。世代番号が変われば期限前でも使われなくなる
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+# ページ全体のキャッシュの有効期間（秒）。世代番号が変われば期限前でも使われなくなる
+PAGE_TIMEOUT = 60 * 60
+
+# 構築中ロックの有効期間（秒）。構築したワーカーが落ちても解放されるようにする
+BUILD_LOCK_TIMEOUT = 60
+
+# 他のワーカーの構築完了を待つ最大時間（秒）
+BUILD_WAIT_TIMEOUT = 30
+BUILD_POLL_INTERVAL = 0.05
+
+# 同じプロセス内のスレッド同士の重複構築を防ぐロック
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def get_data_version():
+    """
+    現在のデータ世代番号を返す
+
+    キーが期限切れ・追い出しで消えていた場合は、過去の世代と重ならない
+    新しい番号（現在時刻のナノ秒）から始める。1 からやり直すと、
+    まだ残っている古い世代のキャッシュが現在のものとして使われてしまう。
+
+    Returns:
+        世代番号（整数）
+    """
+    return cache.get_or_set(DATA_VERSION_KEY, time.time_ns, None)
+
+
+def bump_data_version():
+    """
+    データ世代番号を進め、世代付きのキャッシュをすべて無効にする
+
+    cache.incr は多くのバックエンドで既定の有効期間（300秒）を付けて書き直すため、
+    有効期間なしで明示的に書き込む。
+    """
+    cache.set(DATA_VERSION_KEY, time.time_ns(), None)
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        return _local_locks.setdefault(key, threading.Lock())
+
+
+def get_or_build(key, builder, timeout=FRAGMENT_TIMEOUT):
+    """
+    キャッシュを取得し、なければ1つのワーカーだけが構築する
+
+    同時にキャッシュミスした他のワーカーは、構築中ロックが外れて
+    結果が書き込まれるまで待ってから同じ結果を使う。
+
+    Args:
+        key: キャッシュキー
+        builder: 値を構築する関数（引数なし）
+        timeout: キャッシュの有効期間（秒）
+
+    Returns:
+        キャッシュ済みまたは構築した値
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with _local_lock(key):
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f'{key}:building'
+        if cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT):
+            try:
+                value = builder()
+                cache.set(key, value, timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+
+        # 他のワーカーが構築中なので完成を待つ
+        deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(BUILD_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.get(lock_key) is None:
+                break
+
+    # 待ちきれなかった場合は自分で構築する
+    value = builder()
+    cache.set(key, value, timeout)
+    return value
+
+
+def versioned_key(name, *parts):
+    """
+    データ世代番号を含むキャッシュキーを作る
+
+    Args:
+        name: キャッシュの種類
+        parts: キーに含める値（絞り込み条件など）
+
+    Returns:
+        キャッシュキー
+    """
+    suffix = ':'.join(str(part) for part in parts)
+    return f'archive:{name}:v{get_data_version()}:{suffix}'
+
+
+def _page_cacheable(request):
+    """ログインしておらず、表示待ちのメッセージもない GET・HEAD リクエストか"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    # メッセージ（アップロード完了の通知など）はページに埋め込まれるため、あればキャッシュしない
+    messages = getattr(request, '_messages', None)
+    return messages is None or len(messages) == 0
+
+
+def _page_key(request):
+    """パスとクエリ文字列（順序は問わない）とデータ世代番号からキーを作る"""
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode('utf-8')).hexdigest()
+    return versioned_key('page', digest)
+
+
+def cache_page_for_anonymous(view):
+    """
+    ログインしていない閲覧者へのページをデータ世代ごとにキャッシュするデコレーター
+
+    記録の登録・更新でシグナルが世代番号を進めると、次のリクエストで作り直す。
+    同時にキャッシュミスしたリクエストは get_or_build で1つだけが描画する。
+    200 以外のレスポンスや Cookie を設定するレスポンスはキャッシュしない。
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _page_cacheable(request):
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        rendered = {}
+
+        def build():
+            response = view(request, *args, **kwargs)
+            rendered['response'] = response
+            if response.status_code != 200 or response.streaming or response.cookies:
+                # None はキャッシュにないのと同じ扱いになる
+                return None
+            return {'content': response.content, 'headers': dict(response.items())}
+
+        page = get_or_build(_page_key(request), build, PAGE_TIMEOUT)
+        response = rendered.get('response')
+        if response is None:
+            if page is None:
+                response = view(request, *args, **kwargs)
+            else:
+                response = HttpResponse(page['content'])
+                for header, value in page['headers'].items():
+                    response[header] = value
+        # ログイン中・メッセージありの場合は内容が変わるため、共有キャッシュに区別させる
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
@@ -0,0 +1,304 @@
+# language_archive/clusters.py
+
+import math
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from .models import GeographicRecord, MapCluster, Speaker, Village
+
+# クラスタを事前計算するズームレベルの範囲
+MIN_ZOOM = 5
+CLUSTER_MAX_ZOOM = 16
+
+# 1タイル（256px）を 2^GRID_BITS 分割したグリッドで集計する（64px 四方）
+GRID_BITS = 2
+
+# 1地点だけのセルを1回のクエリで探す数。OR でつなぐ条件が長くなりすぎないようにする
+# （SQLite の式の深さの上限は 1000）
+SINGLE_CELL_BATCH = 100
+
+# Web メルカトルで表せる緯度の上限
+_MAX_LATITUDE = 85.05112878
+
+
+def _project(lat, lon):
+    """緯度・経度を 0〜1 の Web メルカトル座標に変換する（numpy 配列にも対応）"""
+    lat = np.clip(lat, -_MAX_LATITUDE, _MAX_LATITUDE)
+    sin_lat = np.sin(np.radians(lat))
+    x = (np.asarray(lon) + 180.0) / 360.0
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def _cell(x, y, zoom):
+    scale = 2 ** (zoom + GRID_BITS)
+    return np.floor(x * scale).astype(np.int64), np.floor(y * scale).astype(np.int64)
+
+
+def _cell_bounds(cell_x, cell_y, zoom):
+    """セルの範囲（西, 南, 東, 北）"""
+    scale = 2 ** (zoom + GRID_BITS)
+    west, east = cell_x / scale * 360.0 - 180.0, (cell_x + 1) / scale * 360.0 - 180.0
+    north, south = (
+        math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / scale)))) for y in (cell_y, cell_y + 1)
+    )
+    return west, south, east, north
+
+
+def _in_cells(cells, zoom, prefix=''):
+    """セルのいずれかに含まれる地点の条件（境界は後で _cell で確かめる。セルは SINGLE_CELL_BATCH 個まで）"""
+    condition = Q()
+    for cell_x, cell_y in cells:
+        west, south, east, north = _cell_bounds(cell_x, cell_y, zoom)
+        condition |= Q(**{
+            f'{prefix}latitude__gte': south, f'{prefix}latitude__lte': north,
+            f'{prefix}longitude__gte': west, f'{prefix}longitude__lte': east,
+        })
+    return condition
+
+
+def _single_points(singles, zoom):
+    """
+    1地点だけのセルを、その地点の Feature に置き換える
+
+    クラスタの吹き出しではなく通常のマーカーにして、クリックでポップアップを開けるようにする。
+
+    Args:
+        singles: {(cell_x, cell_y): MapCluster} の辞書（count が 1 のセル）
+        zoom: ズームレベル
+
+    Returns:
+        {(cell_x, cell_y): Feature} の辞書（地点が見つかったセルのみ）
+    """
+    def cell_of(lat, lon):
+        x, y = _project(lat, lon)
+        return tuple(int(v) for v in _cell(x, y, zoom))
+
+    def batches(cells):
+        for start in range(0, len(cells), SINGLE_CELL_BATCH):
+            yield cells[start:start + SINGLE_CELL_BATCH]
+
+    features = {}
+    geo_cells = [key for key, cell in singles.items() if cell.geo_count == 1]
+    for batch in batches(geo_cells):
+        geo_records = GeographicRecord.objects.filter(_in_cells(batch, zoom)).values_list(
+            'id', 'content_type', 'latitude', 'longitude',
+        )
+        for record_id, content_type, lat, lon in geo_records:
+            key = cell_of(lat, lon)
+            if key in singles and singles[key].geo_count == 1:
+                features[key] = {
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+                    'properties': {'cluster': False, 'kind': 'geo', 'id': record_id, 'content_type': content_type},
+                }
+
+    speaker_cells = [key for key, cell in singles.items() if cell.speaker_count == 1]
+    for batch in batches(speaker_cells):
+        speakers = Speaker.objects.filter(_in_cells(batch, zoom, 'village__')).values_list(
+            'id', 'village__latitude', 'village__longitude',
+        )
+        for speaker_id, lat, lon in speakers:
+            key = cell_of(lat, lon)
+            if key in singles and singles[key].speaker_count == 1:
+                features[key] = {
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+                    'properties': {'cluster': False, 'kind': 'speaker', 'id': speaker_id},
+                }
+    return features
+
+
+def _adjust(lat, lon, geo=0, speaker=0):
+    """1地点（または同じ座標の複数地点）の増減を全ズームレベルのセルに反映する"""
+    x, y = _project(lat, lon)
+    for zoom in range(MIN_ZOOM, CLUSTER_MAX_ZOOM + 1):
+        cell_x, cell_y = (int(v) for v in _cell(x, y, zoom))
+        count = geo + speaker
+        cells = MapCluster.objects.filter(zoom=zoom, cell_x=cell_x, cell_y=cell_y)
+        changes = {
+            'geo_count': F('geo_count') + geo,
+            'speaker_count': F('speaker_count') + speaker,
+            'latitude_sum': F('latitude_sum') + lat * count,
+            'longitude_sum': F('longitude_sum') + lon * count,
+        }
+        if cells.update(**changes):
+            if count < 0:
+                cells.filter(geo_count__lte=0, speaker_count__lte=0).delete()
+            continue
+        if count <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                MapCluster.objects.create(
+                    zoom=zoom, cell_x=cell_x, cell_y=cell_y,
+                    geo_count=geo, speaker_count=speaker,
+                    latitude_sum=lat * count, longitude_sum=lon * count,
+                )
+        except IntegrityError:
+            # 同時に作成された場合は加算し直す
+            cells.update(**changes)
+
+
+def add_point(lat, lon, geo=0, speaker=0):
+    """
+    地点をクラスタに加える
+
+    Args:
+        lat: 緯度
+        lon: 経度
+        geo: 加える地理環境データの件数
+        speaker: 加える話者の人数
+    """
+    if lat is None or lon is None:
+        return
+    _adjust(lat, lon, geo=geo, speaker=speaker)
+
+
+def remove_point(lat, lon, geo=0, speaker=0):
+    """
+    地点をクラスタから取り除く
+
+    Args:
+        lat: 緯度
+        lon: 経度
+        geo: 取り除く地理環境データの件数
+        speaker: 取り除く話者の人数
+    """
+    if lat is None or lon is None:
+        return
+    _adjust(lat, lon, geo=-geo, speaker=-speaker)
+
+
+def rebuild():
+    """
+    全地点からクラスタ集計テーブルを作り直す
+
+    Returns:
+        作成したセル数
+    """
+    geo_points = np.array(
+        GeographicRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        .values_list('latitude', 'longitude'),
+        dtype=float,
+    ).reshape(-1, 2)
+    speaker_points = np.array(
+        Speaker.objects.filter(village__isnull=False)
+        .values_list('village__latitude', 'village__longitude'),
+        dtype=float,
+    ).reshape(-1, 2)
+
+    lat = np.concatenate([geo_points[:, 0], speaker_points[:, 0]])
+    lon = np.concatenate([geo_points[:, 1], speaker_points[:, 1]])
+    is_geo = np.concatenate([np.ones(len(geo_points)), np.zeros(len(speaker_points))])
+    x, y = _project(lat, lon)
+
+    cells = []
+    for zoom in range(MIN_ZOOM, CLUSTER_MAX_ZOOM + 1):
+        cell_x, cell_y = _cell(x, y, zoom)
+        keys = np.stack([cell_x, cell_y], axis=1)
+        if not len(keys):
+            continue
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        geo_counts = np.bincount(inverse, weights=is_geo, minlength=len(unique))
+        totals = np.bincount(inverse, minlength=len(unique))
+        lat_sums = np.bincount(inverse, weights=lat, minlength=len(unique))
+        lon_sums = np.bincount(inverse, weights=lon, minlength=len(unique))
+        for i, (cx, cy) in enumerate(unique):
+            cells.append(MapCluster(
+                zoom=zoom, cell_x=int(cx), cell_y=int(cy),
+                geo_count=int(geo_counts[i]), speaker_count=int(totals[i] - geo_counts[i]),
+                latitude_sum=float(lat_sums[i]), longitude_sum=float(lon_sums[i]),
+            ))
+
+    with transaction.atomic():
+        MapCluster.objects.all().delete()
+        MapCluster.objects.bulk_create(cells, batch_size=1000)
+    return len(cells)
+
+
+def clusters_in_bbox(zoom, west, south, east, north):
+    """
+    表示範囲内のクラスタを返す
+
+    Args:
+        zoom: ズームレベル（MIN_ZOOM〜CLUSTER_MAX_ZOOM に丸める）
+        west, south, east, north: 表示範囲
+
+    1地点だけのセルは、ポップアップを開けるよう個別の地点（cluster: False, kind, id）として返す。
+
+    Returns:
+        GeoJSON の Feature のリスト
+    """
+    zoom = min(max(zoom, MIN_ZOOM), CLUSTER_MAX_ZOOM)
+    (min_x, max_x), (max_y, min_y) = _project(np.array([south, north]), np.array([west, east]))
+    min_cx, min_cy = _cell(min_x, min_y, zoom)
+    max_cx, max_cy = _cell(max_x, max_y, zoom)
+
+    features = []
+    keys = []
+    singles = {}
+    cells = MapCluster.objects.filter(
+        zoom=zoom,
+        cell_x__gte=int(min_cx), cell_x__lte=int(max_cx),
+        cell_y__gte=int(min_cy), cell_y__lte=int(max_cy),
+    )
+    for cell in cells:
+        count = cell.count
+        if count <= 0:
+            continue
+        key = (cell.cell_x, cell.cell_y)
+        if count == 1:
+            singles[key] = cell
+        keys.append(key)
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [round(cell.longitude_sum / count, 6), round(cell.latitude_sum / count, 6)],
+            },
+            'properties': {
+                'cluster': True,
+                'count': count,
+                'geo_count': cell.geo_count,
+                'speaker_count': cell.speaker_count,
+            },
+        })
+
+    if singles:
+        # 1地点だけのセルはその地点として返す（見つからない場合はクラスタのまま）
+        points = _single_points(singles, zoom)
+        features = [points.get(key, feature) for key, feature in zip(keys, features)]
+    return features
+
+
+def points_in_bbox(west, south, east, north):
+    """
+    表示範囲内の個別の地点を返す（最大ズーム付近で使用）
+
+    同じ集落の話者は座標が重なるため、集落ごとに1つの地点にまとめる。
+
+    Returns:
+        GeoJSON の Feature のリスト
+    """
+    features = []
+    geo_records = GeographicRecord.objects.in_bbox(west, south, east, north).values_list('id', 'content_type', 'latitude', 'longitude')
+    for record_id, content_type, lat, lon in geo_records:
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+            'properties': {'kind': 'geo', 'id': record_id, 'content_type': content_type},
+        })
+
+    villages = Village.objects.filter(
+        latitude__gte=south, latitude__lte=north,
+        longitude__gte=west, longitude__lte=east,
+    ).annotate(speaker_count=Count('speaker')).filter(speaker_count__gt=0)
+    for village_id, lat, lon, speaker_count in villages.values_list('id', 'latitude', 'longitude', 'speaker_count'):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+            'properties': {'kind': 'village', 'id': village_id, 'count': speaker_count},
+        })
+    return features
@@ -0,0 +1,301 @@
+# language_archive/corpus.py
+
+import datetime
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from .caching import bump_data_version
+from .geo import geohash_for_point
+from .kana import reduplication_pattern
+from .models import GeographicRecord, LanguageRecord, OnomatopoeiaType, Speaker, Village
+from . import archive_stats, clusters, documents, kana_index, rollup, search
+
+# 用意している規模（言語記録の件数）
+CORPUS_SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# 合成データの話者IDの接頭辞（実データと区別する）
+SYNTHETIC_PREFIX = 'SYN'
+SYNTHETIC_NOTE = '合成データ（ベンチマーク用）'
+
+# 一度に登録する件数
+CORPUS_BATCH_SIZE = 5000
+
+# 喜界島の集落名と、座標を振る範囲（南, 西, 北, 東）。座標は範囲内の乱数で実際の位置ではない
+VILLAGE_NAMES = [
+    '湾', '赤連', '中里', '川嶺', '荒木', '手久津久', '上嘉鉄', '先山', '浦原', '志戸桶',
+    '小野津', '伊実久', '嘉鈍', '阿伝', '塩道', '早町', '白水', '佐手久', '花良治', '城久',
+]
+ISLAND_BOUNDS = (28.28, 129.92, 28.35, 130.03)
+
+# オノマトペの型（型コード, 型名, 説明, 語形の作り方）
+ONOMATOPOEIA_TYPES = [
+    ('ABAB', '反復形', '2モーラの語基を繰り返す（ごろごろ）', lambda a, b: a + b + a + b),
+    ('ABり', 'り形', '2モーラの語基に「り」が付く（ころり）', lambda a, b: a + b + 'り'),
+    ('AっBり', '促音り形', '促音を挟んで「り」が付く（こっそり）', lambda a, b: a + 'っ' + b + 'り'),
+    ('AんBり', '撥音り形', '撥音を挟んで「り」が付く（ふんわり）', lambda a, b: a + 'ん' + b + 'り'),
+    ('ABっ', '促音形', '2モーラの語基に促音が付く（ぱらっ）', lambda a, b: a + b + 'っ'),
+]
+
+SYLLABLES = list('かきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもらりるれろぱぴぷぺぽがぎぐげござじずぜぞばびぶべぼ')
+
+# 語彙の大きさ。出現頻度は Zipf 分布に従う（少数の語が多くの記録を占める）
+LEXICON_SIZE = 3000
+ZIPF_EXPONENT = 1.1
+
+MEANINGS = ['様子', '音', '動き', '手触り', '光り方', '鳴き声', '降り方', '歩き方']
+USAGE_TEMPLATES = ['{word}と{verb}。', '{word}して{verb}。', '朝から{word}{verb}。']
+VERBS = ['光る', '鳴る', '歩く', '降る', '揺れる', '笑う', '転がる', '乾く']
+
+# 選択肢の出現割合
+FREQUENCY_WEIGHTS = {'daily': 0.4, 'often': 0.3, 'sometimes': 0.2, 'rarely': 0.1}
+FILE_TYPE_WEIGHTS = {'audio': 0.6, 'video': 0.25, 'image': 0.15}
+AGE_RANGE_WEIGHTS = {
+    '30-39': 0.02, '40-49': 0.04, '50-59': 0.08, '60-69': 0.18,
+    '70-79': 0.3, '80-89': 0.28, '90-99': 0.09, '100+': 0.01,
+}
+CONTENT_TYPE_WEIGHTS = {'drone_video': 0.5, 'drone_photo': 0.4, 'other': 0.1}
+
+# 収録日の範囲
+FIRST_DATE = datetime.date(2015, 1, 1)
+LAST_DATE = datetime.date(2025, 12, 31)
+
+STORAGE_URL = 'https://example.supabase.co/storage/v1/object/public/archive'
+
+
+class CorpusError(Exception):
+    """合成データを作れないエラー"""
+
+
+def _choice(rng, weights, size):
+    values = list(weights)
+    probabilities = np.array(list(weights.values()), dtype=float)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=probabilities / probabilities.sum())]
+
+
+def _dates(rng, size):
+    days = (LAST_DATE - FIRST_DATE).days
+    return [FIRST_DATE + datetime.timedelta(days=int(day)) for day in rng.integers(0, days + 1, size=size)]
+
+
+def _points(rng, size):
+    south, west, north, east = ISLAND_BOUNDS
+    return rng.uniform(south, north, size), rng.uniform(west, east, size)
+
+
+def _lexicon(rng, types):
+    """型ごとの語形を持つ語彙（語, 型）と Zipf 分布の出現確率"""
+    words = {}
+    while len(words) < LEXICON_SIZE:
+        code, _, _, build = ONOMATOPOEIA_TYPES[int(rng.integers(len(ONOMATOPOEIA_TYPES)))]
+        a, b = rng.choice(SYLLABLES, size=2)
+        words.setdefault(build(a, b), types[code])
+    ranks = np.arange(1, len(words) + 1, dtype=float)
+    weights = ranks ** -ZIPF_EXPONENT
+    return list(words.items()), weights / weights.sum()
+
+
+def default_counts(records):
+    """言語記録の件数に合わせた話者・地理環境データの件数"""
+    return {
+        'speakers': max(10, records // 50),
+        'geographic': max(50, records // 20),
+    }
+
+
+def _synthetic_villages(rng):
+    """
+    合成データの集落（既にあれば再利用し、ない集落だけを登録する）
+
+    座標の乱数は既存の集落があっても同じだけ引き、以降のデータが seed で決まるようにする。
+    """
+    lats, lons = _points(rng, len(VILLAGE_NAMES))
+    existing = {
+        village.name: village
+        for village in Village.objects.filter(name__in=VILLAGE_NAMES, description=SYNTHETIC_NOTE).order_by('id')
+    }
+    missing = [
+        Village(name=name, latitude=round(float(lat), 5), longitude=round(float(lon), 5), description=SYNTHETIC_NOTE)
+        for name, lat, lon in zip(VILLAGE_NAMES, lats, lons)
+        if name not in existing
+    ]
+    existing.update((village.name, village) for village in Village.objects.bulk_create(missing))
+    return [existing[name] for name in VILLAGE_NAMES]
+
+
+def _last_speaker_number():
+    """登録済みの合成データの話者IDの最大の番号（追加する話者はその次から振る）"""
+    numbers = [0]
+    prefix = f'{SYNTHETIC_PREFIX}-'
+    for speaker_id in Speaker.objects.filter(speaker_id__startswith=prefix).values_list('speaker_id', flat=True):
+        suffix = speaker_id[len(prefix):]
+        if suffix.isdigit():
+            numbers.append(int(suffix))
+    return max(numbers)
+
+
+def _create_lookups(rng, speaker_count):
+    villages = _synthetic_villages(rng)
+
+    types = {}
+    for code, name, description, _ in ONOMATOPOEIA_TYPES:
+        types[code], _ = OnomatopoeiaType.objects.get_or_create(
+            type_code=code, defaults={'type_name': name, 'description': description},
+        )
+
+    ages = _choice(rng, AGE_RANGE_WEIGHTS, speaker_count)
+    genders = rng.choice(['M', 'F'], size=speaker_count)
+    # 集落ごとの話者数に偏りを持たせる
+    village_weights = rng.dirichlet(np.ones(len(villages)) * 2)
+    village_indices = rng.choice(len(villages), size=speaker_count, p=village_weights)
+    first = _last_speaker_number() + 1
+    speakers = Speaker.objects.bulk_create(
+        [
+            Speaker(speaker_id=f'{SYNTHETIC_PREFIX}-{first + i:07d}', age_range=ages[i], gender=genders[i],
+                    village=villages[village_indices[i]], notes=SYNTHETIC_NOTE)
+            for i in range(speaker_count)
+        ],
+        batch_size=CORPUS_BATCH_SIZE,
+    )
+    return villages, types, speakers
+
+
+def _language_records(rng, size, lexicon, probabilities, speakers, speaker_weights, villages, offset):
+    words = rng.choice(len(lexicon), size=size, p=probabilities)
+    speaker_indices = rng.choice(len(speakers), size=size, p=speaker_weights)
+    frequencies = _choice(rng, FREQUENCY_WEIGHTS, size)
+    file_types = _choice(rng, FILE_TYPE_WEIGHTS, size)
+    dates = _dates(rng, size)
+    extensions = {'audio': 'mp3', 'video': 'mp4', 'image': 'jpg'}
+    records = []
+    for i in range(size):
+        word, onomatopoeia_type = lexicon[words[i]]
+        speaker = speakers[speaker_indices[i]]
+        file_type = file_types[i]
+        records.append(LanguageRecord(
+            onomatopoeia_text=word,
+            # bulk_create では save() が呼ばれないため、モーラ型をここで計算する
+            mora_pattern=reduplication_pattern(word),
+            meaning=f'{word}とした{MEANINGS[i % len(MEANINGS)]}',
+            usage_example=USAGE_TEMPLATES[i % len(USAGE_TEMPLATES)].format(word=word, verb=VERBS[i % len(VERBS)]),
+            language_frequency=frequencies[i],
+            file_type=file_type,
+            file_path=f'{STORAGE_URL}/language/{SYNTHETIC_PREFIX.lower()}/{speaker.speaker_id}/{offset + i}.{extensions[file_type]}',
+            speaker=speaker,
+            onomatopoeia_type=onomatopoeia_type,
+            village=villages[speaker.village_id],
+            recorded_date=dates[i],
+            created_at=timezone.make_aware(datetime.datetime.combine(dates[i], datetime.time(12))),
+            notes=SYNTHETIC_NOTE,
+        ))
+    return records
+
+
+def _geographic_records(rng, size, villages, offset):
+    content_types = _choice(rng, CONTENT_TYPE_WEIGHTS, size)
+    lats, lons = _points(rng, size)
+    village_list = list(villages.values())
+    village_indices = rng.integers(len(village_list), size=size)
+    dates = _dates(rng, size)
+    records = []
+    for i in range(size):
+        lat, lon = round(float(lats[i]), 6), round(float(lons[i]), 6)
+        records.append(GeographicRecord(
+            title=f'合成データ {offset + i + 1}',
+            content_type=content_types[i],
+            description=SYNTHETIC_NOTE,
+            file_path=f'{STORAGE_URL}/geographic/{SYNTHETIC_PREFIX.lower()}/{offset + i}.mp4',
+            village=village_list[village_indices[i]],
+            latitude=lat,
+            longitude=lon,
+            geohash=geohash_for_point(lat, lon),
+            captured_date=dates[i],
+        ))
+    return records
+
+
+def refresh_derived_data():
+    """bulk_create ではシグナルが送られないため、検索インデックスや集計をまとめて作り直す"""
+    search.rebuild_index()
+    if kana_index.get_reader().available():
+        kana_index.build_index()
+    archive_stats.reconcile()
+    rollup.reconcile()
+    documents.rebuild()
+    clusters.rebuild()
+    bump_data_version()
+
+
+def generate_corpus(records, seed=0, speakers=None, geographic=None, append=False,
+                    batch_size=CORPUS_BATCH_SIZE, refresh=True, progress=None):
+    """
+    ベンチマーク用の合成データを登録する
+
+    同じ seed からは同じデータができる。語の出現頻度は Zipf 分布、
+    話者の記録数・集落の話者数にも偏りを持たせ、実データに近い分布にする。
+
+    Args:
+        records: 言語記録の件数
+        seed: 乱数のシード
+        speakers: 話者数（省略時は records / 50）
+        geographic: 地理環境データの件数（省略時は records / 20）
+        append: 既にデータがあるデータベースにも追加するか（合成データの集落は再利用し、話者は続きの番号で追加する）
+        batch_size: 一度に登録する件数
+        refresh: 検索インデックス・集計などを作り直すか
+        progress: 進捗を受け取る関数（メッセージ文字列を渡す）
+
+    Returns:
+        {'villages', 'speakers', 'types', 'records', 'geographic'} の件数の辞書
+
+    Raises:
+        CorpusError: 既にデータがある（append=False の場合）
+    """
+    if not append and LanguageRecord.objects.exists():
+        raise CorpusError('データベースに言語記録があります。ベンチマーク用のデータベースで実行してください（--append で追加できます）')
+
+    progress = progress or (lambda message: None)
+    counts = default_counts(records)
+    speaker_count = speakers or counts['speakers']
+    geographic_count = counts['geographic'] if geographic is None else geographic
+    rng = np.random.default_rng(seed)
+
+    with transaction.atomic():
+        villages, types, speaker_objects = _create_lookups(rng, speaker_count)
+    villages = {village.id: village for village in villages}
+    lexicon, probabilities = _lexicon(rng, types)
+    # 話者ごとの記録数にも偏りを持たせる（よく話す話者がいる）
+    speaker_weights = rng.pareto(1.5, size=len(speaker_objects)) + 1
+    speaker_weights /= speaker_weights.sum()
+
+    for start in range(0, records, batch_size):
+        size = min(batch_size, records - start)
+        with transaction.atomic():
+            LanguageRecord.objects.bulk_create(
+                _language_records(rng, size, lexicon, probabilities, speaker_objects, speaker_weights, villages, start)
+            )
+        progress(f'言語記録 {start + size} / {records} 件')
+
+    # 追加する場合もタイトル・パスの番号が重ならないよう、既存の合成データの続きから振る
+    geographic_offset = GeographicRecord.objects.filter(description=SYNTHETIC_NOTE).count()
+    for start in range(0, geographic_count, batch_size):
+        size = min(batch_size, geographic_count - start)
+        with transaction.atomic():
+            GeographicRecord.objects.bulk_create(
+                _geographic_records(rng, size, villages, geographic_offset + start)
+            )
+        progress(f'地理環境データ {start + size} / {geographic_count} 件')
+
+    if refresh:
+        progress('検索インデックス・集計を作り直しています')
+        refresh_derived_data()
+
+    return {
+        'villages': len(villages),
+        'speakers': len(speaker_objects),
+        'types': len(types),
+        'records': records,
+        'geographic': geographic_count,
+    }
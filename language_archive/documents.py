@@ -0,0 +1,108 @@
+# language_archive/documents.py
+
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from .models import LanguageRecord, RecordDocument
+from .utils import format_record_for_api
+
+# 文書の形式のバージョン。format_record_for_api の出力を変えたら上げる（古い文書は読み込み時に作り直す）
+DOCUMENT_VERSION = 1
+
+# 一度に作り直す記録の数
+REFRESH_BATCH_SIZE = 500
+
+
+def serialize(record):
+    """言語記録を整形済みの JSON 文字列にする（関連先は select_related 済みのもの）"""
+    return json.dumps(format_record_for_api(record), cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def _records():
+    return LanguageRecord.objects.select_related('speaker', 'speaker__village', 'onomatopoeia_type', 'village')
+
+
+def refresh(record_ids):
+    """
+    言語記録の文書を作り直す（削除済みの記録は無視する）
+
+    Args:
+        record_ids: 言語記録IDのリスト
+
+    Returns:
+        {記録ID: JSON 文字列} の辞書
+    """
+    record_ids = list(dict.fromkeys(record_ids))
+    contents = {}
+    for start in range(0, len(record_ids), REFRESH_BATCH_SIZE):
+        records = _records().filter(id__in=record_ids[start:start + REFRESH_BATCH_SIZE])
+        documents = [
+            RecordDocument(record=record, version=DOCUMENT_VERSION, content=serialize(record))
+            for record in records
+        ]
+        RecordDocument.objects.bulk_create(
+            documents, update_conflicts=True, unique_fields=['record'],
+            update_fields=['version', 'content', 'updated_at'],
+        )
+        contents.update((document.record_id, document.content) for document in documents)
+    return contents
+
+
+def dependent_record_ids(speaker_id=None, village_id=None, type_id=None):
+    """
+    話者・集落・型を参照している言語記録のID（文書の作り直しが必要なもの）
+
+    集落は話者の集落と記録の関連集落の両方を対象にする。
+    """
+    condition = Q()
+    if speaker_id is not None:
+        condition |= Q(speaker_id=speaker_id)
+    if village_id is not None:
+        condition |= Q(speaker__village_id=village_id) | Q(village_id=village_id)
+    if type_id is not None:
+        condition |= Q(onomatopoeia_type_id=type_id)
+    if not condition:
+        return []
+    return list(LanguageRecord.objects.filter(condition).values_list('id', flat=True))
+
+
+def get_documents(record_ids):
+    """
+    言語記録の文書を ID の順に返す
+
+    文書がない・形式が古い記録はその場で作り直す。
+
+    Args:
+        record_ids: 言語記録IDのリスト
+
+    Returns:
+        JSON 文字列のリスト（存在しない記録は含まない）
+    """
+    record_ids = list(record_ids)
+    contents = dict(
+        RecordDocument.objects.filter(record_id__in=record_ids, version=DOCUMENT_VERSION)
+        .values_list('record_id', 'content')
+    )
+    missing = [record_id for record_id in record_ids if record_id not in contents]
+    if missing:
+        contents.update(refresh(missing))
+    return [contents[record_id] for record_id in record_ids if record_id in contents]
+
+
+def join_documents(record_ids):
+    """文書を連結して JSON 配列の文字列にする（再シリアライズしない）"""
+    return '[' + ','.join(get_documents(record_ids)) + ']'
+
+
+def rebuild():
+    """
+    すべての言語記録の文書を作り直す（一括登録などシグナルが送られない更新の後に使う）
+
+    Returns:
+        作り直した文書の数
+    """
+    record_ids = list(LanguageRecord.objects.order_by('id').values_list('id', flat=True))
+    count = 0
+    for start in range(0, len(record_ids), REFRESH_BATCH_SIZE):
+        count += len(refresh(record_ids[start:start + REFRESH_BATCH_SIZE]))
+    return count
@@ -0,0 +1,307 @@
+# language_archive/exports.py
+
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import GeographicRecord, LanguageRecord
+
+# データベースから一度に読み込む行数（Parquet では1つの行グループの行数）
+EXPORT_CHUNK_SIZE = 2000
+
+# CSV / JSON Lines で1回に送る文字数の目安（1行ずつ送ると書き込み回数が多すぎるため）
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# 書き出し形式と Content-Type
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# 書き出す列 (列名, 参照するフィールド, 型)。関連先の項目も1行にまとめる
+EXPORT_COLUMNS = {
+    'language': [
+        ('id', 'id', 'int'),
+        ('onomatopoeia_text', 'onomatopoeia_text', 'str'),
+        ('mora_pattern', 'mora_pattern', 'str'),
+        ('meaning', 'meaning', 'str'),
+        ('usage_example', 'usage_example', 'str'),
+        ('phonetic_notation', 'phonetic_notation', 'str'),
+        ('language_frequency', 'language_frequency', 'str'),
+        ('file_type', 'file_type', 'str'),
+        ('file_path', 'file_path', 'str'),
+        ('thumbnail_path', 'thumbnail_path', 'str'),
+        ('recorded_date', 'recorded_date', 'date'),
+        ('speaker_id', 'speaker__speaker_id', 'str'),
+        ('speaker_age_range', 'speaker__age_range', 'str'),
+        ('speaker_gender', 'speaker__gender', 'str'),
+        ('speaker_village', 'speaker__village__name', 'str'),
+        ('onomatopoeia_type', 'onomatopoeia_type__type_code', 'str'),
+        ('onomatopoeia_type_name', 'onomatopoeia_type__type_name', 'str'),
+        ('village', 'village__name', 'str'),
+        ('notes', 'notes', 'str'),
+        ('created_at', 'created_at', 'datetime'),
+    ],
+    'geographic': [
+        ('id', 'id', 'int'),
+        ('title', 'title', 'str'),
+        ('content_type', 'content_type', 'str'),
+        ('description', 'description', 'str'),
+        ('file_path', 'file_path', 'str'),
+        ('thumbnail_path', 'thumbnail_path', 'str'),
+        ('latitude', 'latitude', 'float'),
+        ('longitude', 'longitude', 'float'),
+        ('geohash', 'geohash', 'str'),
+        ('village', 'village__name', 'str'),
+        ('village_latitude', 'village__latitude', 'float'),
+        ('village_longitude', 'village__longitude', 'float'),
+        ('captured_date', 'captured_date', 'date'),
+        ('created_at', 'created_at', 'datetime'),
+    ],
+}
+
+
+class ExportError(Exception):
+    """書き出しを行えないエラー"""
+
+
+def filter_language_records(records, params):
+    """
+    言語記録一覧と同じ条件で絞り込む
+
+    Args:
+        records: LanguageRecord のクエリセット
+        params: request.GET などの条件（village, file_type, onomatopoeia_type, pattern）
+
+    Returns:
+        絞り込んだクエリセット
+    """
+    village_id = params.get('village')
+    file_type = params.get('file_type')
+    onomatopoeia_type_code = params.get('onomatopoeia_type')
+    pattern = (params.get('pattern') or '').strip().upper()
+
+    if village_id:
+        records = records.filter(speaker__village_id=village_id)
+    if file_type:
+        records = records.filter(file_type=file_type)
+    if onomatopoeia_type_code:
+        records = records.filter(onomatopoeia_type__type_code=onomatopoeia_type_code)
+    if pattern:
+        records = records.filter(mora_pattern=pattern)
+    return records
+
+
+def filter_geographic_records(geo_records, params):
+    """
+    地理環境データ一覧と同じ条件で絞り込む
+
+    Args:
+        geo_records: GeographicRecord のクエリセット
+        params: request.GET などの条件（content_type, village）
+
+    Returns:
+        絞り込んだクエリセット
+    """
+    content_type = params.get('content_type')
+    village_id = params.get('village')
+
+    if content_type:
+        geo_records = geo_records.filter(content_type=content_type)
+    if village_id:
+        geo_records = geo_records.filter(village_id=village_id)
+    return geo_records
+
+
+def export_queryset(kind, params=None):
+    """
+    書き出す記録のクエリセットを作る
+
+    公開中の記録だけを主キー順に返す。
+
+    Args:
+        kind: 'language' または 'geographic'
+        params: 絞り込み条件（省略時は全件）
+
+    Returns:
+        クエリセット
+    """
+    params = params or {}
+    if kind == 'language':
+        queryset = filter_language_records(LanguageRecord.objects.all(), params)
+    elif kind == 'geographic':
+        queryset = filter_geographic_records(GeographicRecord.objects.all(), params)
+    else:
+        raise ExportError(f'種類は {", ".join(EXPORT_COLUMNS)} のいずれかを指定してください')
+    return queryset.filter(upload_status='ready').order_by('pk')
+
+
+def iter_rows(queryset, kind, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    関連先の項目を結合した行をタプルで順に返す
+
+    values_list と iterator を使うため、モデルのインスタンスを作らず、
+    件数に関係なく chunk_size 行分のメモリしか使わない。
+    """
+    lookups = [lookup for _, lookup, _ in EXPORT_COLUMNS[kind]]
+    return queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+class _LineBuffer:
+    """csv.writer の出力をそのまま返す書き込み先"""
+
+    def write(self, value):
+        return value
+
+
+def _buffered(lines, buffer_size=STREAM_BUFFER_SIZE):
+    """行を buffer_size 文字程度ずつまとめて返す"""
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= buffer_size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_lines(rows, kind):
+    writer = csv.writer(_LineBuffer())
+    # Excel で文字化けしないよう BOM を付ける
+    yield '\ufeff' + writer.writerow([name for name, _, _ in EXPORT_COLUMNS[kind]])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(rows, kind):
+    names = [name for name, _, _ in EXPORT_COLUMNS[kind]]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_csv(rows, kind):
+    """CSV を返す"""
+    return _buffered(_csv_lines(rows, kind))
+
+
+def stream_jsonl(rows, kind):
+    """JSON Lines を返す"""
+    return _buffered(_jsonl_lines(rows, kind))
+
+
+class _ChunkSink:
+    """ParquetWriter が書き込んだバイト列を取り出せるようにためておく書き込み先"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema(pa, kind):
+    types = {
+        'int': pa.int64(),
+        'str': pa.string(),
+        'float': pa.float64(),
+        'date': pa.date32(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[column_type]) for name, _, column_type in EXPORT_COLUMNS[kind]])
+
+
+def _import_pyarrow():
+    # pyarrow は Parquet を書き出すときだけ読み込む
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportError(f'Parquet 形式の書き出しには pyarrow が必要です: {e}')
+    return pa, pq
+
+
+def stream_parquet(rows, kind, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Parquet ファイルを行グループ単位で返す
+
+    chunk_size 行ごとに列形式へ変換して1つの行グループとして書き出すため、
+    メモリ使用量は1行グループ分に収まる。
+    """
+    pa, pq = _import_pyarrow()
+    schema = _parquet_schema(pa, kind)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+
+    def write_batch(batch):
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        ))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            write_batch(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write_batch(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(kind, export_format, params=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    記録を指定した形式で書き出すジェネレーターを返す
+
+    Args:
+        kind: 'language' または 'geographic'
+        export_format: 'csv'、'jsonl'、'parquet' のいずれか
+        params: 絞り込み条件
+        chunk_size: データベースから一度に読み込む行数
+
+    Returns:
+        出力する文字列（Parquet ではバイト列）を順に返すジェネレーター
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f'形式は {", ".join(EXPORT_FORMATS)} のいずれかを指定してください')
+    if export_format == 'parquet':
+        # ジェネレーターの中ではなく、応答を返す前にエラーにする
+        _import_pyarrow()
+    rows = iter_rows(export_queryset(kind, params), kind, chunk_size)
+    if export_format == 'csv':
+        return stream_csv(rows, kind)
+    if export_format == 'jsonl':
+        return stream_jsonl(rows, kind)
+    return stream_parquet(rows, kind, chunk_size)
+
+
+def export_filename(kind, export_format):
+    """ダウンロード時のファイル名"""
+    return f'kikai_{kind}_records.{export_format}'
@@ -0,0 +1,175 @@
+# language_archive/geo.py
+
+import math
+import numpy as np
+
+# ジオハッシュの文字（base32）
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 保存するジオハッシュの桁数（約 3.7cm 四方）
+GEOHASH_PRECISION = 12
+
+# 表示範囲を覆うときに使う前方一致条件の最大数
+MAX_BBOX_PREFIXES = 16
+
+# 地球の平均半径（km）
+EARTH_RADIUS_KM = 6371.0088
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    緯度・経度をジオハッシュに変換する
+
+    Args:
+        lat: 緯度
+        lon: 経度
+        precision: 桁数
+
+    Returns:
+        ジオハッシュ文字列
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits <<= 1
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_for_point(lat, lon):
+    """
+    座標が未設定の場合は空文字を返す geohash_encode
+
+    Args:
+        lat: 緯度（None 可）
+        lon: 経度（None 可）
+
+    Returns:
+        ジオハッシュ文字列
+    """
+    if lat is None or lon is None:
+        return ''
+    return geohash_encode(lat, lon)
+
+
+def geohash_prefix_range(prefix):
+    """
+    前方一致をインデックスの範囲条件に変換する
+
+    prefix で始まるジオハッシュは [start, end) の範囲に収まる。
+    end が None の場合は上限なし（prefix が z のみで構成される場合）。
+
+    Args:
+        prefix: ジオハッシュの前方一致文字列
+
+    Returns:
+        (start, end) のタプル
+    """
+    chars = list(prefix)
+    while chars:
+        index = _BASE32.index(chars[-1])
+        if index + 1 < len(_BASE32):
+            chars[-1] = _BASE32[index + 1]
+            return prefix, ''.join(chars)
+        chars.pop()
+    return prefix, None
+
+
+def _cell_size(precision):
+    """指定した桁数のジオハッシュ1セルの大きさ（経度幅, 緯度幅）"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 360.0 / 2 ** lon_bits, 180.0 / 2 ** lat_bits
+
+
+def _cell_ranges(west, south, east, north, precision):
+    lon_size, lat_size = _cell_size(precision)
+    x_range = range(math.floor((west + 180) / lon_size), math.floor((east + 180) / lon_size) + 1)
+    y_range = range(math.floor((south + 90) / lat_size), math.floor((north + 90) / lat_size) + 1)
+    return lon_size, lat_size, x_range, y_range
+
+
+def geohash_prefixes_for_bbox(west, south, east, north, max_prefixes=MAX_BBOX_PREFIXES):
+    """
+    表示範囲を覆うジオハッシュの前方一致条件を求める
+
+    セル数が max_prefixes 以下に収まる範囲で最も細かい桁数を選ぶため、
+    インデックス上の少数の範囲スキャンで表示範囲内の行を取り出せる。
+
+    Args:
+        west, south, east, north: 表示範囲
+        max_prefixes: 前方一致条件の最大数
+
+    Returns:
+        ジオハッシュの前方一致文字列のリスト（空なら全範囲）
+    """
+    west, east = max(west, -180.0), min(east, 180.0)
+    south, north = max(south, -90.0), min(north, 90.0)
+    if west > east or south > north:
+        return []
+
+    best = []
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lon_size, lat_size, x_range, y_range = _cell_ranges(west, south, east, north, precision)
+        if len(x_range) * len(y_range) > max_prefixes:
+            break
+        best = sorted({
+            geohash_encode(
+                min((y + 0.5) * lat_size - 90, 90.0),
+                min((x + 0.5) * lon_size - 180, 180.0),
+                precision,
+            )
+            for x in x_range for y in y_range
+        })
+    return best
+
+
+def haversine_matrix(lats, lons, ref_lats, ref_lons):
+    """
+    2組の地点間の大円距離を行列でまとめて計算する
+
+    Args:
+        lats, lons: 地点の緯度・経度（長さ n）
+        ref_lats, ref_lons: 基準点の緯度・経度（長さ m）
+
+    Returns:
+        n×m の距離行列（km）
+    """
+    lat1 = np.radians(np.asarray(lats, dtype=float))[:, np.newaxis]
+    lon1 = np.radians(np.asarray(lons, dtype=float))[:, np.newaxis]
+    lat2 = np.radians(np.asarray(ref_lats, dtype=float))[np.newaxis, :]
+    lon2 = np.radians(np.asarray(ref_lons, dtype=float))[np.newaxis, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def nearest_points(lats, lons, ref_lats, ref_lons):
+    """
+    各地点に最も近い基準点を求める
+
+    Args:
+        lats, lons: 地点の緯度・経度（長さ n）
+        ref_lats, ref_lons: 基準点の緯度・経度（長さ m、1件以上）
+
+    Returns:
+        (基準点のインデックス, 距離km) の配列の組
+    """
+    distances = haversine_matrix(lats, lons, ref_lats, ref_lons)
+    indices = distances.argmin(axis=1)
+    return indices, distances[np.arange(len(indices)), indices]
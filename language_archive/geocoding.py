@@ -0,0 +1,364 @@
+# language_archive/geocoding.py
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import numpy as np
+import requests
+from django.conf import settings
+from django.utils import timezone
+from .geo import nearest_points
+from .models import GeocodeCache, Village
+
+# 国土地理院API
+GSI_ADDRESS_SEARCH_URL = 'https://msearch.gsi.go.jp/address-search/AddressSearch'
+GSI_REVERSE_GEOCODER_URL = 'https://mreversegeocoder.gsi.go.jp/reverse-geocoder/LonLatToAddress'
+
+# 通信のタイムアウト（接続, 読み取り）秒。遅い場合は集落テーブルで答える
+GSI_TIMEOUT = (2, 3)
+
+# APIの失敗後、この秒数は問い合わせずに集落テーブルで答える
+UPSTREAM_BACKOFF = 60
+
+# 逆ジオコーディングのキーにする座標の桁数（小数点以下4桁で約10m）
+COORDINATE_DECIMALS = 4
+
+# プロセス内に保持する結果の件数
+MEMORY_CACHE_SIZE = 4096
+
+# 「該当なし」の結果を使い続ける期間。住所が整備されて見つかるようになることがある
+NOT_FOUND_TTL = timedelta(days=7)
+
+# 「該当なし」の結果をプロセス内に保持する時間（秒）。期限が切れたらデータベースの
+# 有効期限で判断し直すため、プロセスが長く動いていても NOT_FOUND_TTL 後には問い合わせ直す
+NOT_FOUND_MEMORY_TTL = 60 * 60
+
+# 集落テーブルを読み直す間隔（秒）
+GAZETTEER_TTL = 300
+
+# 最寄りの集落名で答える最大距離（km）
+VILLAGE_MAX_DISTANCE_KM = 3.0
+
+# 一括処理でAPIに同時に問い合わせる数（国土地理院の負荷に配慮して少なめにする）
+BATCH_WORKERS = 4
+
+# データベースから一度に読み込むキーの数
+DB_BATCH_SIZE = 500
+
+_MISSING = object()
+
+
+class _MemoryCache:
+    """スレッドセーフな LRU キャッシュ（値に None を保存でき、項目ごとに有効期間を付けられる）"""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires_at = self.items.get(key, (_MISSING, None))
+            if value is _MISSING:
+                return value
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self.items[key]
+                return _MISSING
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        """timeout（秒）を省略した場合は LRU で追い出されるまで保持する"""
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self.items[key] = (value, expires_at)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class _Gazetteer:
+    """集落テーブルをメモリに読み込んだもの（APIが使えないときの答えに使う）"""
+
+    def __init__(self):
+        self.loaded_at = None
+        self.names = []
+        self.lats = np.empty(0)
+        self.lons = np.empty(0)
+        self.lock = threading.Lock()
+
+    def _load(self):
+        with self.lock:
+            if self.loaded_at is not None and time.monotonic() - self.loaded_at < GAZETTEER_TTL:
+                return
+            villages = list(Village.objects.values_list('name', 'latitude', 'longitude'))
+            self.names = [name for name, _, _ in villages]
+            self.lats = np.array([lat for _, lat, _ in villages], dtype=float)
+            self.lons = np.array([lon for _, _, lon in villages], dtype=float)
+            self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def nearest_name(self, lat, lon):
+        """VILLAGE_MAX_DISTANCE_KM 以内で最も近い集落名（なければ None）"""
+        self._load()
+        if not self.names:
+            return None
+        indices, distances = nearest_points([lat], [lon], self.lats, self.lons)
+        if distances[0] > VILLAGE_MAX_DISTANCE_KM:
+            return None
+        return self.names[int(indices[0])]
+
+    def find_in_address(self, address):
+        """住所に含まれる集落名のうち最も長いものの座標（なければ None）"""
+        self._load()
+        matches = [i for i, name in enumerate(self.names) if name and name in address]
+        if not matches:
+            return None
+        i = max(matches, key=lambda i: len(self.names[i]))
+        return float(self.lats[i]), float(self.lons[i])
+
+
+_memory = _MemoryCache(MEMORY_CACHE_SIZE)
+_gazetteer = _Gazetteer()
+_session = requests.Session()
+_upstream_down_until = 0.0
+
+
+def normalize_address(address):
+    """住所をキャッシュのキーにするため正規化する（全角英数・空白の揺れをなくす）"""
+    address = unicodedata.normalize('NFKC', address or '')
+    return re.sub(r'\s+', ' ', address).strip()[:255]
+
+
+def coordinate_key(lat, lon):
+    """座標を逆ジオコーディングのキーにする（近い座標は同じキーになる）"""
+    return f'{float(lat):.{COORDINATE_DECIMALS}f},{float(lon):.{COORDINATE_DECIMALS}f}'
+
+
+def _parse_coordinate_key(key):
+    lat, lon = key.split(',')
+    return float(lat), float(lon)
+
+
+def _upstream_available():
+    return not getattr(settings, 'GEOCODING_OFFLINE', False) and time.monotonic() >= _upstream_down_until
+
+
+def _mark_upstream_down():
+    global _upstream_down_until
+    _upstream_down_until = time.monotonic() + UPSTREAM_BACKOFF
+
+
+def _fetch_forward(key):
+    """国土地理院APIで住所を座標にする。該当なしは None、通信エラーは例外"""
+    response = _session.get(GSI_ADDRESS_SEARCH_URL, params={'q': key}, timeout=GSI_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if not data:
+        return None
+    # 地理院APIは[経度, 緯度]の順で返すので、順序を入れ替える
+    lon, lat = data[0]['geometry']['coordinates'][:2]
+    return float(lat), float(lon)
+
+
+def _fetch_reverse(key):
+    """国土地理院APIで座標を住所（大字・町丁目名）にする。該当なしは None、通信エラーは例外"""
+    lat, lon = _parse_coordinate_key(key)
+    response = _session.get(GSI_REVERSE_GEOCODER_URL, params={'lat': lat, 'lon': lon}, timeout=GSI_TIMEOUT)
+    response.raise_for_status()
+    result = (response.json() or {}).get('results') or {}
+    return result.get('lv01Nm') or None
+
+
+def _fallback(kind, key):
+    """APIが使えないときに集落テーブルから答える"""
+    if kind == 'forward':
+        return _gazetteer.find_in_address(key)
+    return _gazetteer.nearest_name(*_parse_coordinate_key(key))
+
+
+def _from_entry(entry):
+    if not entry.found:
+        return None
+    if entry.kind == 'forward':
+        return entry.latitude, entry.longitude
+    return entry.address
+
+
+def _load_entries(kind, keys):
+    """データベースのキャッシュを読み込む（期限切れの「該当なし」は除く）"""
+    results = {}
+    not_found_after = timezone.now() - NOT_FOUND_TTL
+    for start in range(0, len(keys), DB_BATCH_SIZE):
+        entries = GeocodeCache.objects.filter(kind=kind, key__in=keys[start:start + DB_BATCH_SIZE])
+        for entry in entries:
+            if entry.found or entry.updated_at >= not_found_after:
+                results[entry.key] = _from_entry(entry)
+    return results
+
+
+def _save_entries(kind, values):
+    """APIの結果をデータベースに保存する（既存の行は更新する）"""
+    entries = []
+    for key, value in values.items():
+        entry = GeocodeCache(kind=kind, key=key, found=value is not None)
+        if value is not None and kind == 'forward':
+            entry.latitude, entry.longitude = value
+        elif value is not None:
+            entry.address = value[:255]
+        entries.append(entry)
+    GeocodeCache.objects.bulk_create(
+        entries, batch_size=DB_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['kind', 'key'],
+        update_fields=['address', 'latitude', 'longitude', 'found', 'updated_at'],
+    )
+
+
+def _fetch_many(kind, keys, workers):
+    """APIに問い合わせる。失敗したキーは結果に含めない（失敗したら残りは問い合わせない）"""
+    fetch = _fetch_forward if kind == 'forward' else _fetch_reverse
+
+    def fetch_one(key):
+        if not _upstream_available():
+            return key, _MISSING
+        try:
+            return key, fetch(key)
+        except (requests.RequestException, ValueError, KeyError, IndexError, TypeError):
+            _mark_upstream_down()
+            return key, _MISSING
+
+    if len(keys) == 1 or workers <= 1:
+        pairs = [fetch_one(key) for key in keys]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pairs = list(executor.map(fetch_one, keys))
+    return {key: value for key, value in pairs if value is not _MISSING}
+
+
+def _remember(kind, key, value):
+    """結果をプロセス内に保持する（「該当なし」はデータベースより早く期限切れにする）"""
+    _memory.set((kind, key), value, NOT_FOUND_MEMORY_TTL if value is None else None)
+
+
+def _resolve(kind, keys, offline=False, workers=BATCH_WORKERS):
+    """
+    プロセス内キャッシュ → データベース → API → 集落テーブル の順に答えを探す
+
+    APIの結果だけをデータベースとプロセス内に保存し、集落テーブルでの答えは保存しない
+    （APIが復旧したら正式な結果に置き換わるようにする）。
+
+    Returns:
+        {キー: 結果} の辞書
+    """
+    results = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        value = _memory.get((kind, key))
+        if value is _MISSING:
+            missing.append(key)
+        else:
+            results[key] = value
+
+    if missing:
+        stored = _load_entries(kind, missing)
+        for key, value in stored.items():
+            _remember(kind, key, value)
+        results.update(stored)
+        missing = [key for key in missing if key not in stored]
+
+    if missing and not offline and _upstream_available():
+        fetched = _fetch_many(kind, missing, workers)
+        if fetched:
+            _save_entries(kind, fetched)
+            for key, value in fetched.items():
+                _remember(kind, key, value)
+            results.update(fetched)
+            missing = [key for key in missing if key not in fetched]
+
+    for key in missing:
+        results[key] = _fallback(kind, key)
+    return results
+
+
+def geocode(address, offline=False):
+    """
+    住所を緯度・経度に変換する（ジオコーディング）
+
+    Args:
+        address: 住所文字列
+        offline: True の場合はAPIに問い合わせない
+
+    Returns:
+        (緯度, 経度) のタプル。見つからない場合は None
+    """
+    key = normalize_address(address)
+    if not key:
+        return None
+    return _resolve('forward', [key], offline)[key]
+
+
+def reverse_geocode(lat, lon, offline=False):
+    """
+    緯度・経度を住所（大字・町丁目名、APIが使えない場合は最寄りの集落名）に変換する
+
+    Args:
+        lat: 緯度
+        lon: 経度
+        offline: True の場合はAPIに問い合わせない
+
+    Returns:
+        住所文字列。見つからない場合は None
+    """
+    key = coordinate_key(lat, lon)
+    return _resolve('reverse', [key], offline)[key]
+
+
+def geocode_many(addresses, offline=False, workers=BATCH_WORKERS):
+    """
+    複数の住所をまとめてジオコーディングする（データの補完用）
+
+    キャッシュにない住所だけを並列にAPIへ問い合わせ、結果はまとめて保存する。
+
+    Returns:
+        {住所: (緯度, 経度) または None} の辞書
+    """
+    keys = {address: normalize_address(address) for address in addresses}
+    results = _resolve('forward', [key for key in keys.values() if key], offline, workers)
+    return {address: results.get(key) for address, key in keys.items()}
+
+
+def reverse_geocode_many(points, offline=False, workers=BATCH_WORKERS):
+    """
+    複数の座標をまとめて逆ジオコーディングする（データの補完用）
+
+    Args:
+        points: (緯度, 経度) のリスト
+
+    Returns:
+        {(緯度, 経度): 住所 または None} の辞書
+    """
+    keys = {tuple(point): coordinate_key(*point) for point in points}
+    results = _resolve('reverse', list(keys.values()), offline, workers)
+    return {point: results[key] for point, key in keys.items()}
+
+
+def villages_changed():
+    """集落テーブルの変更時に、このプロセスの集落データを読み直させる"""
+    _gazetteer.invalidate()
+
+
+def clear_memory_cache():
+    """このプロセス内のキャッシュを空にする"""
+    _memory.clear()
+    _gazetteer.invalidate()
@@ -0,0 +1,343 @@
+# language_archive/importer.py
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .caching import bump_data_version
+from .geo import geohash_for_point
+from .kana import reduplication_pattern
+from .models import GeographicRecord, LanguageRecord, OnomatopoeiaType, Speaker, Village
+from .services import get_bucket_name, get_storage_client, storage_object_name
+from . import archive_stats, clusters, documents, kana_index, rollup, search
+
+# 1回のトランザクションで登録する件数
+IMPORT_CHUNK_SIZE = 500
+
+# 表計算ソフトで読み込む拡張子
+EXCEL_SUFFIXES = ('.xlsx', '.xlsm', '.xls')
+
+# 先に試す日付の書式（pandas での解析は1行ずつだと遅いため）
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S')
+
+
+class RecordImportError(Exception):
+    """取り込みを続けられないエラー"""
+
+
+def read_table(path):
+    """
+    CSV / Excel ファイルを文字列の表として読み込む
+
+    Args:
+        path: ファイルのパス
+
+    Returns:
+        各行を {列名: 文字列} とした辞書のリスト
+    """
+    path = Path(path)
+    if path.suffix.lower() in EXCEL_SUFFIXES:
+        try:
+            frame = pd.read_excel(path, dtype=str, keep_default_na=False)
+        except ImportError as e:
+            raise RecordImportError(f'Excel ファイルの読み込みには openpyxl が必要です: {e}')
+    else:
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    frame.columns = [str(column).strip() for column in frame.columns]
+    return [
+        {key: str(value).strip() for key, value in row.items()}
+        for row in frame.to_dict('records')
+    ]
+
+
+def _parse_date(value, label):
+    if not value:
+        raise ValueError(f'{label}が空です')
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    try:
+        return pd.to_datetime(value).date()
+    except (ValueError, TypeError):
+        raise ValueError(f'{label}「{value}」を日付として読み取れません')
+
+
+def _parse_float(value, label):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{label}「{value}」を数値として読み取れません')
+
+
+def _validation_message(error):
+    if hasattr(error, 'message_dict'):
+        return ' / '.join(f'{field}: {"、".join(messages)}' for field, messages in error.message_dict.items())
+    return '、'.join(error.messages)
+
+
+class RecordImporter:
+    """
+    表形式のファイルから言語記録・地理環境データを一括で取り込む
+
+    話者・集落・オノマトペ型は自然キー（話者ID・集落名・型コード）で
+    事前に読み込んだ辞書から引く。メディアは StorageClient で並列にアップロードし、
+    レコードは chunk_size 件ずつ bulk_create する。
+    進捗は状態ファイルに保存し、途中で失敗しても再実行すると続きから取り込む。
+    """
+
+    MODELS = {
+        'language': LanguageRecord,
+        'geographic': GeographicRecord,
+    }
+
+    def __init__(self, path, model='language', media_dir=None, chunk_size=IMPORT_CHUNK_SIZE,
+                 state_path=None, restart=False, skip_invalid=False, stdout=None):
+        if model not in self.MODELS:
+            raise RecordImportError(f'model は {", ".join(self.MODELS)} のいずれかを指定してください')
+        self.path = Path(path).resolve()
+        self.model_name = model
+        self.model = self.MODELS[model]
+        self.media_dir = Path(media_dir).resolve() if media_dir else self.path.parent
+        self.chunk_size = chunk_size
+        self.state_path = Path(state_path) if state_path else self.path.with_name(self.path.name + '.import_state.json')
+        self.restart = restart
+        self.skip_invalid = skip_invalid
+        self.stdout = stdout
+
+        self.speakers = {}
+        self.villages = {}
+        self.types = {}
+        # 検証で見つかったエラー [(表示用の行番号, エラー内容), ...]
+        self.errors = []
+
+    def _write(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def load_lookups(self):
+        """自然キーから関連データを引く辞書を用意する"""
+        self.speakers = {s.speaker_id: s for s in Speaker.objects.all()}
+        self.villages = {v.name: v for v in Village.objects.all()}
+        self.types = {t.type_code: t for t in OnomatopoeiaType.objects.all()}
+
+    def _lookup(self, table, key, label, required=True):
+        if not key:
+            if required:
+                raise ValueError(f'{label}が空です')
+            return None
+        try:
+            return table[key]
+        except KeyError:
+            raise ValueError(f'{label}「{key}」が登録されていません')
+
+    def _media(self, row, bucket_name, file_prefix):
+        """アップロードするメディアファイル（なければ None）を返す"""
+        file_name = row.get('file', '')
+        if not file_name:
+            if not row.get('file_path'):
+                raise ValueError('file（メディアファイル）または file_path（URL）のどちらかが必要です')
+            return None
+        media_path = (self.media_dir / file_name).resolve()
+        if not media_path.is_file():
+            raise ValueError(f'メディアファイル「{file_name}」が見つかりません')
+        return str(media_path), bucket_name, file_prefix
+
+    def _build_language_record(self, row):
+        speaker = self._lookup(self.speakers, row.get('speaker'), '話者')
+        record = LanguageRecord(
+            onomatopoeia_text=row.get('onomatopoeia_text', ''),
+            meaning=row.get('meaning', ''),
+            usage_example=row.get('usage_example', ''),
+            phonetic_notation=row.get('phonetic_notation', ''),
+            language_frequency=row.get('language_frequency', ''),
+            file_type=row.get('file_type', ''),
+            file_path=row.get('file_path', ''),
+            thumbnail_path=row.get('thumbnail_path', ''),
+            speaker=speaker,
+            onomatopoeia_type=self._lookup(self.types, row.get('onomatopoeia_type'), 'オノマトペ型'),
+            village=self._lookup(self.villages, row.get('village'), '集落', required=False) or speaker.village,
+            recorded_date=_parse_date(row.get('recorded_date'), '収録日'),
+            notes=row.get('notes', ''),
+        )
+        # bulk_create では save() が呼ばれないため、ここで計算する
+        record.mora_pattern = reduplication_pattern(record.onomatopoeia_text)
+        record.full_clean(exclude=['speaker', 'onomatopoeia_type', 'village'])
+        media = self._media(row, get_bucket_name(record.file_type), f"language/{record.file_type}/")
+        return record, media
+
+    def _build_geographic_record(self, row):
+        village = self._lookup(self.villages, row.get('village'), '集落', required=False)
+        latitude = _parse_float(row.get('latitude'), '緯度')
+        longitude = _parse_float(row.get('longitude'), '経度')
+        if (latitude is None or longitude is None) and village:
+            latitude, longitude = village.latitude, village.longitude
+        record = GeographicRecord(
+            title=row.get('title', ''),
+            content_type=row.get('content_type', ''),
+            file_path=row.get('file_path', ''),
+            thumbnail_path=row.get('thumbnail_path', ''),
+            description=row.get('description', ''),
+            village=village,
+            latitude=latitude,
+            longitude=longitude,
+            captured_date=_parse_date(row.get('captured_date'), '撮影日'),
+        )
+        # bulk_create では save() が呼ばれないため、ここで計算する
+        record.geohash = geohash_for_point(latitude, longitude)
+        record.full_clean(exclude=['village'])
+        media = self._media(row, get_bucket_name(record.content_type), f"geographic/{record.content_type}/")
+        return record, media
+
+    def build(self, row):
+        """
+        1行分のレコードを作る（保存はしない）
+
+        Returns:
+            (モデルのインスタンス, (メディアのパス, バケット名, プレフィックス) または None)
+        """
+        if self.model is LanguageRecord:
+            return self._build_language_record(row)
+        return self._build_geographic_record(row)
+
+    def validate(self, rows, start=0):
+        """
+        start 行目以降を検証する
+
+        Returns:
+            ([(行番号, インスタンス, メディア), ...], [(表示用の行番号, エラー内容), ...])
+        """
+        valid = []
+        errors = []
+        for index in range(start, len(rows)):
+            try:
+                record, media = self.build(rows[index])
+            except ValidationError as e:
+                errors.append((index + 2, _validation_message(e)))
+            except ValueError as e:
+                errors.append((index + 2, str(e)))
+            else:
+                valid.append((index, record, media))
+        return valid, errors
+
+    def load_state(self):
+        if self.restart or not self.state_path.exists():
+            return {'next_row': 0, 'uploaded': {}}
+        with open(self.state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('source') != str(self.path) or state.get('model') != self.model_name:
+            raise RecordImportError(f'状態ファイル {self.state_path} は別の取り込みのものです（--restart で最初から取り込めます）')
+        return state
+
+    def save_state(self, state):
+        state = {**state, 'source': str(self.path), 'model': self.model_name}
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _upload_chunk(self, chunk, uploaded):
+        """チャンク内の未アップロードのメディアを並列にアップロードする"""
+        pending = {}
+        for index, record, media in chunk:
+            if media and str(index) not in uploaded:
+                media_path, bucket_name, file_prefix = media
+                pending[(media_path, bucket_name, storage_object_name(media_path, file_prefix))] = index
+        if not pending:
+            return {}
+        results, errors = get_storage_client().upload_many(list(pending))
+        for item, public_url in results.items():
+            uploaded[str(pending[item])] = public_url
+        return {pending[item] + 2: error for item, error in errors.items()}
+
+    def run(self, dry_run=False):
+        """
+        取り込みを実行する
+
+        Args:
+            dry_run: True の場合は検証だけを行い、アップロードも保存もしない
+
+        Returns:
+            {'created', 'skipped', 'errors', 'media'} の辞書
+        """
+        rows = read_table(self.path)
+        state = self.load_state()
+        start = state['next_row']
+        if start:
+            self._write(f'{start + 1} 行目（データ行）から取り込みを再開します')
+
+        self.load_lookups()
+        valid, errors = self.validate(rows, start)
+        self.errors = errors
+        summary = {
+            'created': 0,
+            'skipped': len(errors),
+            'errors': errors,
+            'media': sum(1 for _, _, media in valid if media),
+        }
+        if dry_run:
+            return summary
+        if errors and not self.skip_invalid:
+            raise RecordImportError(f'{len(errors)} 行にエラーがあるため取り込みを中止しました（--skip-invalid でエラー行を飛ばせます）')
+
+        uploaded = state.get('uploaded', {})
+        created_ids = []
+        try:
+            for offset in range(0, len(valid), self.chunk_size):
+                chunk = valid[offset:offset + self.chunk_size]
+
+                upload_errors = self._upload_chunk(chunk, uploaded)
+                # アップロード済みのURLを先に保存し、再実行時に送り直さないようにする
+                self.save_state({'next_row': state['next_row'], 'uploaded': uploaded})
+                if upload_errors:
+                    details = '、'.join(f'{row} 行目: {error}' for row, error in list(upload_errors.items())[:5])
+                    raise RecordImportError(f'{len(upload_errors)} 件のメディアのアップロードに失敗しました（再実行すると続きから取り込みます）: {details}')
+
+                records = []
+                for index, record, media in chunk:
+                    if media:
+                        record.file_path = uploaded[str(index)]
+                    records.append(record)
+
+                with transaction.atomic():
+                    created = self.model.objects.bulk_create(records)
+                    if self.model is LanguageRecord:
+                        for record in created:
+                            search.index_record(record)
+
+                summary['created'] += len(created)
+                created_ids.extend(record.id for record in created)
+                for index, _, _ in chunk:
+                    uploaded.pop(str(index), None)
+                state['next_row'] = chunk[-1][0] + 1
+                self.save_state({'next_row': state['next_row'], 'uploaded': uploaded})
+                self._write(f'{summary["created"]} / {len(valid)} 件を登録しました')
+        finally:
+            # 途中のチャンクで失敗しても、登録済みの記録は派生データに反映する
+            if summary['created']:
+                self._refresh_derived_data(created_ids)
+        self.state_path.unlink(missing_ok=True)
+        return summary
+
+    def _refresh_derived_data(self, created_ids):
+        """
+        bulk_create ではシグナルが送られないため、派生データをまとめて更新する
+
+        Args:
+            created_ids: 登録した記録のID（API の文書は登録した記録の分だけ作る）
+        """
+        if self.model is LanguageRecord:
+            if kana_index.get_reader().available():
+                kana_index.build_index()
+            archive_stats.reconcile()
+            rollup.reconcile()
+            documents.refresh(created_ids)
+        else:
+            clusters.rebuild()
+        bump_data_version()
@@ -0,0 +1,253 @@
+# language_archive/jobs.py
+
+import logging
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import UploadJob
+from .services import storage_object_name, upload_object
+from . import thumbnails, waveforms
+
+logger = logging.getLogger(__name__)
+
+# 失敗したジョブを再試行する最大回数
+MAX_UPLOAD_ATTEMPTS = 5
+
+# 再試行までの待ち時間（秒）。試行のたびに倍にする
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+
+# 処理中のジョブからこの時間（秒）応答がなければ、ワーカーが落ちたとみなして再実行する
+STALE_JOB_TIMEOUT = 10 * 60
+
+# 新しいジョブを確認する間隔（秒）
+POLL_INTERVAL = 2
+
+# 一時ファイルへの書き込み単位
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+def _spool_dir():
+    path = Path(settings.UPLOAD_SPOOL_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def spool_upload(file):
+    """
+    アップロードされたファイルを一時ディレクトリに書き出す
+
+    Args:
+        file: Django の UploadedFile
+
+    Returns:
+        書き出したファイルのパス
+    """
+    path = _spool_dir() / f"{uuid.uuid4()}{Path(file.name).suffix}"
+    with open(path, 'wb') as f:
+        for chunk in file.chunks(SPOOL_CHUNK_SIZE):
+            f.write(chunk)
+    return path
+
+
+def enqueue_upload(record, file, bucket_name, file_prefix=""):
+    """
+    ファイルを一時ディレクトリに保存し、アップロードジョブを登録する
+
+    record は保存済みで upload_status が pending のものを渡す。
+    アップロード自体は run_upload_worker が行う。
+
+    Args:
+        record: LanguageRecord または GeographicRecord
+        file: Django の UploadedFile
+        bucket_name: バケット名
+        file_prefix: ファイル名のプレフィックス
+
+    Returns:
+        UploadJob
+    """
+    spool_path = spool_upload(file)
+    try:
+        record_field = 'language_record' if record._meta.model_name == 'languagerecord' else 'geographic_record'
+        return UploadJob.objects.create(
+            bucket_name=bucket_name,
+            object_name=storage_object_name(file.name, file_prefix),
+            spool_path=str(spool_path),
+            original_name=file.name,
+            content_type=file.content_type or '',
+            size=file.size,
+            **{record_field: record},
+        )
+    except Exception:
+        spool_path.unlink(missing_ok=True)
+        raise
+
+
+def remove_spool_file(job):
+    """ジョブの一時ファイルを削除する"""
+    if job.spool_path:
+        Path(job.spool_path).unlink(missing_ok=True)
+
+
+def claim_next_job():
+    """
+    実行できるジョブを1件取得して処理中にする
+
+    条件付き UPDATE で状態を書き換えられたワーカーだけがジョブを得るため、
+    複数のワーカーが同時に動いても同じジョブを重複して処理しない。
+
+    Returns:
+        UploadJob。実行できるジョブがない場合は None
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=STALE_JOB_TIMEOUT)
+    candidates = UploadJob.objects.filter(
+        Q(status='pending', run_after__lte=now) | Q(status='running', locked_at__lt=stale)
+    ).order_by('run_after', 'id').values_list('id', 'status', 'locked_at')[:10]
+
+    for job_id, status, locked_at in candidates:
+        claimed = UploadJob.objects.filter(id=job_id, status=status, locked_at=locked_at).update(
+            status='running', locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return UploadJob.objects.select_related('language_record', 'geographic_record').get(id=job_id)
+    return None
+
+
+def _set_record_status(job, upload_status, file_path=None, thumbnail_path=None):
+    record = job.record
+    if record is None:
+        return
+    record.upload_status = upload_status
+    update_fields = ['upload_status']
+    if file_path is not None:
+        record.file_path = file_path
+        update_fields.append('file_path')
+    if thumbnail_path is not None:
+        record.thumbnail_path = thumbnail_path
+        update_fields.append('thumbnail_path')
+    try:
+        record.save(update_fields=update_fields)
+    except DatabaseError:
+        # 処理中に記録が削除された場合
+        pass
+
+
+def _create_thumbnail(job):
+    """
+    一時ファイルからサムネイル（動画はポスターフレーム）を作ってアップロードする
+
+    サムネイルを作れなくても記録は公開するため、失敗はログに残すだけにする。
+
+    Returns:
+        サムネイルの公開URL。作らなかった場合は None
+    """
+    record = job.record
+    kind = thumbnails.media_kind(record, job.original_name) if record is not None else None
+    if kind is None:
+        return None
+    try:
+        return thumbnails.upload_thumbnail(job.spool_path, kind, job.bucket_name, job.object_name)
+    except Exception as e:
+        logger.warning("サムネイルを作成できませんでした（ジョブ #%s）: %s", job.id, e)
+        return None
+
+
+def _build_waveform(job):
+    """音声の場合は一時ファイルから波形ピークを作って保存する（失敗してもジョブは成功にする）"""
+    record = job.record
+    if record is None or record._meta.model_name != 'languagerecord' or record.file_type != 'audio':
+        return
+    try:
+        waveforms.save_waveform(record, waveforms.waveform_from_file(job.spool_path))
+    except Exception as e:
+        logger.warning("音声波形を作成できませんでした（ジョブ #%s）: %s", job.id, e)
+
+
+def run_job(job):
+    """
+    アップロードジョブを1件実行する
+
+    成功した場合はサムネイル（音声は波形ピーク）を作り、記録の file_path と thumbnail_path を埋めて公開状態にする。
+    失敗した場合は待ち時間を倍にしながら MAX_UPLOAD_ATTEMPTS 回まで再試行する。
+    TUS アップロードのURLを保存しておき、再試行時は送信済みの続きから送る。
+
+    Args:
+        job: claim_next_job で取得した UploadJob
+
+    Returns:
+        True: 成功 / False: 失敗
+    """
+    jobs = UploadJob.objects.filter(id=job.id)
+
+    def on_progress(sent, total):
+        # 進捗の記録を兼ねて最終応答日時を更新する
+        jobs.update(bytes_sent=sent, locked_at=timezone.now())
+
+    def on_session(upload_url):
+        jobs.update(upload_url=upload_url)
+
+    try:
+        with open(job.spool_path, 'rb') as f:
+            public_url = upload_object(
+                File(f, name=job.original_name),
+                job.bucket_name,
+                job.object_name,
+                content_type=job.content_type or None,
+                on_progress=on_progress,
+                upload_url=job.upload_url or None,
+                on_session=on_session,
+            )
+    except Exception as e:
+        if job.attempts >= MAX_UPLOAD_ATTEMPTS or isinstance(e, FileNotFoundError):
+            jobs.update(status='failed', error=str(e), locked_at=None)
+            _set_record_status(job, 'failed')
+            remove_spool_file(job)
+        else:
+            delay = min(RETRY_BASE_DELAY * 2 ** (job.attempts - 1), RETRY_MAX_DELAY)
+            jobs.update(
+                status='pending', error=str(e), locked_at=None,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+        return False
+
+    thumbnail_path = _create_thumbnail(job)
+    _build_waveform(job)
+    jobs.update(status='done', bytes_sent=job.size, error='', locked_at=None)
+    _set_record_status(job, 'ready', public_url, thumbnail_path)
+    remove_spool_file(job)
+    return True
+
+
+def run_worker(poll_interval=POLL_INTERVAL, once=False, stdout=None):
+    """
+    ジョブキューを処理し続ける
+
+    Args:
+        poll_interval: ジョブがないときに待つ秒数
+        once: True の場合は実行できるジョブがなくなった時点で終了する
+        stdout: 処理状況の出力先（省略時は出力しない）
+
+    Returns:
+        処理したジョブ数
+    """
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        succeeded = run_job(job)
+        processed += 1
+        if stdout:
+            result = '完了' if succeeded else '失敗'
+            stdout.write(f"[{result}] #{job.id} {job.original_name}（{job.attempts} 回目）")
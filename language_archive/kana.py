@@ -0,0 +1,125 @@
+# language_archive/kana.py
+
+import unicodedata
+
+# 小書きの仮名 → 通常の仮名
+_SMALL_KANA = str.maketrans('ぁぃぅぇぉっゃゅょゎゕゖ', 'あいうえおつやゆよわかけ')
+
+# 長音を表す記号（NFKC 正規化後）
+_LONG_VOWEL_MARKS = 'ー〜~－‐―'
+
+# 仮名ごとの母音（長音記号を直前の母音に置き換えるため）
+_VOWEL_ROWS = {
+    'あ': 'あかさたなはまやらわがざだばぱぁゃゎゕ',
+    'い': 'いきしちにひみりぎじぢびぴぃ',
+    'う': 'うくすつぬふむゆるぐずづぶぷぅっゅゔ',
+    'え': 'えけせてねへめれげぜでべぺぇゖ',
+    'お': 'おこそとのほもよろをごぞどぼぽぉょ',
+}
+_VOWEL_OF = {kana: vowel for vowel, row in _VOWEL_ROWS.items() for kana in row}
+
+
+def katakana_to_hiragana(text):
+    """
+    カタカナをひらがなに変換する
+
+    Args:
+        text: 変換する文字列
+
+    Returns:
+        ひらがなに揃えた文字列
+    """
+    return ''.join(
+        chr(ord(ch) - 0x60) if 'ァ' <= ch <= 'ヶ' or ch in 'ヽヾ' else ch
+        for ch in text
+    )
+
+
+def normalize_kana(text):
+    """
+    表記ゆれを吸収した正規形に変換する
+
+    - 半角カナ・全角英数を NFKC で統一
+    - カタカナをひらがなに統一
+    - 長音記号を直前の仮名の母音に展開（じーっ → じいつ）
+    - 小書きの仮名を通常の仮名に統一（っ → つ）
+    - 英字を小文字に統一
+
+    Args:
+        text: 正規化する文字列
+
+    Returns:
+        正規化済みの文字列
+    """
+    if not text:
+        return ''
+    text = katakana_to_hiragana(unicodedata.normalize('NFKC', text)).lower()
+
+    chars = []
+    for ch in text:
+        if ch in _LONG_VOWEL_MARKS and chars and chars[-1] in _VOWEL_OF:
+            ch = _VOWEL_OF[chars[-1]]
+        chars.append(ch)
+    return ''.join(chars).translate(_SMALL_KANA)
+
+
+# 直前の仮名と合わせて1モーラになる小書きの仮名
+_COMBINING_SMALL_KANA = 'ぁぃぅぇぉゃゅょゎ'
+
+# 特殊モーラの記号（促音・撥音・長音）
+SPECIAL_MORAE = {'っ': 'Q', 'ん': 'N', 'ー': 'R'}
+
+# 通常モーラに割り当てる記号（特殊モーラの Q/N/R は除く）
+_PATTERN_LETTERS = 'ABCDEFGHIJKLMOPSTUVWXYZ'
+
+
+def split_morae(text):
+    """
+    オノマトペをモーラに分割する
+
+    拗音（きゃ など）は1モーラにまとめ、促音・撥音・長音はそれぞれ1モーラとする。
+    空白や記号は無視する。
+
+    Args:
+        text: オノマトペの表記
+
+    Returns:
+        モーラのリスト（ひらがな、長音は「ー」に統一）
+    """
+    text = katakana_to_hiragana(unicodedata.normalize('NFKC', text or ''))
+    morae = []
+    for ch in text:
+        if ch in _LONG_VOWEL_MARKS:
+            ch = 'ー'
+        elif unicodedata.category(ch)[0] in 'PZC':
+            continue
+        if ch in _COMBINING_SMALL_KANA and morae and morae[-1] not in SPECIAL_MORAE:
+            morae[-1] += ch
+        else:
+            morae.append(ch)
+    return morae
+
+
+def reduplication_pattern(text):
+    """
+    オノマトペの反復構造を表す型を返す
+
+    通常のモーラには初出順に A, B, C ... を、促音には Q、撥音には N、
+    長音には R を割り当てる（ごろごろ → ABAB、ぱらっ → ABQ、どんどん → ANAN）。
+
+    Args:
+        text: オノマトペの表記
+
+    Returns:
+        型を表す文字列。モーラがなければ空文字列
+    """
+    letters = {}
+    pattern = []
+    for mora in split_morae(text):
+        if mora in SPECIAL_MORAE:
+            pattern.append(SPECIAL_MORAE[mora])
+            continue
+        if mora not in letters:
+            letters[mora] = _PATTERN_LETTERS[len(letters) % len(_PATTERN_LETTERS)]
+        pattern.append(letters[mora])
+    return ''.join(pattern)
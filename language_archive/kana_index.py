@@ -0,0 +1,425 @@
+# language_archive/kana_index.py
+
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows（開発環境）ではファイルロックを省略
+    fcntl = None
+
+from .kana import normalize_kana
+
+# ファイル形式
+#
+#   ヘッダー        magic, version, n-gram数, 文書数, postings長, テキスト長
+#   keys            uint64[n-gram数]     2文字を (cp1 << 21 | cp2) に詰めたキー（昇順）
+#   starts          uint32[n-gram数+1]   postings 内の開始位置
+#   postings        uint32[postings長]   文書番号（昇順）
+#   doc_ids         int64[文書数]        文書番号 → LanguageRecord.id（昇順）
+#   text_offsets    uint32[文書数+1]     text 内の開始位置
+#   text            UTF-8                正規化済みテキスト（照合・再構築用）
+#
+# 各配列は8バイト境界に揃えるため、numpy.frombuffer でmmap上に直接展開できる。
+MAGIC = b'KKNG'
+VERSION = 1
+_HEADER = struct.Struct('<4sIIIQQ')
+
+# 文書の末尾に付ける番兵（1文字検索でも bigram の先頭として引けるようにする）
+_SENTINEL = 0
+
+# フィールドの区切り（1番目はオノマトペ。ヒット位置による順位付けに使う）
+FIELD_SEPARATOR = '\n'
+
+# 索引に含める LanguageRecord のフィールド（この順に連結する）
+INDEXED_FIELDS = ('onomatopoeia_text', 'meaning', 'usage_example', 'phonetic_notation')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _bigram_keys(text):
+    codes = [ord(ch) for ch in text] + [_SENTINEL]
+    return {(a << 21) | b for a, b in zip(codes, codes[1:])}
+
+
+def build_document(record):
+    """
+    言語記録から索引対象の正規化済みテキストを作る
+
+    Args:
+        record: LanguageRecordモデルのインスタンス
+
+    Returns:
+        正規化済みテキスト（オノマトペ、意味、用例、音声記号を改行で連結）
+    """
+    return document_from_values(*(getattr(record, field) for field in INDEXED_FIELDS))
+
+
+def document_from_values(*values):
+    """INDEXED_FIELDS の順の値から build_document と同じテキストを作る"""
+    return FIELD_SEPARATOR.join(normalize_kana(value or '').replace(FIELD_SEPARATOR, ' ') for value in values)
+
+
+def write_index(path, documents):
+    """
+    n-gram 転置インデックスファイルを書き出す
+
+    一時ファイルに書いてから置き換えるため、読み込み中のワーカーは
+    古いファイルを最後まで読める。
+
+    Args:
+        path: 出力先のパス
+        documents: (record_id, 正規化済みテキスト) の反復可能オブジェクト
+
+    Returns:
+        書き出した文書数
+    """
+    documents = sorted(documents)
+    doc_ids = np.fromiter((doc_id for doc_id, _ in documents), dtype='<i8', count=len(documents))
+
+    gram_keys = array('Q')
+    gram_docs = array('I')
+    text_offsets = array('I', [0])
+    encoded = []
+    text_length = 0
+    for doc_index, (_, text) in enumerate(documents):
+        keys = _bigram_keys(text)
+        gram_keys.extend(keys)
+        gram_docs.extend([doc_index] * len(keys))
+        data = text.encode('utf-8')
+        encoded.append(data)
+        text_length += len(data)
+        text_offsets.append(text_length)
+
+    keys = np.frombuffer(gram_keys, dtype='<u8') if gram_keys else np.empty(0, dtype='<u8')
+    docs = np.frombuffer(gram_docs, dtype='<u4') if gram_docs else np.empty(0, dtype='<u4')
+    order = np.lexsort((docs, keys))
+    keys = keys[order]
+    postings = docs[order].astype('<u4')
+    unique_keys, first = np.unique(keys, return_index=True)
+    starts = np.append(first, len(postings)).astype('<u4')
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(unique_keys), len(documents), len(postings), text_length))
+        for block in (unique_keys.astype('<u8'), starts, postings, doc_ids, np.asarray(text_offsets, dtype='<u4')):
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(block.tobytes())
+        for data in encoded:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return len(documents)
+
+
+class KanaNgramIndex:
+    """
+    mmap したインデックスファイルの読み取り専用ビュー
+
+    ファイルはページキャッシュ上で全ワーカーに共有され、
+    各プロセスはポインタを持つだけでデータをコピーしない。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, num_grams, num_docs, num_postings, text_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'不正なインデックスファイルです: {self.path}')
+
+        offset = _HEADER.size
+        arrays = []
+        for dtype, count in (('<u8', num_grams), ('<u4', num_grams + 1), ('<u4', num_postings),
+                             ('<i8', num_docs), ('<u4', num_docs + 1)):
+            offset = _align(offset)
+            arrays.append(np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset))
+            offset += np.dtype(dtype).itemsize * count
+        self.keys, self.starts, self.postings, self.doc_ids, self.text_offsets = arrays
+        self._text_start = offset
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def is_stale(self):
+        """ファイルが置き換えられていれば True"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def text(self, doc_index):
+        start = self._text_start + int(self.text_offsets[doc_index])
+        end = self._text_start + int(self.text_offsets[doc_index + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def documents(self):
+        """(record_id, 正規化済みテキスト) を順に返す"""
+        for doc_index, doc_id in enumerate(self.doc_ids):
+            yield int(doc_id), self.text(doc_index)
+
+    def _postings_for(self, low, high):
+        i = np.searchsorted(self.keys, low, side='left')
+        j = np.searchsorted(self.keys, high, side='left')
+        if i == j:
+            return np.empty(0, dtype='<u4')
+        if j - i == 1:
+            return self.postings[self.starts[i]:self.starts[i + 1]]
+        return np.unique(self.postings[self.starts[i]:self.starts[j]])
+
+    def candidates(self, normalized_query):
+        """正規化済みクエリの n-gram をすべて含む文書番号を返す"""
+        if len(normalized_query) == 1:
+            code = ord(normalized_query)
+            return self._postings_for(code << 21, (code + 1) << 21)
+
+        codes = [ord(ch) for ch in normalized_query]
+        lists = sorted(
+            (self._postings_for(key, key + 1) for key in {(a << 21) | b for a, b in zip(codes, codes[1:])}),
+            key=len,
+        )
+        result = lists[0]
+        for postings in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, postings, assume_unique=True)
+        return result
+
+    def lookup(self, normalized_query):
+        """
+        正規化済みクエリを部分文字列として含む文書を返す
+
+        Returns:
+            {record_id: 順位} の辞書（0: オノマトペに一致、1: その他のフィールドに一致）
+        """
+        matches = {}
+        for doc_index in self.candidates(normalized_query):
+            text = self.text(int(doc_index))
+            position = text.find(normalized_query)
+            if position < 0:
+                continue
+            head = text.find(FIELD_SEPARATOR)
+            matches[int(self.doc_ids[doc_index])] = 0 if head < 0 or position < head else 1
+        return matches
+
+
+class DeltaLog:
+    """
+    前回の構築以降に変更された記録の追記ログ
+
+    1行1件の JSON（{"id": ..., "text": ...} または {"id": ..., "text": null}）。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._size = None
+        self.entries = {}
+
+    def refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size == self._size:
+            return
+        entries = {}
+        if size:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 書き込み途中の行は次回読み直す
+                        continue
+                    entries[entry['id']] = entry['text']
+        self.entries = entries
+        self._size = size
+
+    def append(self, record_id, text):
+        line = json.dumps({'id': record_id, 'text': text}, ensure_ascii=False) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def get_index_path():
+    return Path(settings.KANA_INDEX_PATH)
+
+
+def _delta_path(path):
+    return path.with_name(f'{path.name}.delta')
+
+
+@contextmanager
+def _locked(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f'{path.name}.lock'), 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class KanaIndexReader:
+    """インデックスファイルと追記ログを合わせて検索する（プロセスごとに1つ）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index = None
+        self.delta = DeltaLog(_delta_path(self.path))
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        with self._lock:
+            if self.index is None or self.index.is_stale():
+                self.index = KanaNgramIndex(self.path) if self.path.exists() else None
+            self.delta.refresh()
+
+    def available(self):
+        self._refresh()
+        return self.index is not None
+
+    def lookup(self, query):
+        """
+        クエリを正規化して検索する
+
+        Args:
+            query: 検索語（ひらがな・カタカナ・半角カナを問わない）
+
+        Returns:
+            (record_id, 順位) のリスト。オノマトペに一致したもの、新しいものから順
+        """
+        self._refresh()
+        normalized = normalize_kana(query).strip()
+        if self.index is None or not normalized:
+            return []
+
+        matches = self.index.lookup(normalized)
+        for record_id, text in self.delta.entries.items():
+            matches.pop(record_id, None)
+            if text is None:
+                continue
+            position = text.find(normalized)
+            if position >= 0:
+                head = text.find(FIELD_SEPARATOR)
+                matches[record_id] = 0 if head < 0 or position < head else 1
+        return sorted(matches.items(), key=lambda item: (item[1], -item[0]))
+
+
+_readers = {}
+
+
+def get_reader():
+    """設定されたパスのリーダーを返す（同じプロセス内で共有）"""
+    path = get_index_path()
+    if path not in _readers:
+        _readers[path] = KanaIndexReader(path)
+    return _readers[path]
+
+
+def build_index(records=None, path=None):
+    """
+    データベースから全件を読み込んでインデックスを構築する
+
+    Args:
+        records: 対象のクエリセット（省略時は全言語記録）
+        path: 出力先（省略時は settings.KANA_INDEX_PATH）
+
+    Returns:
+        書き出した文書数
+    """
+    from .models import LanguageRecord
+
+    path = Path(path) if path else get_index_path()
+    if records is None:
+        records = LanguageRecord.objects.only(
+            'id', 'onomatopoeia_text', 'meaning', 'usage_example', 'phonetic_notation'
+        )
+    with _locked(path):
+        count = write_index(path, ((record.id, build_document(record)) for record in records.iterator(chunk_size=2000)))
+        _delta_path(path).unlink(missing_ok=True)
+    return count
+
+
+def compact(path=None):
+    """
+    インデックスと追記ログを統合して書き直す（データベースは読まない）
+
+    Returns:
+        書き出した文書数
+    """
+    path = Path(path) if path else get_index_path()
+    with _locked(path):
+        documents = dict(KanaNgramIndex(path).documents()) if path.exists() else {}
+        delta = DeltaLog(_delta_path(path))
+        delta.refresh()
+        for record_id, text in delta.entries.items():
+            if text is None:
+                documents.pop(record_id, None)
+            else:
+                documents[record_id] = text
+        count = write_index(path, documents.items())
+        _delta_path(path).unlink(missing_ok=True)
+    return count
+
+
+def record_changed(record_id, text):
+    """
+    記録の変更を追記ログに書き、一定件数を超えたら統合する
+
+    インデックスが未構築の場合は何もしない（build_kana_index で構築する）。
+
+    Args:
+        record_id: LanguageRecord.id
+        text: build_document の結果。削除時は None
+    """
+    path = get_index_path()
+    if not path.exists():
+        return
+    delta_path = _delta_path(path)
+    with _locked(path):
+        DeltaLog(delta_path).append(record_id, text)
+        with open(delta_path, encoding='utf-8') as f:
+            needs_compaction = sum(1 for _ in f) >= settings.KANA_INDEX_DELTA_LIMIT
+    if needs_compaction:
+        compact(path)
+
+
+class KanaSearchBackend:
+    """
+    かな正規化インデックスを使う検索バックエンド（読み取り専用）
+
+    search.SearchResults から count() / search() が呼ばれる。
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._last = (None, [])
+
+    def _ids(self, query):
+        if self._last[0] != query:
+            self._last = (query, [record_id for record_id, _ in self.reader.lookup(query)])
+        return self._last[1]
+
+    def count(self, query):
+        return len(self._ids(query))
+
+    def search(self, query, offset, limit):
+        return self._ids(query)[offset:offset + limit]
@@ -0,0 +1,37 @@
+# language_archive/management/commands/assign_nearest_villages.py
+
+from django.core.management.base import BaseCommand
+from language_archive.services import NEAREST_VILLAGE_MAX_DISTANCE_KM, assign_nearest_villages
+
+
+class Command(BaseCommand):
+    help = '座標を持つ地理環境データに最寄りの集落を割り当てます（--apply を付けない場合は結果の表示のみ）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help='割り当て結果を保存する')
+        parser.add_argument('--overwrite', action='store_true', help='集落が設定済みのデータも割り当て直す')
+        parser.add_argument(
+            '--max-distance', type=float, default=NEAREST_VILLAGE_MAX_DISTANCE_KM,
+            help='これより遠い集落は割り当てない（km）',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='一度に更新する件数')
+
+    def handle(self, *args, **options):
+        assignments = assign_nearest_villages(
+            max_distance_km=options['max_distance'],
+            overwrite=options['overwrite'],
+            apply=options['apply'],
+            batch_size=options['batch_size'],
+        )
+
+        if options['verbosity'] > 1:
+            for item in assignments:
+                self.stdout.write(
+                    f"#{item['record_id']} {item['title']}: {item['old_village_id'] or '-'} → "
+                    f"{item['village_name']} ({item['distance_km']} km)"
+                )
+
+        if options['apply']:
+            self.stdout.write(self.style.SUCCESS(f'{len(assignments)} 件の地理環境データに集落を割り当てました'))
+        else:
+            self.stdout.write(f'{len(assignments)} 件の地理環境データに集落を割り当てられます（保存するには --apply を指定してください）')
@@ -0,0 +1,33 @@
+# language_archive/management/commands/backfill_geohashes.py
+
+from django.core.management.base import BaseCommand
+from language_archive.geo import geohash_for_point
+from language_archive.models import GeographicRecord
+
+
+class Command(BaseCommand):
+    help = '既存の地理環境データのジオハッシュを一括で計算します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='一度に更新する件数')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        records = GeographicRecord.objects.only('id', 'latitude', 'longitude', 'geohash').order_by('id')
+
+        changed = []
+        updated = 0
+        for record in records.iterator(chunk_size=batch_size):
+            geohash = geohash_for_point(record.latitude, record.longitude)
+            if geohash != record.geohash:
+                record.geohash = geohash
+                changed.append(record)
+            if len(changed) >= batch_size:
+                GeographicRecord.objects.bulk_update(changed, ['geohash'])
+                updated += len(changed)
+                changed = []
+        if changed:
+            GeographicRecord.objects.bulk_update(changed, ['geohash'])
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} 件の地理環境データのジオハッシュを更新しました'))
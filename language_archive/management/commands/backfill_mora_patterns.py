@@ -0,0 +1,42 @@
+# language_archive/management/commands/backfill_mora_patterns.py
+
+from django.core.management.base import BaseCommand
+from language_archive import documents
+from language_archive.caching import bump_data_version
+from language_archive.kana import reduplication_pattern
+from language_archive.models import LanguageRecord
+
+
+class Command(BaseCommand):
+    help = '既存の言語記録のモーラ型（反復構造）を一括で計算します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='一度に更新する件数')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        records = LanguageRecord.objects.only('id', 'onomatopoeia_text', 'mora_pattern').order_by('id')
+
+        changed = []
+        updated = 0
+        for record in records.iterator(chunk_size=batch_size):
+            pattern = reduplication_pattern(record.onomatopoeia_text)
+            if pattern != record.mora_pattern:
+                record.mora_pattern = pattern
+                changed.append(record)
+            if len(changed) >= batch_size:
+                self._save(changed)
+                updated += len(changed)
+                changed = []
+        if changed:
+            self._save(changed)
+            updated += len(changed)
+        if updated:
+            bump_data_version()
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} 件の言語記録のモーラ型を更新しました'))
+
+    def _save(self, records):
+        LanguageRecord.objects.bulk_update(records, ['mora_pattern'])
+        # bulk_update ではシグナルが送られないため、API の文書を作り直す
+        documents.refresh([record.id for record in records])
@@ -0,0 +1,86 @@
+# language_archive/management/commands/backfill_thumbnails.py
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from language_archive import documents
+from language_archive.caching import bump_data_version
+from language_archive.models import GeographicRecord, LanguageRecord
+from language_archive.services import parse_public_url
+from language_archive.thumbnails import media_kind, thumbnail_for_url
+
+
+class Command(BaseCommand):
+    help = '公開済みの画像・動画のサムネイル（動画はポスターフレーム）を作成し、thumbnail_path を埋めます'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=['language', 'geographic', 'all'], default='all', help='対象のデータ')
+        parser.add_argument('--overwrite', action='store_true', help='サムネイルが設定済みの記録も作り直す')
+        parser.add_argument('--workers', type=int, default=settings.SUPABASE_STORAGE_MAX_WORKERS, help='同時に処理する件数')
+        parser.add_argument('--batch-size', type=int, default=100, help='一度に保存する件数')
+
+    def handle(self, *args, **options):
+        models = {
+            'language': [LanguageRecord],
+            'geographic': [GeographicRecord],
+            'all': [LanguageRecord, GeographicRecord],
+        }[options['model']]
+
+        updated = 0
+        failed = 0
+        skipped = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            for model in models:
+                records = model.objects.filter(upload_status='ready').exclude(file_path='')
+                if model is LanguageRecord:
+                    records = records.filter(file_type__in=['image', 'video'])
+                if not options['overwrite']:
+                    records = records.filter(thumbnail_path='')
+                fields = ['id', 'file_path', 'thumbnail_path'] + (['file_type'] if model is LanguageRecord else ['content_type'])
+                records = records.only(*fields).order_by('id')
+
+                batch = []
+                for record in records.iterator(chunk_size=options['batch_size']):
+                    batch.append(record)
+                    if len(batch) >= options['batch_size']:
+                        done, errors, ignored = self._process(executor, model, batch)
+                        updated += done
+                        failed += errors
+                        skipped += ignored
+                        batch = []
+                if batch:
+                    done, errors, ignored = self._process(executor, model, batch)
+                    updated += done
+                    failed += errors
+                    skipped += ignored
+
+        if updated:
+            bump_data_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} 件のサムネイルを作成しました（失敗: {failed} 件、ストレージ外のURLなどで対象外: {skipped} 件）'
+        ))
+
+    def _process(self, executor, model, records):
+        """サムネイルの作成とアップロードは並列に行い、保存はまとめて行う"""
+        # YouTube など、ストレージにないファイルは対象外にする
+        targets = [(record, media_kind(record)) for record in records if parse_public_url(record.file_path)]
+        targets = [(record, kind) for record, kind in targets if kind]
+        skipped = len(records) - len(targets)
+        futures = [(record, executor.submit(thumbnail_for_url, record.file_path, kind)) for record, kind in targets]
+
+        changed = []
+        failed = 0
+        for record, future in futures:
+            try:
+                record.thumbnail_path = future.result()
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'#{record.id} {record.file_path}: {e}')
+                continue
+            changed.append(record)
+        if changed:
+            model.objects.bulk_update(changed, ['thumbnail_path'])
+            if model is LanguageRecord:
+                # bulk_update ではシグナルが送られないため、API の文書を作り直す
+                documents.refresh([record.id for record in changed])
+        return len(changed), failed, skipped
@@ -0,0 +1,22 @@
+# language_archive/management/commands/build_kana_index.py
+
+from django.core.management.base import BaseCommand
+from language_archive import kana_index
+
+
+class Command(BaseCommand):
+    help = 'かな正規化 n-gram インデックスファイルを構築します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compact', action='store_true',
+            help='データベースを読まず、既存のインデックスと追記ログを統合する'
+        )
+
+    def handle(self, *args, **options):
+        path = kana_index.get_index_path()
+        if options['compact']:
+            count = kana_index.compact(path)
+        else:
+            count = kana_index.build_index(path=path)
+        self.stdout.write(self.style.SUCCESS(f'{count} 件の言語記録をインデックスに書き出しました: {path}'))
@@ -0,0 +1,70 @@
+# language_archive/management/commands/build_waveforms.py
+
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from language_archive.models import LanguageRecord
+from language_archive.services import get_storage_client, parse_public_url
+from language_archive.waveforms import save_waveform, waveform_from_file
+
+# ダウンロードする音声の上限（バイト）
+MAX_AUDIO_SIZE = 1024 * 1024 * 1024
+
+
+def _waveform_for_url(file_url):
+    bucket_name, object_name = parse_public_url(file_url)
+    with tempfile.NamedTemporaryFile() as f:
+        get_storage_client().download(bucket_name, object_name, f, max_size=MAX_AUDIO_SIZE)
+        f.flush()
+        return waveform_from_file(f.name)
+
+
+class Command(BaseCommand):
+    help = '公開済みの音声の波形ピークを作成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='波形が作成済みの記録も作り直す')
+        parser.add_argument('--workers', type=int, default=4, help='同時に処理する件数')
+        parser.add_argument('--batch-size', type=int, default=50, help='一度に読み込む件数')
+
+    def handle(self, *args, **options):
+        records = LanguageRecord.objects.filter(file_type='audio', upload_status='ready').exclude(file_path='')
+        if not options['overwrite']:
+            records = records.filter(waveform__isnull=True)
+        records = records.only('id', 'file_path').order_by('id')
+
+        created = 0
+        failed = 0
+        skipped = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            batch = []
+            for record in records.iterator(chunk_size=options['batch_size']):
+                batch.append(record)
+                if len(batch) >= options['batch_size']:
+                    counts = self._process(executor, batch)
+                    created, failed, skipped = created + counts[0], failed + counts[1], skipped + counts[2]
+                    batch = []
+            if batch:
+                counts = self._process(executor, batch)
+                created, failed, skipped = created + counts[0], failed + counts[1], skipped + counts[2]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} 件の音声波形を作成しました（失敗: {failed} 件、ストレージ外のURLで対象外: {skipped} 件）'
+        ))
+
+    def _process(self, executor, records):
+        """ダウンロードとデコードは並列に行い、保存はこのスレッドで行う"""
+        targets = [record for record in records if parse_public_url(record.file_path)]
+        futures = [(record, executor.submit(_waveform_for_url, record.file_path)) for record in targets]
+
+        created = 0
+        failed = 0
+        for record, future in futures:
+            try:
+                save_waveform(record, future.result())
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'#{record.id} {record.file_path}: {e}')
+                continue
+            created += 1
+        return created, failed, len(records) - len(targets)
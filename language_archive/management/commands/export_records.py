@@ -0,0 +1,50 @@
+# language_archive/management/commands/export_records.py
+
+from django.core.management.base import BaseCommand, CommandError
+from language_archive.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, ExportError, stream_export
+
+
+class Command(BaseCommand):
+    help = '言語記録・地理環境データを CSV / JSON Lines / Parquet で書き出します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=['language', 'geographic'], default='language', help='書き出すデータ')
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', help='書き出す形式')
+        parser.add_argument('--output', help='出力先のファイル（省略時は標準出力。Parquet では必須）')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='データベースから一度に読み込む件数')
+        parser.add_argument('--village', help='集落IDで絞り込む')
+        parser.add_argument('--file-type', help='ファイル種類で絞り込む（言語記録）')
+        parser.add_argument('--onomatopoeia-type', help='型コードで絞り込む（言語記録）')
+        parser.add_argument('--pattern', help='モーラ型で絞り込む（言語記録）')
+        parser.add_argument('--content-type', help='コンテンツ種類で絞り込む（地理環境データ）')
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        output = options['output']
+        if export_format == 'parquet' and not output:
+            raise CommandError('Parquet 形式では --output で出力先を指定してください')
+
+        params = {
+            key: options[key]
+            for key in ('village', 'file_type', 'onomatopoeia_type', 'pattern', 'content_type')
+            if options[key]
+        }
+        try:
+            content = stream_export(options['model'], export_format, params, options['chunk_size'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if not output:
+            for chunk in content:
+                self.stdout.write(chunk, ending='')
+            return
+
+        if export_format == 'parquet':
+            with open(output, 'wb') as f:
+                for chunk in content:
+                    f.write(chunk)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                for chunk in content:
+                    f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'{output} に書き出しました'))
@@ -0,0 +1,47 @@
+# language_archive/management/commands/generate_corpus.py
+
+from django.core.management.base import BaseCommand, CommandError
+from language_archive.corpus import CORPUS_BATCH_SIZE, CORPUS_SIZES, CorpusError, generate_corpus
+
+
+class Command(BaseCommand):
+    help = (
+        'ベンチマーク用の合成データ（集落・話者・型・言語記録・地理環境データ）を登録します。'
+        '同じ --seed からは同じデータができます。ベンチマーク用のデータベースで実行してください'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('size', help=f'言語記録の件数（{"・".join(CORPUS_SIZES)} または件数）')
+        parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+        parser.add_argument('--speakers', type=int, help='話者数（省略時は言語記録の 1/50）')
+        parser.add_argument('--geographic', type=int, help='地理環境データの件数（省略時は言語記録の 1/20）')
+        parser.add_argument('--batch-size', type=int, default=CORPUS_BATCH_SIZE, help='一度に登録する件数')
+        parser.add_argument('--append', action='store_true', help='既に言語記録があるデータベースにも追加する')
+        parser.add_argument('--skip-derived', action='store_true', help='検索インデックス・集計などを作り直さない')
+
+    def handle(self, *args, **options):
+        size = options['size'].lower()
+        if size in CORPUS_SIZES:
+            records = CORPUS_SIZES[size]
+        elif size.isdigit():
+            records = int(size)
+        else:
+            raise CommandError(f'件数は {"・".join(CORPUS_SIZES)} または整数で指定してください')
+
+        try:
+            summary = generate_corpus(
+                records,
+                seed=options['seed'],
+                speakers=options['speakers'],
+                geographic=options['geographic'],
+                append=options['append'],
+                batch_size=options['batch_size'],
+                refresh=not options['skip_derived'],
+                progress=self.stdout.write,
+            )
+        except CorpusError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'集落 {summary["villages"]}・話者 {summary["speakers"]}・型 {summary["types"]}・'
+            f'言語記録 {summary["records"]}・地理環境データ {summary["geographic"]} 件を登録しました'
+        ))
@@ -0,0 +1,61 @@
+# language_archive/management/commands/import_records.py
+
+from django.core.management.base import BaseCommand, CommandError
+from language_archive.importer import IMPORT_CHUNK_SIZE, RecordImporter, RecordImportError
+
+# 表示するエラー行数の上限
+MAX_ERROR_LINES = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'CSV / Excel ファイルから言語記録・地理環境データを一括で取り込みます。'
+        '列名はモデルのフィールド名に合わせ、speaker は話者ID、village は集落名、'
+        'onomatopoeia_type は型コードで指定します。file 列のメディアファイルは --media-dir から読み込みます'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='取り込む CSV / Excel ファイル')
+        parser.add_argument(
+            '--model', choices=sorted(RecordImporter.MODELS), default='language',
+            help='取り込むデータの種類（language: 言語記録、geographic: 地理環境データ）',
+        )
+        parser.add_argument('--media-dir', help='file 列のパスの基準ディレクトリ（省略時は取り込むファイルと同じ場所）')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='1回のトランザクションで登録する件数')
+        parser.add_argument('--dry-run', action='store_true', help='検証だけを行い、アップロードも保存もしない')
+        parser.add_argument('--skip-invalid', action='store_true', help='エラーのある行を飛ばして取り込む')
+        parser.add_argument('--state', help='進捗を保存する状態ファイル（省略時は <ファイル名>.import_state.json）')
+        parser.add_argument('--restart', action='store_true', help='状態ファイルを無視して最初から取り込む')
+
+    def _report_errors(self, errors):
+        for row, message in errors[:MAX_ERROR_LINES]:
+            self.stderr.write(f'{row} 行目: {message}')
+        if len(errors) > MAX_ERROR_LINES:
+            self.stderr.write(f'ほか {len(errors) - MAX_ERROR_LINES} 行にエラーがあります')
+
+    def handle(self, *args, **options):
+        importer = RecordImporter(
+            options['path'],
+            model=options['model'],
+            media_dir=options['media_dir'],
+            chunk_size=options['chunk_size'],
+            state_path=options['state'],
+            restart=options['restart'],
+            skip_invalid=options['skip_invalid'],
+            stdout=self.stdout,
+        )
+        try:
+            summary = importer.run(dry_run=options['dry_run'])
+        except (RecordImportError, FileNotFoundError) as e:
+            self._report_errors(importer.errors)
+            raise CommandError(str(e))
+
+        self._report_errors(summary['errors'])
+        if options['dry_run']:
+            self.stdout.write(
+                f'検証のみ: エラー {summary["skipped"]} 行、アップロード予定のメディア {summary["media"]} 件'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{summary["created"]} 件を登録しました（エラーで飛ばした行: {summary["skipped"]} 件）'
+            ))
@@ -0,0 +1,14 @@
+# language_archive/management/commands/rebuild_map_clusters.py
+
+from django.core.management.base import BaseCommand
+from language_archive import clusters
+
+
+class Command(BaseCommand):
+    help = '地図クラスタの集計テーブルを全地点から作り直します'
+
+    def handle(self, *args, **options):
+        count = clusters.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'ズームレベル {clusters.MIN_ZOOM}〜{clusters.CLUSTER_MAX_ZOOM} で {count} 個のクラスタを作成しました'
+        ))
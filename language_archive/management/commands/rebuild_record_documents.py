@@ -0,0 +1,12 @@
+# language_archive/management/commands/rebuild_record_documents.py
+
+from django.core.management.base import BaseCommand
+from language_archive import documents
+
+
+class Command(BaseCommand):
+    help = '言語記録のAPI用JSON（話者・集落・型を結合して整形済みのもの）を全件作り直します'
+
+    def handle(self, *args, **options):
+        count = documents.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{count} 件のJSONを作り直しました'))
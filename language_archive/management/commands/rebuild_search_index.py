@@ -0,0 +1,18 @@
+# language_archive/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+from language_archive import search
+
+
+class Command(BaseCommand):
+    help = '言語記録の全文検索インデックスを作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='一度に読み込む件数')
+
+    def handle(self, *args, **options):
+        backend = search.get_search_backend()
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} 件の言語記録を検索インデックスに登録しました（{type(backend).__name__}）'
+        ))
@@ -0,0 +1,34 @@
+# language_archive/management/commands/reconcile_statistics.py
+
+from django.core.management.base import BaseCommand
+from language_archive import archive_stats, rollup
+from language_archive.caching import bump_data_version
+
+
+class Command(BaseCommand):
+    help = 'トップページの集計値と集計キューブをデータベースから数え直し、ずれていれば直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='ずれを表示するだけで直さない')
+
+    def handle(self, *args, **options):
+        apply = not options['check']
+        drift = archive_stats.reconcile(apply=apply)
+        for key, (stored, expected) in sorted(drift.items()):
+            self.stdout.write(f'{key}: {stored} → {expected}')
+        cells = rollup.reconcile(apply=apply)
+        if cells:
+            self.stdout.write(f'集計キューブ: {cells} 個のセル')
+
+        if not drift and not cells:
+            self.stdout.write(self.style.SUCCESS('集計値にずれはありません'))
+        elif not apply:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drift)} 件の集計値と集計キューブの {cells} 個のセルがずれています'
+            ))
+        else:
+            # キャッシュしたトップページにも反映させる
+            bump_data_version()
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(drift)} 件の集計値と集計キューブの {cells} 個のセルを直しました'
+            ))
@@ -0,0 +1,71 @@
+# language_archive/management/commands/run_benchmarks.py
+
+import json
+from django.core.management.base import BaseCommand, CommandError
+from language_archive.benchmarks import (
+    BENCHMARK_ITERATIONS, BENCHMARK_MAX_SECONDS, REGRESSION_THRESHOLD, compare, run_benchmarks, write_results,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'ビュー・クエリ・シリアライザーの実行時間（p50・p95）、ピークメモリ、クエリ数を測り、JSON に書き出します。'
+        '--compare で以前の結果と比べられます（generate_corpus で作ったデータベースで実行してください）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark_results.json', help='結果の JSON の書き出し先')
+        parser.add_argument('--only', action='append', help='測る測定名のパターン（例: "view.*"。複数指定可）')
+        parser.add_argument('--iterations', type=int, default=BENCHMARK_ITERATIONS, help='1つの測定の回数')
+        parser.add_argument('--max-seconds', type=float, default=BENCHMARK_MAX_SECONDS,
+                            help='1つの測定を打ち切る時間（秒）')
+        parser.add_argument('--cached', action='store_true', help='キャッシュを有効にしたまま測る')
+        parser.add_argument('--compare', help='比べる以前の結果の JSON')
+        parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                            help='p50・メモリが何倍になったら悪化とみなすか')
+
+    def _report(self, name, result):
+        if 'error' in result:
+            self.stdout.write(self.style.WARNING(f'{name}: {result["error"]}'))
+            return
+        self.stdout.write(
+            f'{name:40} p50 {result["p50_ms"]:10.2f}ms  p95 {result["p95_ms"]:10.2f}ms  '
+            f'peak {result["peak_memory_kb"]:10.1f}KB  queries {result["queries"]:4}  (n={result["iterations"]})'
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'比べる結果を読み込めません: {e}')
+
+        report = run_benchmarks(
+            patterns=options['only'],
+            iterations=options['iterations'],
+            max_seconds=options['max_seconds'],
+            cached=options['cached'],
+            progress=self._report,
+        )
+        write_results(report, options['output'])
+        corpus = report['environment']['corpus']
+        self.stdout.write(self.style.SUCCESS(
+            f'言語記録 {corpus["records"]} 件のデータで {len(report["results"])} 件を測り、{options["output"]} に書き出しました'
+        ))
+
+        if baseline is None:
+            return
+        if baseline.get('environment', {}).get('corpus') != corpus:
+            self.stdout.write(self.style.WARNING('比べる結果とデータの件数が違います'))
+        worse = 0
+        for name, key, old, new, ratio, regressed in compare(report, baseline, options['threshold']):
+            line = f'{name:40} {key:15} {old:>12} → {new:>12} ({ratio:.2f}倍)'
+            if regressed:
+                worse += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if worse:
+            self.stdout.write(self.style.ERROR(f'{worse} 件の項目が悪化しています'))
@@ -0,0 +1,20 @@
+# language_archive/management/commands/run_upload_worker.py
+
+from django.core.management.base import BaseCommand
+from language_archive.jobs import POLL_INTERVAL, run_worker
+
+
+class Command(BaseCommand):
+    help = 'アップロードジョブを処理するワーカーを起動します（複数同時に起動できます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='待機中のジョブを処理し終えたら終了する')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='ジョブがないときに待つ秒数')
+
+    def handle(self, *args, **options):
+        processed = run_worker(
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'{processed} 件のアップロードジョブを処理しました'))
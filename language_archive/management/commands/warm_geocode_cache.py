@@ -0,0 +1,27 @@
+# language_archive/management/commands/warm_geocode_cache.py
+
+from django.core.management.base import BaseCommand
+from language_archive.geocoding import BATCH_WORKERS, reverse_geocode_many
+from language_archive.models import GeographicRecord, Village
+
+
+class Command(BaseCommand):
+    help = '地理環境データと集落の座標をまとめて逆ジオコーディングし、結果をキャッシュに保存します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='一度に処理する座標の数')
+        parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='APIに同時に問い合わせる数')
+
+    def handle(self, *args, **options):
+        points = GeographicRecord.objects.filter(
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list('latitude', 'longitude').distinct()
+        points = list(points) + list(Village.objects.values_list('latitude', 'longitude'))
+
+        batch_size = max(options['batch_size'], 1)
+        found = 0
+        for start in range(0, len(points), batch_size):
+            results = reverse_geocode_many(points[start:start + batch_size], workers=options['workers'])
+            found += sum(1 for address in results.values() if address)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(points)} 件の座標を処理しました（住所あり: {found} 件）'))
@@ -0,0 +1,434 @@
+# language_archive/media_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path, PurePosixPath
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from .services import get_storage_client
+
+try:
+    import fcntl
+except ImportError:  # Windows（開発環境）ではファイルロックを省略
+    fcntl = None
+
+# キャッシュの合計サイズが上限を超えたとき、この割合まで減らす（削除の頻度を抑える）
+EVICT_TARGET_RATIO = 0.9
+
+# 最終利用時刻（ファイルの mtime）を更新する間隔（秒）。参照のたびに書き込まないようにする
+TOUCH_INTERVAL = 60
+
+# 途中で止まった取得の一時ファイルを削除するまでの時間（秒）
+STALE_TEMP_AGE = 60 * 60
+
+# レスポンスを書き出す単位（sendfile を使えないサーバーの場合）
+RESPONSE_BLOCK_SIZE = 64 * 1024
+
+# ストレージにない・大きすぎるオブジェクトの取得を再び試すまでの時間（秒）。
+# その間は HEAD リクエストも送らず、そのまま公開URLへ転送させる
+NOT_FOUND_RETRY_AFTER = 5 * 60
+TOO_LARGE_RETRY_AFTER = 60 * 60
+
+# ブラウザ・CDN にキャッシュさせる時間（秒）。オブジェクト名は一意なので中身は変わらない
+MEDIA_MAX_AGE = 60 * 60 * 24
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+logger = logging.getLogger(__name__)
+
+# このプロセスで取得中のキャッシュファイル（同じオブジェクトのスレッドを重ねて起動しない）
+_filling = set()
+_filling_lock = threading.Lock()
+
+
+class MediaCacheError(Exception):
+    """メディアファイルをキャッシュから返せないエラー"""
+
+
+class MediaNotFound(MediaCacheError):
+    """ストレージにオブジェクトが存在しない"""
+
+
+class MediaTooLarge(MediaCacheError):
+    """キャッシュできる大きさ（MEDIA_CACHE_MAX_OBJECT_SIZE）を超えている"""
+
+
+class MediaNotCached(MediaCacheError):
+    """まだキャッシュにない（バックグラウンドで取得を始めた）"""
+
+
+class CachedMedia:
+    """キャッシュから開いたメディアファイル（開いた後に削除されても読み込める）"""
+
+    def __init__(self, file, size, content_type, etag, last_modified, name):
+        self.file = file
+        self.size = size
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.name = name
+
+
+def get_cache_dir():
+    return Path(settings.MEDIA_CACHE_DIR)
+
+
+def _cache_path(bucket_name, object_name):
+    """オブジェクトのキャッシュファイルの場所（ハッシュの先頭2文字で振り分ける）"""
+    key = hashlib.sha256(f'{bucket_name}/{object_name}'.encode('utf-8')).hexdigest()
+    return get_cache_dir() / key[:2] / key
+
+
+def _meta_path(path):
+    return path.with_name(f'{path.name}.json')
+
+
+def _lock_path(path):
+    return path.with_name(f'{path.name}.lock')
+
+
+@contextmanager
+def _locked(path, blocking=True):
+    """
+    ファイルロックを取得する（プロセス・スレッドの両方で排他になる）
+
+    blocking=False の場合、他が保持していればすぐに False を返す。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as lock:
+        if fcntl:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _open_cached(path):
+    """キャッシュ済みのファイルを開く。ない場合（削除中を含む）は None"""
+    try:
+        with open(_meta_path(path), encoding='utf-8') as f:
+            meta = json.load(f)
+        file = open(path, 'rb')
+    except (FileNotFoundError, ValueError):
+        return None
+    stat = os.fstat(file.fileno())
+    if stat.st_size != meta['size']:
+        file.close()
+        return None
+    if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+        # mtime を最終利用時刻として使う（atime はマウント設定で更新されないことがある）
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    return CachedMedia(file, meta['size'], meta['content_type'], meta['etag'], meta['last_modified'], meta['name'])
+
+
+def _upstream_time(value):
+    """ストレージの Last-Modified を UNIX 時刻にする（読めない場合は現在時刻）"""
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+def _fill(bucket_name, object_name, path):
+    """ストレージから取得してキャッシュに置く（途中で失敗しても壊れたファイルは残らない）"""
+    client = get_storage_client()
+    info = client.head(bucket_name, object_name)
+    if info is None:
+        raise MediaNotFound(f'{bucket_name}/{object_name} がストレージにありません')
+    max_size = settings.MEDIA_CACHE_MAX_OBJECT_SIZE
+    if info['size'] > max_size:
+        raise MediaTooLarge(f'{bucket_name}/{object_name} はキャッシュできる大きさを超えています')
+
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as f:
+        temp_path = Path(f.name)
+        try:
+            try:
+                size = client.download(bucket_name, object_name, f, max_size=max_size)
+            except ValueError:
+                raise MediaTooLarge(f'{bucket_name}/{object_name} はキャッシュできる大きさを超えています')
+            meta = {
+                'size': size,
+                'content_type': info['content_type'] or 'application/octet-stream',
+                # ETag は取得した内容が変わらない限り同じ値にする
+                'etag': info['etag'] or f'"{size:x}-{_upstream_time(info["last_modified"]):x}"',
+                'last_modified': _upstream_time(info['last_modified']),
+                'name': PurePosixPath(object_name).name,
+            }
+            with tempfile.NamedTemporaryFile('w', dir=path.parent, suffix='.tmp', delete=False, encoding='utf-8') as m:
+                json.dump(meta, m)
+            # メタデータを先に置き、本体の置き換えで公開する
+            os.replace(m.name, _meta_path(path))
+            f.close()
+            os.replace(temp_path, path)
+        except BaseException:
+            f.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+
+
+def _skip_key(path):
+    """取得しないオブジェクトの印のキャッシュキー"""
+    return f'media_cache:skip:{path.name}'
+
+
+def _fill_in_background(bucket_name, object_name, path):
+    """
+    別スレッドでストレージから取得してキャッシュに置く
+
+    他のプロセスが同じオブジェクトを取得中（ロックを保持している）の場合は何もしない。
+    """
+    try:
+        with _locked(_lock_path(path), blocking=False) as acquired:
+            if acquired and _open_cached(path) is None:
+                _fill(bucket_name, object_name, path)
+        evict()
+    except MediaNotFound:
+        # 転送先のストレージが 404 を返す。しばらくは取得を試さない
+        cache.set(_skip_key(path), 'not_found', NOT_FOUND_RETRY_AFTER)
+    except MediaTooLarge:
+        # 大きなファイルはストレージから直接配信させる
+        cache.set(_skip_key(path), 'too_large', TOO_LARGE_RETRY_AFTER)
+    except Exception:
+        logger.warning('メディアファイルをキャッシュできません: %s/%s', bucket_name, object_name, exc_info=True)
+    finally:
+        with _filling_lock:
+            _filling.discard(path)
+
+
+def start_fill(bucket_name, object_name):
+    """
+    キャッシュへの取得をバックグラウンドで始める
+
+    取得中の場合や、最近ストレージになかった・大きすぎたオブジェクトの場合は何もしない。
+
+    Returns:
+        新しく取得を始めた場合は True
+    """
+    path = _cache_path(bucket_name, object_name)
+    if cache.get(_skip_key(path)) is not None:
+        return False
+    with _filling_lock:
+        if path in _filling:
+            return False
+        _filling.add(path)
+    thread = threading.Thread(
+        target=_fill_in_background, args=(bucket_name, object_name, path),
+        name=f'media-cache-fill-{path.name[:12]}', daemon=True,
+    )
+    thread.start()
+    return True
+
+
+def open_media(bucket_name, object_name):
+    """
+    ストレージのオブジェクトをローカルのキャッシュから開く
+
+    キャッシュにない場合は取得をバックグラウンドで始めて MediaNotCached を送出する。
+    大きなファイルの取得でリクエスト（とワーカー）を待たせないよう、呼び出し側は
+    その間ストレージの公開URLへ転送する。取得はファイルロックで全ワーカープロセスを
+    通じて1回だけ行う。
+
+    Args:
+        bucket_name: バケット名
+        object_name: オブジェクト名
+
+    Returns:
+        CachedMedia（file は呼び出し側で閉じる）
+
+    Raises:
+        MediaNotCached: まだキャッシュにない
+    """
+    media = _open_cached(_cache_path(bucket_name, object_name))
+    if media is None:
+        start_fill(bucket_name, object_name)
+        raise MediaNotCached(f'{bucket_name}/{object_name} はまだキャッシュにありません')
+    return media
+
+
+def evict(max_size=None):
+    """
+    キャッシュの合計サイズが上限を超えていたら、最後に使われたのが古いものから削除する
+
+    他のプロセスが削除中の場合は何もしない。
+
+    Args:
+        max_size: 合計サイズの上限（省略時は MEDIA_CACHE_MAX_SIZE）
+
+    Returns:
+        削除したファイル数
+    """
+    max_size = settings.MEDIA_CACHE_MAX_SIZE if max_size is None else max_size
+    root = get_cache_dir()
+    with _locked(root / 'evict.lock', blocking=False) as acquired:
+        if not acquired:
+            return 0
+
+        entries = []
+        total = 0
+        now = time.time()
+        for directory in os.scandir(root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(('.json', '.lock')):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    if now - stat.st_mtime > STALE_TEMP_AGE:
+                        Path(entry.path).unlink(missing_ok=True)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+                total += stat.st_size
+
+        if total <= max_size:
+            return 0
+        target = max_size * EVICT_TARGET_RATIO
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            # 配信中のファイルは開いているため、削除しても最後まで読み込める
+            path.unlink(missing_ok=True)
+            _meta_path(path).unlink(missing_ok=True)
+            _lock_path(path).unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+class _FileRange:
+    """
+    ファイルの一部だけを読み込ませるラッパー
+
+    fileno() を持つため、gunicorn などは開始位置から Content-Length 分を sendfile で送る。
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Range ヘッダーを解釈する（単一の範囲のみ対応）
+
+    Returns:
+        (開始位置, 終了位置)。ヘッダーがない・対応しない形式の場合は None、
+        範囲がファイルの外にある場合は ValueError
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        # 複数範囲などは無視して全体を返す
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500 は末尾 500 バイト
+        length = int(last)
+        if not length or not size:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _range_applies(request, media):
+    """If-Range がある場合、キャッシュしている内容と一致するときだけ Range を使う"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == media.etag
+    return parse_http_date_safe(if_range) == media.last_modified
+
+
+def media_response(request, media, as_attachment=False):
+    """
+    キャッシュから開いたファイルを返すレスポンスを作る
+
+    ETag・Last-Modified による 304、Range による 206・416 に対応する。
+    本体は FileResponse で返すため、WSGI サーバーの sendfile でそのまま送られる。
+
+    Args:
+        request: HttpRequest
+        media: open_media の戻り値
+        as_attachment: ダウンロード用に Content-Disposition: attachment を付けるか
+
+    Returns:
+        HttpResponse
+    """
+    def finish(response):
+        response['ETag'] = media.etag
+        response['Last-Modified'] = http_date(media.last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+        return response
+
+    not_modified = get_conditional_response(request, etag=media.etag, last_modified=media.last_modified)
+    if not_modified is not None:
+        media.file.close()
+        return finish(not_modified)
+
+    byte_range = None
+    if request.method == 'GET' and _range_applies(request, media):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), media.size)
+        except ValueError:
+            media.file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{media.size}'
+            return finish(response)
+
+    if byte_range is None:
+        response = FileResponse(media.file, content_type=media.content_type,
+                                as_attachment=as_attachment, filename=media.name)
+    else:
+        start, end = byte_range
+        response = FileResponse(_FileRange(media.file, start, end - start + 1), status=206,
+                                content_type=media.content_type,
+                                as_attachment=as_attachment, filename=media.name)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{media.size}'
+    response.block_size = RESPONSE_BLOCK_SIZE
+    return finish(response)
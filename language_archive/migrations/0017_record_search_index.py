@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-17 10:00
+
+from django.db import migrations
+
+
+PG_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE TABLE IF NOT EXISTS language_archive_record_search (
+        record_id bigint PRIMARY KEY
+            REFERENCES language_archive_languagerecord (id) ON DELETE CASCADE,
+        body text NOT NULL,
+        vector tsvector NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS language_archive_record_search_vector_gin
+        ON language_archive_record_search USING gin (vector)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS language_archive_record_search_body_trgm
+        ON language_archive_record_search USING gin (body gin_trgm_ops)
+    """,
+    """
+    INSERT INTO language_archive_record_search (record_id, body, vector)
+    SELECT id, body, to_tsvector('simple', body)
+    FROM (
+        SELECT id, concat_ws(' ', onomatopoeia_text, meaning, usage_example, phonetic_notation) AS body
+        FROM language_archive_languagerecord
+    ) AS records
+    ON CONFLICT (record_id) DO NOTHING
+    """,
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS language_archive_record_fts
+        USING fts5(body, tokenize = 'trigram')
+    """,
+    """
+    INSERT INTO language_archive_record_fts (rowid, body)
+    SELECT id, onomatopoeia_text || ' ' || meaning || ' ' || usage_example || ' ' || phonetic_notation
+    FROM language_archive_languagerecord
+    """,
+]
+
+
+def create_search_tables(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = PG_FORWARD
+    elif vendor == 'sqlite':
+        statements = SQLITE_FORWARD
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_tables(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS language_archive_record_search")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS language_archive_record_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0016_add_village_field_back_final'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
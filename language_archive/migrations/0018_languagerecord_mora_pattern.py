@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0017_record_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='languagerecord',
+            name='mora_pattern',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100, verbose_name='モーラ型'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0018_languagerecord_mora_pattern'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField(verbose_name='ズームレベル')),
+                ('cell_x', models.IntegerField(verbose_name='セルX')),
+                ('cell_y', models.IntegerField(verbose_name='セルY')),
+                ('geo_count', models.IntegerField(default=0, verbose_name='地理環境データ数')),
+                ('speaker_count', models.IntegerField(default=0, verbose_name='話者数')),
+                ('latitude_sum', models.FloatField(default=0, verbose_name='緯度の合計')),
+                ('longitude_sum', models.FloatField(default=0, verbose_name='経度の合計')),
+            ],
+            options={
+                'verbose_name': '地図クラスタ',
+                'verbose_name_plural': '地図クラスタ',
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'cell_x', 'cell_y'), name='unique_map_cluster_cell')],
+            },
+        ),
+    ]
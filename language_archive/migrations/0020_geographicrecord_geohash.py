@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0019_mapcluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geographicrecord',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, verbose_name='ジオハッシュ'),
+        ),
+    ]
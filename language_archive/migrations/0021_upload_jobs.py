@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0020_geographicrecord_geohash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='languagerecord',
+            name='file_path',
+            field=models.URLField(blank=True, max_length=1024, verbose_name='ファイルURL'),
+        ),
+        migrations.AddField(
+            model_name='languagerecord',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'アップロード待ち'), ('ready', '公開中'), ('failed', 'アップロード失敗')], db_index=True, default='ready', max_length=10, verbose_name='アップロード状態'),
+        ),
+        migrations.AlterField(
+            model_name='geographicrecord',
+            name='file_path',
+            field=models.URLField(blank=True, max_length=1024, verbose_name='ファイルURL'),
+        ),
+        migrations.AddField(
+            model_name='geographicrecord',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'アップロード待ち'), ('ready', '公開中'), ('failed', 'アップロード失敗')], db_index=True, default='ready', max_length=10, verbose_name='アップロード状態'),
+        ),
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_name', models.CharField(max_length=100, verbose_name='バケット名')),
+                ('object_name', models.CharField(max_length=500, verbose_name='オブジェクト名')),
+                ('spool_path', models.CharField(max_length=1024, verbose_name='一時ファイル')),
+                ('original_name', models.CharField(max_length=255, verbose_name='元のファイル名')),
+                ('content_type', models.CharField(blank=True, max_length=255, verbose_name='MIMEタイプ')),
+                ('size', models.BigIntegerField(default=0, verbose_name='サイズ')),
+                ('bytes_sent', models.BigIntegerField(default=0, verbose_name='送信済みバイト数')),
+                ('upload_url', models.URLField(blank=True, max_length=1024, verbose_name='再開用URL')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '処理中'), ('done', '完了'), ('failed', '失敗')], default='pending', max_length=10, verbose_name='状態')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='試行回数')),
+                ('error', models.TextField(blank=True, verbose_name='エラー')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='最終応答日時')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='登録日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('geographic_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_jobs', to='language_archive.geographicrecord', verbose_name='地理環境データ')),
+                ('language_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_jobs', to='language_archive.languagerecord', verbose_name='言語記録')),
+            ],
+            options={
+                'verbose_name': 'アップロードジョブ',
+                'verbose_name_plural': 'アップロードジョブ',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='upload_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0021_upload_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioWaveform',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duration', models.FloatField(verbose_name='長さ（秒）')),
+                ('sample_rate', models.PositiveIntegerField(verbose_name='サンプリング周波数')),
+                ('resolutions', models.JSONField(default=list, verbose_name='解像度')),
+                ('peaks', models.BinaryField(verbose_name='ピーク')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='登録日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='waveform', to='language_archive.languagerecord', verbose_name='言語記録')),
+            ],
+            options={
+                'verbose_name': '音声波形',
+                'verbose_name_plural': '音声波形',
+            },
+        ),
+    ]
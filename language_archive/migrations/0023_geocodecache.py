@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0022_audiowaveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('forward', '住所→座標'), ('reverse', '座標→住所')], max_length=10, verbose_name='種類')),
+                ('key', models.CharField(max_length=255, verbose_name='キー')),
+                ('address', models.CharField(blank=True, max_length=255, verbose_name='住所')),
+                ('latitude', models.FloatField(blank=True, null=True, verbose_name='緯度')),
+                ('longitude', models.FloatField(blank=True, null=True, verbose_name='経度')),
+                ('found', models.BooleanField(default=True, verbose_name='該当あり')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='登録日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'ジオコーディングキャッシュ',
+                'verbose_name_plural': 'ジオコーディングキャッシュ',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='unique_geocode_cache_key')],
+            },
+        ),
+    ]
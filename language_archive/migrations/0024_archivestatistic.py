@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0023_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='キー')),
+                ('value', models.BigIntegerField(default=0, verbose_name='値')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '集計値',
+                'verbose_name_plural': '集計値',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0024_archivestatistic'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village_id', models.IntegerField(default=0, verbose_name='話者の集落ID')),
+                ('type_id', models.IntegerField(default=0, verbose_name='型ID')),
+                ('frequency', models.CharField(blank=True, max_length=20, verbose_name='言語使用頻度')),
+                ('age_range', models.CharField(blank=True, max_length=10, verbose_name='話者の年代')),
+                ('year', models.SmallIntegerField(default=0, verbose_name='収録年')),
+                ('count', models.IntegerField(default=0, verbose_name='件数')),
+            ],
+            options={
+                'verbose_name': '集計キューブ',
+                'verbose_name_plural': '集計キューブ',
+                'constraints': [models.UniqueConstraint(fields=('village_id', 'type_id', 'frequency', 'age_range', 'year'), name='unique_record_rollup_cell')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0025_recordrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordDocument',
+            fields=[
+                ('record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='language_archive.languagerecord', verbose_name='言語記録')),
+                ('version', models.PositiveSmallIntegerField(default=1, verbose_name='形式のバージョン')),
+                ('content', models.TextField(verbose_name='JSON')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '言語記録のJSON',
+                'verbose_name_plural': '言語記録のJSON',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('language_archive', '0026_recorddocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='languagerecord',
+            index=models.Index(fields=['-recorded_date', '-id'], name='langrec_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='languagerecord',
+            index=models.Index(fields=['file_type', '-recorded_date', '-id'], name='langrec_type_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='languagerecord',
+            index=models.Index(fields=['speaker', '-recorded_date', '-id'], name='langrec_speaker_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='languagerecord',
+            index=models.Index(fields=['-created_at'], name='langrec_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='geographicrecord',
+            index=models.Index(fields=['-captured_date', '-id'], name='georec_captured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='geographicrecord',
+            index=models.Index(fields=['content_type', '-captured_date', '-id'], name='georec_type_captured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='geographicrecord',
+            index=models.Index(fields=['village', '-captured_date', '-id'], name='georec_village_captured_idx'),
+        ),
+    ]
@@ -2,6 +2,15 @@
 
 from django.db import models
 from django.utils import timezone
+from .geo import geohash_for_point, geohash_prefix_range, geohash_prefixes_for_bbox
+from .kana import reduplication_pattern
+
+# メディアファイルのアップロード状態（バックグラウンドのワーカーがアップロードを完了させる）
+UPLOAD_STATUS_CHOICES = [
+    ('pending', 'アップロード待ち'),
+    ('ready', '公開中'),
+    ('failed', 'アップロード失敗'),
+]
 
 class Village(models.Model):
     """集落情報テーブル"""
@@ -82,6 +91,7 @@ class LanguageRecord(models.Model):
     ]
     # 基本情報
     onomatopoeia_text = models.CharField(max_length=100, verbose_name="オノマトペ")
+    mora_pattern = models.CharField(max_length=100, blank=True, editable=False, db_index=True, verbose_name="モーラ型")
     meaning = models.TextField(verbose_name="意味")
     usage_example = models.TextField(verbose_name="用例")
     phonetic_notation = models.TextField(blank=True, verbose_name="音声記号")
@@ -89,8 +99,9 @@ class LanguageRecord(models.Model):
     
     # ファイル情報
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES, verbose_name="ファイル種類")
-    file_path = models.URLField(max_length=1024, verbose_name="ファイルURL")
+    file_path = models.URLField(max_length=1024, blank=True, verbose_name="ファイルURL")
     thumbnail_path = models.URLField(max_length=1024, blank=True, verbose_name="サムネイルURL")
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default='ready', db_index=True, verbose_name="アップロード状態")
     
     # 関連情報
     speaker = models.ForeignKey(Speaker, on_delete=models.PROTECT, null=True, blank=True, verbose_name="話者")
@@ -107,10 +118,55 @@ class LanguageRecord(models.Model):
         verbose_name = "言語記録"
         verbose_name_plural = "言語記録"
         ordering = ['-recorded_date']
+        # 一覧ページのカーソルページネーション（収録日・IDの降順）と絞り込み条件に合わせた索引
+        indexes = [
+            models.Index(fields=['-recorded_date', '-id'], name='langrec_recorded_idx'),
+            models.Index(fields=['file_type', '-recorded_date', '-id'], name='langrec_type_recorded_idx'),
+            models.Index(fields=['speaker', '-recorded_date', '-id'], name='langrec_speaker_recorded_idx'),
+            models.Index(fields=['-created_at'], name='langrec_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.onomatopoeia_text}"
 
+    def save(self, *args, **kwargs):
+        # オノマトペの反復構造（ABAB など）を保存時に計算
+        self.mora_pattern = reduplication_pattern(self.onomatopoeia_text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'onomatopoeia_text' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'mora_pattern'}
+        super().save(*args, **kwargs)
+
+
+class GeographicRecordQuerySet(models.QuerySet):
+    """地理環境データのクエリセット"""
+
+    def in_bbox(self, west, south, east, north):
+        """
+        表示範囲内の地点に絞り込む
+
+        表示範囲を覆う少数のジオハッシュ前方一致を geohash 列の範囲条件に変換して
+        インデックスで候補を絞り、境界付近の余分な行を緯度・経度の比較で取り除く。
+
+        Args:
+            west, south, east, north: 表示範囲
+
+        Returns:
+            絞り込んだクエリセット
+        """
+        prefixes = geohash_prefixes_for_bbox(west, south, east, north)
+        queryset = self.filter(
+            latitude__gte=south, latitude__lte=north,
+            longitude__gte=west, longitude__lte=east,
+        )
+        if prefixes:
+            condition = models.Q()
+            for prefix in prefixes:
+                start, end = geohash_prefix_range(prefix)
+                condition |= models.Q(geohash__gte=start, geohash__lt=end) if end else models.Q(geohash__gte=start)
+            queryset = queryset.filter(condition)
+        return queryset
+
 
 class GeographicRecord(models.Model):
     """地理・環境データテーブル"""
@@ -122,22 +178,228 @@ class GeographicRecord(models.Model):
     
     title = models.CharField(max_length=200, verbose_name="タイトル")
     content_type = models.CharField(max_length=20, choices=CONTENT_TYPE_CHOICES, verbose_name="コンテンツ種類")
-    file_path = models.URLField(max_length=1024, verbose_name="ファイルURL")
+    file_path = models.URLField(max_length=1024, blank=True, verbose_name="ファイルURL")
     thumbnail_path = models.URLField(max_length=1024, blank=True, verbose_name="サムネイルURL")
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default='ready', db_index=True, verbose_name="アップロード状態")
     
     description = models.TextField(verbose_name="説明")
     village = models.ForeignKey(Village, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="集落")
     latitude = models.FloatField(null=True, blank=True, verbose_name="緯度")
     longitude = models.FloatField(null=True, blank=True, verbose_name="経度")
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True, verbose_name="ジオハッシュ")
     
     captured_date = models.DateField(verbose_name="撮影日")
     created_at = models.DateTimeField(default=timezone.now, verbose_name="登録日時")
     
+    objects = GeographicRecordQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "地理環境データ"
         verbose_name_plural = "地理環境データ"
         ordering = ['-captured_date']
+        # 一覧ページのカーソルページネーション（撮影日・IDの降順）と絞り込み条件、地図の年での絞り込みに合わせた索引
+        indexes = [
+            models.Index(fields=['-captured_date', '-id'], name='georec_captured_idx'),
+            models.Index(fields=['content_type', '-captured_date', '-id'], name='georec_type_captured_idx'),
+            models.Index(fields=['village', '-captured_date', '-id'], name='georec_village_captured_idx'),
+        ]
     
     def __str__(self):
         return self.title
-# Create your models here.
+
+    def save(self, *args, **kwargs):
+        # 表示範囲検索用のジオハッシュを保存時に計算
+        self.geohash = geohash_for_point(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
+class MapCluster(models.Model):
+    """地図クラスタの集計テーブル（ズームレベルごとのグリッドに地点数を集計）"""
+    zoom = models.PositiveSmallIntegerField(verbose_name="ズームレベル")
+    cell_x = models.IntegerField(verbose_name="セルX")
+    cell_y = models.IntegerField(verbose_name="セルY")
+    geo_count = models.IntegerField(default=0, verbose_name="地理環境データ数")
+    speaker_count = models.IntegerField(default=0, verbose_name="話者数")
+    latitude_sum = models.FloatField(default=0, verbose_name="緯度の合計")
+    longitude_sum = models.FloatField(default=0, verbose_name="経度の合計")
+
+    class Meta:
+        verbose_name = "地図クラスタ"
+        verbose_name_plural = "地図クラスタ"
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'cell_x', 'cell_y'], name='unique_map_cluster_cell'),
+        ]
+
+    def __str__(self):
+        return f"z{self.zoom} ({self.cell_x}, {self.cell_y})"
+
+    @property
+    def count(self):
+        return self.geo_count + self.speaker_count
+
+
+class UploadJob(models.Model):
+    """メディアアップロードのジョブキュー（run_upload_worker が処理する）"""
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '処理中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    language_record = models.ForeignKey(LanguageRecord, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_jobs', verbose_name="言語記録")
+    geographic_record = models.ForeignKey(GeographicRecord, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_jobs', verbose_name="地理環境データ")
+
+    bucket_name = models.CharField(max_length=100, verbose_name="バケット名")
+    object_name = models.CharField(max_length=500, verbose_name="オブジェクト名")
+    spool_path = models.CharField(max_length=1024, verbose_name="一時ファイル")
+    original_name = models.CharField(max_length=255, verbose_name="元のファイル名")
+    content_type = models.CharField(max_length=255, blank=True, verbose_name="MIMEタイプ")
+    size = models.BigIntegerField(default=0, verbose_name="サイズ")
+    bytes_sent = models.BigIntegerField(default=0, verbose_name="送信済みバイト数")
+    upload_url = models.URLField(max_length=1024, blank=True, verbose_name="再開用URL")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="状態")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="試行回数")
+    error = models.TextField(blank=True, verbose_name="エラー")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="実行予定日時")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="最終応答日時")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="登録日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "アップロードジョブ"
+        verbose_name_plural = "アップロードジョブ"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='upload_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.original_name} ({self.get_status_display()})"
+
+    @property
+    def record(self):
+        return self.language_record or self.geographic_record
+
+    @property
+    def progress(self):
+        """進捗（0〜100 の整数）"""
+        if self.status == 'done':
+            return 100
+        if not self.size:
+            return 0
+        return min(100, int(self.bytes_sent * 100 / self.size))
+
+
+class AudioWaveform(models.Model):
+    """音声の波形ピーク（詳細ページで音声をダウンロードせずに波形を描くための縮約データ）"""
+    record = models.OneToOneField(LanguageRecord, on_delete=models.CASCADE, related_name='waveform', verbose_name="言語記録")
+    duration = models.FloatField(verbose_name="長さ（秒）")
+    sample_rate = models.PositiveIntegerField(verbose_name="サンプリング周波数")
+    # 各解像度の (最小値, 最大値) の組を int8 で解像度順に連結したもの
+    resolutions = models.JSONField(default=list, verbose_name="解像度")
+    peaks = models.BinaryField(verbose_name="ピーク")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="登録日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "音声波形"
+        verbose_name_plural = "音声波形"
+
+    def __str__(self):
+        return f"{self.record_id} ({self.duration:.1f}秒)"
+
+
+class GeocodeCache(models.Model):
+    """ジオコーディング結果のキャッシュ（国土地理院APIへの同じ問い合わせを繰り返さない）"""
+    KIND_CHOICES = [
+        ('forward', '住所→座標'),
+        ('reverse', '座標→住所'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="種類")
+    # 住所は正規化した文字列、座標は小数点以下を丸めた「緯度,経度」
+    key = models.CharField(max_length=255, verbose_name="キー")
+    address = models.CharField(max_length=255, blank=True, verbose_name="住所")
+    latitude = models.FloatField(null=True, blank=True, verbose_name="緯度")
+    longitude = models.FloatField(null=True, blank=True, verbose_name="経度")
+    found = models.BooleanField(default=True, verbose_name="該当あり")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="登録日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "ジオコーディングキャッシュ"
+        verbose_name_plural = "ジオコーディングキャッシュ"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='unique_geocode_cache_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} → {self.address or (self.latitude, self.longitude)}"
+
+
+class ArchiveStatistic(models.Model):
+    """アーカイブ全体の集計値（シグナルで増減し、reconcile_statistics で補正する）"""
+    # 'records'、'speakers'、'file_type:audio'、'frequency:daily'、'village:<集落ID>' など
+    key = models.CharField(max_length=100, unique=True, verbose_name="キー")
+    value = models.BigIntegerField(default=0, verbose_name="値")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "集計値"
+        verbose_name_plural = "集計値"
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+
+class RecordRollup(models.Model):
+    """
+    言語記録の集計キューブ（集落×型×使用頻度×年代×収録年ごとの件数）
+
+    該当なしは NULL ではなく 0・空文字で表す（NULL は一意制約で区別されないため）。
+    集落・型は削除されても件数を残せるよう、外部キーではなくIDで持つ。
+    """
+    village_id = models.IntegerField(default=0, verbose_name="話者の集落ID")
+    type_id = models.IntegerField(default=0, verbose_name="型ID")
+    frequency = models.CharField(max_length=20, blank=True, verbose_name="言語使用頻度")
+    age_range = models.CharField(max_length=10, blank=True, verbose_name="話者の年代")
+    year = models.SmallIntegerField(default=0, verbose_name="収録年")
+    count = models.IntegerField(default=0, verbose_name="件数")
+
+    class Meta:
+        verbose_name = "集計キューブ"
+        verbose_name_plural = "集計キューブ"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['village_id', 'type_id', 'frequency', 'age_range', 'year'],
+                name='unique_record_rollup_cell',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.village_id}/{self.type_id}/{self.frequency}/{self.age_range}/{self.year}: {self.count}"
+
+
+class RecordDocument(models.Model):
+    """
+    言語記録のAPI用JSON（話者・集落・型を結合して整形済みのもの）
+
+    記録や関連する話者・集落・型が変わるとシグナルで作り直す。
+    """
+    record = models.OneToOneField(LanguageRecord, on_delete=models.CASCADE, primary_key=True, related_name='document', verbose_name="言語記録")
+    # 整形の内容を変えたときに古い文書を作り直すための番号
+    version = models.PositiveSmallIntegerField(default=1, verbose_name="形式のバージョン")
+    content = models.TextField(verbose_name="JSON")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "言語記録のJSON"
+        verbose_name_plural = "言語記録のJSON"
+
+    def __str__(self):
+        return f"{self.record_id} (v{self.version})"
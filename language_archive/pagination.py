@@ -0,0 +1,167 @@
+# language_archive/pagination.py
+
+import datetime
+import hashlib
+from django.core.cache import cache
+from django.db.models import Q
+from .caching import versioned_key
+
+# 1ページあたりの件数
+PAGE_SIZE = 24
+
+# 総件数キャッシュの有効期間（秒）
+COUNT_CACHE_TIMEOUT = 60
+
+
+def encode_cursor(date_value, pk):
+    """
+    (日付, id) の組をカーソル文字列に変換する
+
+    Args:
+        date_value: 並び替えに使う日付
+        pk: レコードのID
+
+    Returns:
+        "YYYY-MM-DD_id" 形式の文字列
+    """
+    return f"{date_value.isoformat()}_{pk}"
+
+
+def decode_cursor(cursor):
+    """
+    カーソル文字列を (日付, id) の組に戻す
+
+    Args:
+        cursor: encode_cursor で生成した文字列
+
+    Returns:
+        (date, int) のタプル。不正な値の場合は None
+    """
+    if not cursor:
+        return None
+    try:
+        date_part, pk_part = cursor.split('_', 1)
+        return datetime.date.fromisoformat(date_part), int(pk_part)
+    except (ValueError, TypeError):
+        return None
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    クエリセットの件数をキャッシュ付きで取得する
+
+    同じ絞り込み条件での COUNT(*) を一定時間使い回し、
+    一覧ページを開くたびに全件を数えないようにする。
+    キーにはデータ世代番号を含めるため、データ更新後は数え直す。
+
+    Args:
+        queryset: 件数を数えるクエリセット
+        timeout: キャッシュの有効期間（秒）
+
+    Returns:
+        件数
+    """
+    sql = str(queryset.query).encode('utf-8')
+    key = versioned_key('count', queryset.model._meta.label_lower, hashlib.md5(sql).hexdigest())
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+class CursorPage:
+    """カーソルページネーションの1ページ分"""
+
+    def __init__(self, object_list, total_count, next_cursor, previous_cursor, params):
+        self.object_list = object_list
+        self.total_count = total_count
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def _query_string(self, key, cursor):
+        params = self._params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[key] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """「次へ」リンク用のクエリ文字列（絞り込み条件を保持）"""
+        return self._query_string('after', self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        """「前へ」リンク用のクエリ文字列（絞り込み条件を保持）"""
+        return self._query_string('before', self.previous_cursor) if self.has_previous else ''
+
+
+def paginate_by_cursor(queryset, request, date_field, page_size=PAGE_SIZE):
+    """
+    (日付, id) の降順でカーソルページネーションを行う
+
+    OFFSET を使わず、前ページ末尾の (日付, id) より後ろの行だけを
+    取得するため、何ページ目でも取得コストが一定になる。
+
+    Args:
+        queryset: 絞り込み済みのクエリセット
+        request: HttpRequest（?after= / ?before= を参照）
+        date_field: 並び替えに使う日付フィールド名（recorded_date など）
+        page_size: 1ページあたりの件数
+
+    Returns:
+        CursorPage
+    """
+    total_count = cached_count(queryset)
+
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before'))
+
+    if before:
+        date_value, pk = before
+        rows = list(
+            queryset.filter(
+                Q(**{f'{date_field}__gt': date_value}) |
+                Q(**{date_field: date_value, 'id__gt': pk})
+            ).order_by(date_field, 'id')[:page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+        has_previous = has_more
+        has_next = True
+    else:
+        if after:
+            date_value, pk = after
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lt': date_value}) |
+                Q(**{date_field: date_value, 'id__lt': pk})
+            )
+        rows = list(queryset.order_by(f'-{date_field}', '-id')[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    next_cursor = None
+    previous_cursor = None
+    if rows:
+        if has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(getattr(last, date_field), last.id)
+        if has_previous:
+            first = rows[0]
+            previous_cursor = encode_cursor(getattr(first, date_field), first.id)
+
+    return CursorPage(rows, total_count, next_cursor, previous_cursor, request.GET)
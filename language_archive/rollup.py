@@ -0,0 +1,327 @@
+# language_archive/rollup.py
+
+from collections import Counter
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractYear
+from .models import LanguageRecord, OnomatopoeiaType, RecordRollup, Speaker, Village
+
+# キューブの次元（API・NumPy ローダーでの名前 → RecordRollup のフィールド）
+DIMENSIONS = {
+    'village': 'village_id',
+    'type': 'type_id',
+    'frequency': 'frequency',
+    'age_range': 'age_range',
+    'year': 'year',
+}
+
+# 各次元の「該当なし」の値
+EMPTY = {
+    'village_id': 0,
+    'type_id': 0,
+    'frequency': '',
+    'age_range': '',
+    'year': 0,
+}
+
+_FIELDS = tuple(DIMENSIONS.values())
+
+# 整数の次元の値の範囲（データベースの 64 ビット整数に収まらない値はエラーにする）
+MIN_INT = -2 ** 63
+MAX_INT = 2 ** 63 - 1
+
+
+def make_cell(village_id, type_id, frequency, age_range, recorded_date):
+    """
+    言語記録1件が数えられるセル
+
+    Returns:
+        (集落ID, 型ID, 使用頻度, 年代, 収録年) の組
+    """
+    return (
+        village_id or 0,
+        type_id or 0,
+        frequency or '',
+        age_range or '',
+        recorded_date.year if recorded_date else 0,
+    )
+
+
+def adjust(changes):
+    """
+    セルの件数を増減する（同時に更新されても F 式で正しく加算する）
+
+    Args:
+        changes: {セル: 増減数} の辞書
+    """
+    for cell, delta in changes.items():
+        if not delta:
+            continue
+        rows = RecordRollup.objects.filter(**dict(zip(_FIELDS, cell)))
+        if rows.update(count=F('count') + delta):
+            if delta < 0:
+                rows.filter(count__lte=0).delete()
+            continue
+        if delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                RecordRollup.objects.create(count=delta, **dict(zip(_FIELDS, cell)))
+        except IntegrityError:
+            # 同時に作成された場合は加算し直す
+            rows.update(count=F('count') + delta)
+
+
+def move_record(before, after):
+    """
+    言語記録のセルの変化を反映する
+
+    Args:
+        before: 変更前のセル（新規の場合は None）
+        after: 変更後のセル（削除の場合は None）
+    """
+    if before == after:
+        return
+    changes = Counter()
+    if before is not None:
+        changes[before] -= 1
+    if after is not None:
+        changes[after] += 1
+    adjust(changes)
+
+
+def count_cells(records=None):
+    """
+    言語記録をセルごとに数える
+
+    Args:
+        records: LanguageRecord のクエリセット（省略時は全件）
+
+    Returns:
+        {セル: 件数} の Counter
+    """
+    records = LanguageRecord.objects.all() if records is None else records
+    rows = (
+        records.annotate(recorded_year=ExtractYear('recorded_date'))
+        .values_list('speaker__village_id', 'onomatopoeia_type_id', 'language_frequency',
+                     'speaker__age_range', 'recorded_year')
+        .annotate(n=Count('id')).order_by()
+    )
+    cells = Counter()
+    for village_id, type_id, frequency, age_range, year, count in rows:
+        cells[(village_id or 0, type_id or 0, frequency or '', age_range or '', year or 0)] += count
+    return cells
+
+
+def speaker_changed(speaker_id, before, after):
+    """
+    話者の集落・年代の変更を、その話者の言語記録のセルに反映する
+
+    Args:
+        speaker_id: 話者ID
+        before: 変更前の (集落ID, 年代)
+        after: 変更後の (集落ID, 年代)
+    """
+    if (before[0] or 0, before[1] or '') == (after[0] or 0, after[1] or ''):
+        return
+    changes = Counter()
+    # 話者は保存済みなので、数えたセルは変更後のもの
+    for cell, count in count_cells(LanguageRecord.objects.filter(speaker_id=speaker_id)).items():
+        _, type_id, frequency, _, year = cell
+        changes[(before[0] or 0, type_id, frequency, before[1] or '', year)] -= count
+        changes[cell] += count
+    adjust(changes)
+
+
+def dimension_removed(field, value):
+    """
+    集落・型の削除時に、そのセルを「該当なし」にまとめる
+
+    Args:
+        field: 'village_id' または 'type_id'
+        value: 削除されたID
+    """
+    rows = RecordRollup.objects.filter(**{field: value})
+    changes = Counter()
+    index = _FIELDS.index(field)
+    for row in rows.values_list(*_FIELDS, 'count'):
+        cell = list(row[:-1])
+        changes[tuple(row[:-1])] -= row[-1]
+        cell[index] = EMPTY[field]
+        changes[tuple(cell)] += row[-1]
+    adjust(changes)
+
+
+def reconcile(apply=True):
+    """
+    言語記録から数え直したセルとキューブを比べ、ずれていれば直す
+
+    Args:
+        apply: False の場合はずれを調べるだけ
+
+    Returns:
+        ずれていたセルの数
+    """
+    with transaction.atomic():
+        expected = count_cells()
+        stored = {row[:-1]: row[-1] for row in RecordRollup.objects.select_for_update().values_list(*_FIELDS, 'count')}
+        drift = [cell for cell in stored.keys() | expected.keys() if stored.get(cell, 0) != expected.get(cell, 0)]
+        if apply and drift:
+            RecordRollup.objects.all().delete()
+            RecordRollup.objects.bulk_create(
+                [RecordRollup(count=count, **dict(zip(_FIELDS, cell))) for cell, count in expected.items() if count],
+                batch_size=1000,
+            )
+    return len(drift)
+
+
+def _parse_int(name, value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} は整数で指定してください')
+    if not MIN_INT <= number <= MAX_INT:
+        raise ValueError(f'{name} が範囲外です')
+    return number
+
+
+def _parse_filters(filters):
+    """{次元: 値のリスト} を RecordRollup の絞り込み条件にする"""
+    lookups = {}
+    for name, values in (filters or {}).items():
+        if name not in DIMENSIONS:
+            raise ValueError(f'不明な次元です: {name}')
+        field = DIMENSIONS[name]
+        if isinstance(EMPTY[field], int):
+            values = [_parse_int(name, value) for value in values]
+        lookups[f'{field}__in'] = list(values)
+    return lookups
+
+
+def query(group_by=(), filters=None):
+    """
+    キューブから任意の切り口で件数を集計する
+
+    Args:
+        group_by: 集計する次元名のリスト（例: ['age_range', 'frequency']）
+        filters: {次元名: 値のリスト} の絞り込み条件
+
+    Returns:
+        [{次元名: 値, ..., 'count': 件数}] のリスト（件数の多い順）
+
+    Raises:
+        ValueError: 不明な次元・値
+    """
+    for name in group_by:
+        if name not in DIMENSIONS:
+            raise ValueError(f'不明な次元です: {name}')
+    rows = RecordRollup.objects.filter(**_parse_filters(filters))
+    fields = [DIMENSIONS[name] for name in group_by]
+    if not fields:
+        return [{'count': rows.aggregate(total=Sum('count'))['total'] or 0}]
+    rows = rows.values(*fields).annotate(total=Sum('count')).order_by('-total', *fields)
+    return [
+        {**{name: row[DIMENSIONS[name]] for name in group_by}, 'count': row['total']}
+        for row in rows
+    ]
+
+
+def dimension_labels():
+    """
+    各次元の値の表示名
+
+    Returns:
+        {次元名: {値: 表示名}} の辞書
+    """
+    return {
+        'village': {0: '不明', **dict(Village.objects.values_list('id', 'name'))},
+        'type': {0: '未分類', **dict(OnomatopoeiaType.objects.values_list('id', 'type_code'))},
+        'frequency': {'': '不明', **dict(LanguageRecord.FREQUENCY_CHOICES)},
+        'age_range': {'': '不明', **dict(Speaker.AGE_RANGE_CHOICES)},
+        'year': {0: '不明'},
+    }
+
+
+class RollupCube:
+    """
+    集計キューブを NumPy の多次元配列として扱う（ノートブックでの分析用）
+
+    counts[i, j, ...] は axes の各次元の i, j, ... 番目の値の組の件数。
+
+    例:
+        cube = load_cube()
+        cube.select(type=[3]).sum('year').to_frame()
+        cube.sum('age_range', 'frequency').counts   # 年代×使用頻度のクロス集計表
+    """
+
+    def __init__(self, axes, counts, labels=None):
+        self.axes = axes
+        self.counts = counts
+        self.labels = labels or {}
+
+    @property
+    def dimensions(self):
+        return list(self.axes)
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def select(self, **filters):
+        """指定した値だけを残したキューブを返す（例: select(year=[2020, 2021])）"""
+        axes = dict(self.axes)
+        counts = self.counts
+        for name, values in filters.items():
+            position = self.dimensions.index(name)
+            wanted = set(values)
+            keep = [i for i, value in enumerate(self.axes[name]) if value in wanted]
+            axes[name] = [self.axes[name][i] for i in keep]
+            counts = np.take(counts, keep, axis=position)
+        return RollupCube(axes, counts, self.labels)
+
+    def sum(self, *keep):
+        """keep 以外の次元を合計したキューブを返す（keep の順に並べる）"""
+        positions = [self.dimensions.index(name) for name in keep]
+        others = tuple(i for i in range(len(self.axes)) if i not in positions)
+        counts = self.counts.sum(axis=others) if others else self.counts
+        # 合計後に残った次元は元の順なので、keep の順に並べ替える
+        remaining = sorted(positions)
+        counts = np.transpose(counts, [remaining.index(p) for p in positions])
+        return RollupCube({name: self.axes[name] for name in keep}, counts, self.labels)
+
+    def to_frame(self, labels=True):
+        """件数が 0 でない組を縦長の pandas.DataFrame にする"""
+        import pandas as pd
+
+        index = np.nonzero(self.counts)
+        data = {}
+        for axis, name in enumerate(self.dimensions):
+            values = np.asarray(self.axes[name], dtype=object)[index[axis]]
+            if labels and name in self.labels:
+                values = [self.labels[name].get(value, value) for value in values]
+            data[name] = values
+        data['count'] = self.counts[index]
+        return pd.DataFrame(data).sort_values('count', ascending=False, ignore_index=True)
+
+
+def load_cube(labels=True):
+    """
+    集計キューブをメモリに読み込む
+
+    Args:
+        labels: 値の表示名も読み込むか
+
+    Returns:
+        RollupCube
+    """
+    rows = list(RecordRollup.objects.filter(count__gt=0).values_list(*_FIELDS, 'count'))
+    axes = {}
+    indices = []
+    for position, name in enumerate(DIMENSIONS):
+        values = sorted({row[position] for row in rows})
+        lookup = {value: i for i, value in enumerate(values)}
+        axes[name] = values
+        indices.append(np.fromiter((lookup[row[position]] for row in rows), dtype=np.int64, count=len(rows)))
+    counts = np.zeros([len(values) for values in axes.values()], dtype=np.int64)
+    np.add.at(counts, tuple(indices), np.fromiter((row[-1] for row in rows), dtype=np.int64, count=len(rows)))
+    return RollupCube(axes, counts, dimension_labels() if labels else None)
@@ -0,0 +1,258 @@
+# language_archive/search.py
+
+from django.db import connection
+from django.db.models import Q
+from .models import LanguageRecord
+from . import kana_index
+
+# PostgreSQL: tsvector + pg_trgm の GIN インデックスを持つ検索用テーブル
+PG_SEARCH_TABLE = 'language_archive_record_search'
+
+# SQLite: FTS5（trigram トークナイザ）の仮想テーブル
+SQLITE_FTS_TABLE = 'language_archive_record_fts'
+
+# 検索結果1ページあたりの件数
+SEARCH_PAGE_SIZE = 24
+
+# trigram で索引を引ける最小文字数
+TRIGRAM_MIN_LENGTH = 3
+
+
+def build_search_text(record):
+    """
+    言語記録から検索対象となるテキストを組み立てる
+
+    Args:
+        record: LanguageRecordモデルのインスタンス
+
+    Returns:
+        検索用テキスト
+    """
+    parts = [
+        record.onomatopoeia_text,
+        record.meaning,
+        record.usage_example,
+        record.phonetic_notation,
+    ]
+    return ' '.join(part for part in parts if part)
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PostgresSearchBackend:
+    """PostgreSQL 用の検索バックエンド（tsvector + trigram）"""
+
+    _where = (
+        f"FROM {PG_SEARCH_TABLE} "
+        "WHERE vector @@ plainto_tsquery('simple', %s) OR body ILIKE %s"
+    )
+
+    def index(self, record_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {PG_SEARCH_TABLE} (record_id, body, vector) "
+                "VALUES (%s, %s, to_tsvector('simple', %s)) "
+                "ON CONFLICT (record_id) DO UPDATE "
+                "SET body = EXCLUDED.body, vector = EXCLUDED.vector",
+                [record_id, text, text],
+            )
+
+    def remove(self, record_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {PG_SEARCH_TABLE} WHERE record_id = %s", [record_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {PG_SEARCH_TABLE}")
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) {self._where}", [query, f"%{_escape_like(query)}%"])
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT record_id, "
+                "ts_rank(vector, plainto_tsquery('simple', %s)) + word_similarity(%s, body) AS rank "
+                f"{self._where} "
+                "ORDER BY rank DESC, record_id DESC LIMIT %s OFFSET %s",
+                [query, query, query, f"%{_escape_like(query)}%", limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteSearchBackend:
+    """SQLite 用の検索バックエンド（FTS5 trigram、開発環境向け）"""
+
+    def _where(self, query):
+        if len(query) >= TRIGRAM_MIN_LENGTH:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return f"WHERE {SQLITE_FTS_TABLE} MATCH %s", [phrase]
+        # trigram に満たない短い語は索引を使えないため、影テーブルを直接走査する
+        return "WHERE instr(body, %s) > 0", [query]
+
+    def index(self, record_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [record_id])
+            cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, body) VALUES (%s, %s)", [record_id, text])
+
+    def remove(self, record_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s", [record_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_FTS_TABLE}")
+
+    def count(self, query):
+        where, params = self._where(query)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {SQLITE_FTS_TABLE} {where}", params)
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        where, params = self._where(query)
+        order = f"bm25({SQLITE_FTS_TABLE}), rowid DESC" if 'MATCH' in where else "rowid DESC"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SQLITE_FTS_TABLE} {where} ORDER BY {order} LIMIT %s OFFSET %s",
+                params + [limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """検索用テーブルが使えない環境向けの icontains 検索"""
+
+    def _queryset(self, query):
+        return LanguageRecord.objects.filter(
+            Q(onomatopoeia_text__icontains=query) |
+            Q(meaning__icontains=query) |
+            Q(usage_example__icontains=query)
+        )
+
+    def index(self, record_id, text):
+        pass
+
+    def remove(self, record_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def count(self, query):
+        return self._queryset(query).count()
+
+    def search(self, query, offset, limit):
+        return list(
+            self._queryset(query).order_by('-recorded_date', '-id')
+            .values_list('id', flat=True)[offset:offset + limit]
+        )
+
+
+_backends = {}
+
+
+def get_search_backend():
+    """
+    接続中のデータベースに応じた検索バックエンドを返す
+
+    検索用テーブルの有無はプロセス内でキャッシュする。
+
+    Returns:
+        検索バックエンドのインスタンス
+    """
+    key = (connection.vendor, str(connection.settings_dict['NAME']))
+    if key not in _backends:
+        table_names = connection.introspection.table_names()
+        if connection.vendor == 'postgresql' and PG_SEARCH_TABLE in table_names:
+            _backends[key] = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and SQLITE_FTS_TABLE in table_names:
+            _backends[key] = SQLiteSearchBackend()
+        else:
+            _backends[key] = FallbackSearchBackend()
+    return _backends[key]
+
+
+def get_query_backend():
+    """
+    検索クエリに使うバックエンドを返す
+
+    かな正規化インデックス（build_kana_index で構築）があればそれを優先し、
+    なければデータベースの検索用テーブルを使う。
+
+    Returns:
+        count() / search() を持つバックエンドのインスタンス
+    """
+    reader = kana_index.get_reader()
+    if reader.available():
+        return kana_index.KanaSearchBackend(reader)
+    return get_search_backend()
+
+
+def index_record(record):
+    """言語記録の検索インデックスを更新する"""
+    get_search_backend().index(record.id, build_search_text(record))
+
+
+def remove_record(record_id):
+    """言語記録を検索インデックスから削除する"""
+    get_search_backend().remove(record_id)
+
+
+def rebuild_index(batch_size=1000):
+    """
+    検索インデックスを全件作り直す
+
+    Args:
+        batch_size: 一度に読み込む件数
+
+    Returns:
+        登録した件数
+    """
+    backend = get_search_backend()
+    backend.clear()
+    count = 0
+    records = LanguageRecord.objects.only(
+        'id', 'onomatopoeia_text', 'meaning', 'usage_example', 'phonetic_notation'
+    )
+    for record in records.iterator(chunk_size=batch_size):
+        backend.index(record.id, build_search_text(record))
+        count += 1
+    return count
+
+
+class SearchResults:
+    """
+    検索結果をスコア順に遅延取得するシーケンス
+
+    Django の Paginator にそのまま渡せるよう count() とスライスに対応する。
+    """
+
+    def __init__(self, query, queryset=None):
+        self.query = query
+        self.backend = get_query_backend()
+        self.queryset = queryset if queryset is not None else LanguageRecord.objects.all()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query) if self.query else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.query:
+            return []
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        ids = self.backend.search(self.query, start, max(stop - start, 0))
+        records = self.queryset.in_bulk(ids)
+        return [records[pk] for pk in ids if pk in records]
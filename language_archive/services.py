@@ -1,13 +1,481 @@
 # language_archive/services.py
 
+import base64
+import logging
 import os
+import random
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, unquote, urljoin, urlparse
 import uuid
+from django.conf import settings
+from django.core.files import File
 from django.urls import reverse
 import mimetypes 
+from .caching import bump_data_version
+from .geo import nearest_points
+from .models import GeographicRecord, Village
 
-def upload_to_supabase(file, bucket_name, file_prefix=""):
+# 最寄り集落とみなす最大距離（km）
+NEAREST_VILLAGE_MAX_DISTANCE_KM = 3.0
+
+# TUS プロトコルのバージョン
+TUS_VERSION = '1.0.0'
+
+# 通信のタイムアウト（接続, 読み取り）秒
+UPLOAD_TIMEOUT = (10, 300)
+REQUEST_TIMEOUT = (5, 30)
+
+# 再試行の待ち時間（秒）。試行のたびに倍にし、RETRY_MAX_WAIT で頭打ちにする
+RETRY_BASE_WAIT = 0.5
+RETRY_MAX_WAIT = 30
+
+# 再試行するHTTPステータス（一時的なエラー）
+RETRY_STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+
+# 一括削除の1リクエストあたりのオブジェクト数
+DELETE_BATCH_SIZE = 100
+
+# ダウンロード時に一度に読み込むバイト数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _supabase_config():
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_ANON_KEY")
+    
+    if not supabase_url or not supabase_key:
+        raise Exception("Supabase環境変数が設定されていません")
+    return supabase_url, supabase_key
+
+
+def _guess_content_type(file):
+    """アップロードするファイルの MIME タイプを決める"""
+    if getattr(file, 'content_type', None):
+        return file.content_type
+    # file.content_typeがNoneの場合に備えて、mimetypesで推測
+    content_type, _ = mimetypes.guess_type(file.name)
+    return content_type or 'application/octet-stream'  # デフォルトのMIMEタイプ
+
+
+def _tus_metadata(**values):
+    """TUS の Upload-Metadata ヘッダー値（キー と base64 値の組をカンマ区切り）"""
+    return ','.join(
+        f"{key} {base64.b64encode(str(value).encode('utf-8')).decode('ascii')}"
+        for key, value in values.items()
+    )
+
+
+def _retry_wait(attempt):
+    """attempt 回目の失敗後の待ち時間（ワーカー同士で再試行が揃わないよう揺らぎを加える）"""
+    return min(RETRY_BASE_WAIT * 2 ** attempt, RETRY_MAX_WAIT) * random.uniform(0.5, 1.0)
+
+
+def _is_retryable(error):
+    """通信エラー・サーバーエラー・オフセット不一致のみ再試行する"""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status in RETRY_STATUSES or status in (409, 423)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, KeyError, ValueError))
+
+
+class StorageClient:
+    """
+    Supabase Storage のクライアント
+
+    接続プールを持つ requests.Session を使い回し、一時的なエラーは
+    待ち時間を倍にしながら再試行する。一括操作は上限付きのスレッドプールで並列に実行する。
+    ワーカープロセスごとに get_storage_client() で取得して使う。
+    """
+
+    def __init__(self, base_url, api_key, max_workers=None, max_retries=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers or settings.SUPABASE_STORAGE_MAX_WORKERS
+        self.max_retries = settings.SUPABASE_UPLOAD_MAX_RETRIES if max_retries is None else max_retries
+
+        self.session = requests.Session()
+        # 再試行は _request で行う（ファイルを先頭に戻してから送り直すため）
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "apikey": api_key,
+        })
+
+    def object_url(self, bucket_name, object_name):
+        return f"{self.base_url}/storage/v1/object/{bucket_name}/{quote(object_name, safe='/')}"
+
+    def public_url(self, bucket_name, object_name):
+        return f"{self.base_url}/storage/v1/object/public/{bucket_name}/{object_name}"
+
+    def _request(self, method, url, rewind=None, timeout=REQUEST_TIMEOUT, **kwargs):
+        """
+        一時的なエラーを再試行しながらリクエストを送る
+
+        Args:
+            method: HTTPメソッド
+            url: URL
+            rewind: 送り直す前に先頭へ戻すファイルオブジェクト（本文として送るもの）
+            timeout: タイムアウト（接続, 読み取り）
+            kwargs: requests に渡す引数
+
+        Returns:
+            Response（再試行しないエラーのステータスもそのまま返す）
+        """
+        for attempt in range(self.max_retries + 1):
+            if rewind is not None:
+                rewind.seek(0)
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                error = requests.HTTPError(f"{response.status_code} Error for url: {url}", response=response)
+            if attempt < self.max_retries:
+                logger.warning("%s %s を再試行します（%d/%d）: %s", method, url, attempt + 1, self.max_retries, error)
+                time.sleep(_retry_wait(attempt))
+        raise error
+
+    def upload(self, file, bucket_name, object_name, content_type=None,
+               on_progress=None, upload_url=None, on_session=None):
+        """
+        ファイルを指定したオブジェクト名でアップロードする
+
+        ファイルは一括で読み込まずに分割して送信する。
+        settings.SUPABASE_RESUMABLE_THRESHOLD を超えるファイルは
+        途中で失敗しても続きから再開できる TUS 方式でアップロードする。
+        同じオブジェクト名へ送り直しても失敗しないよう上書きを許可する。
+
+        Args:
+            file: アップロードするファイルオブジェクト
+            bucket_name: バケット名
+            object_name: 保存先のオブジェクト名
+            content_type: MIME タイプ（省略時はファイルから推測）
+            on_progress: 進捗を受け取る関数 on_progress(送信済みバイト数, 全体のバイト数)
+            upload_url: 途中まで送った TUS アップロードのURL（指定すると続きから再開する）
+            on_session: TUS アップロードを開始したときにそのURLを受け取る関数
+
+        Returns:
+            公開URL
+        """
+        content_type = content_type or _guess_content_type(file)
+
+        file.seek(0)
+        if file.size > settings.SUPABASE_RESUMABLE_THRESHOLD:
+            self.resumable_upload(
+                file, bucket_name, object_name, content_type,
+                upload_url=upload_url, on_progress=on_progress, on_session=on_session,
+            )
+            return self.public_url(bucket_name, object_name)
+
+        # ファイルオブジェクトをそのまま渡し、少しずつ読み出して送信する
+        response = self._request('POST', self.object_url(bucket_name, object_name), rewind=file, data=file, headers={
+            "Content-Type": content_type,
+            "Content-Length": str(file.size),
+            "x-upsert": "true",
+        }, timeout=UPLOAD_TIMEOUT)
+        if not response.ok:
+            logger.error("アップロードエラー: %s %s", response.status_code, response.text)
+        response.raise_for_status()
+        if on_progress:
+            on_progress(file.size, file.size)
+        return self.public_url(bucket_name, object_name)
+
+    def _tus_offset(self, upload_url):
+        """サーバーが受け取り済みのバイト数を問い合わせる"""
+        response = self._request('HEAD', upload_url, headers={"Tus-Resumable": TUS_VERSION})
+        response.raise_for_status()
+        return int(response.headers['Upload-Offset'])
+
+    def resumable_upload(self, file, bucket_name, object_name, content_type,
+                         chunk_size=None, upload_url=None, on_progress=None, on_session=None):
+        """
+        TUS 方式で大きなファイルを分割してアップロードする
+
+        一度にメモリに載せるのは chunk_size バイトだけで、通信に失敗した場合は
+        サーバーが受け取り済みの位置を問い合わせてその続きから送り直す。
+
+        Args:
+            file: アップロードするファイルオブジェクト（seek 可能なもの）
+            bucket_name: バケット名
+            object_name: 保存先のオブジェクト名
+            content_type: MIME タイプ
+            chunk_size: 1回に送るバイト数（省略時は settings.SUPABASE_UPLOAD_CHUNK_SIZE）
+            upload_url: 途中まで送ったアップロードのURL（指定すると続きから再開する）
+            on_progress: 進捗を受け取る関数 on_progress(送信済みバイト数, 全体のバイト数)
+            on_session: アップロードを開始したときにそのURLを受け取る関数（再開用に保存する）
+
+        Returns:
+            アップロードのURL（再開に使用できる）
+        """
+        chunk_size = chunk_size or settings.SUPABASE_UPLOAD_CHUNK_SIZE
+        total = file.size
+
+        if upload_url is None:
+            endpoint = f"{self.base_url}/storage/v1/upload/resumable"
+            response = self._request('POST', endpoint, headers={
+                "Tus-Resumable": TUS_VERSION,
+                "x-upsert": "true",
+                "Upload-Length": str(total),
+                "Upload-Metadata": _tus_metadata(
+                    bucketName=bucket_name,
+                    objectName=object_name,
+                    contentType=content_type,
+                    cacheControl=3600,
+                ),
+            })
+            response.raise_for_status()
+            upload_url = urljoin(endpoint, response.headers['Location'])
+            offset = 0
+            if on_session:
+                on_session(upload_url)
+        else:
+            offset = self._tus_offset(upload_url)
+
+        failures = 0
+        while offset < total:
+            file.seek(offset)
+            chunk = file.read(chunk_size)
+            try:
+                response = self.session.patch(upload_url, data=chunk, headers={
+                    "Tus-Resumable": TUS_VERSION,
+                    "Upload-Offset": str(offset),
+                    "Content-Type": "application/offset+octet-stream",
+                }, timeout=UPLOAD_TIMEOUT)
+                response.raise_for_status()
+                offset = int(response.headers['Upload-Offset'])
+                failures = 0
+            except (requests.RequestException, KeyError, ValueError) as e:
+                if not _is_retryable(e) or failures >= self.max_retries:
+                    raise
+                logger.warning("アップロードを再試行します（%d/%d）: %s", failures + 1, self.max_retries, e)
+                time.sleep(_retry_wait(failures))
+                failures += 1
+                try:
+                    offset = self._tus_offset(upload_url)
+                except (requests.RequestException, KeyError, ValueError):
+                    # 問い合わせにも失敗した場合は同じ位置から送り直す
+                    pass
+            if on_progress:
+                on_progress(offset, total)
+
+        return upload_url
+
+    def head(self, bucket_name, object_name):
+        """
+        オブジェクトの情報を取得する
+
+        Returns:
+            {'size', 'content_type', 'etag', 'last_modified'} の辞書。存在しない場合は None
+        """
+        response = self._request('HEAD', self.object_url(bucket_name, object_name))
+        if response.status_code in (400, 404):
+            return None
+        response.raise_for_status()
+        return {
+            'size': int(response.headers.get('Content-Length', 0)),
+            'content_type': response.headers.get('Content-Type', ''),
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+        }
+
+    def download(self, bucket_name, object_name, file, max_size=None):
+        """
+        オブジェクトを分割して読み込みながらファイルに書き出す
+
+        Args:
+            bucket_name: バケット名
+            object_name: オブジェクト名
+            file: 書き込み先のファイルオブジェクト
+            max_size: 読み込むバイト数の上限（超えた場合は ValueError）
+
+        Returns:
+            書き込んだバイト数
+        """
+        response = self._request('GET', self.object_url(bucket_name, object_name), timeout=UPLOAD_TIMEOUT, stream=True)
+        with response:
+            response.raise_for_status()
+            size = 0
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError(f'{object_name} は {max_size} バイトを超えています')
+                file.write(chunk)
+        return size
+
+    def delete(self, bucket_name, object_names):
+        """
+        オブジェクトをまとめて削除する（1リクエスト）
+
+        Args:
+            bucket_name: バケット名
+            object_names: オブジェクト名のリスト
+
+        Returns:
+            削除したオブジェクト名のリスト
+        """
+        response = self._request(
+            'DELETE', f"{self.base_url}/storage/v1/object/{bucket_name}",
+            json={'prefixes': list(object_names)},
+        )
+        response.raise_for_status()
+        return [item.get('name') for item in response.json()]
+
+    def _run_concurrently(self, func, items):
+        """
+        items の各要素に func を並列に適用する
+
+        Returns:
+            (結果の辞書, 例外の辞書) の組。キーは items の各要素
+        """
+        results = {}
+        errors = {}
+        if not items:
+            return results, errors
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            futures = {executor.submit(func, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    results[item] = future.result()
+                except Exception as e:
+                    logger.error("ストレージ操作に失敗しました: %s: %s", item, e)
+                    errors[item] = e
+        return results, errors
+
+    def upload_many(self, items):
+        """
+        複数のファイルを並列にアップロードする
+
+        Args:
+            items: (ファイルパス, バケット名, オブジェクト名) の組のリスト
+
+        Returns:
+            (公開URLの辞書, 例外の辞書) の組。キーは items の各要素
+        """
+        def upload_path(item):
+            path, bucket_name, object_name = item
+            with open(path, 'rb') as f:
+                return self.upload(File(f, name=os.path.basename(path)), bucket_name, object_name)
+
+        return self._run_concurrently(upload_path, list(items))
+
+    def head_many(self, bucket_name, object_names):
+        """
+        複数のオブジェクトの情報を並列に取得する
+
+        Returns:
+            (情報の辞書（存在しない場合は None）, 例外の辞書) の組。キーはオブジェクト名
+        """
+        return self._run_concurrently(lambda name: self.head(bucket_name, name), list(object_names))
+
+    def delete_many(self, bucket_name, object_names, batch_size=DELETE_BATCH_SIZE):
+        """
+        多数のオブジェクトを batch_size 件ずつ並列に削除する
+
+        Returns:
+            (削除したオブジェクト名のリスト, 例外の辞書) の組。例外の辞書のキーは失敗したバッチの名前のタプル
+        """
+        object_names = list(object_names)
+        batches = [tuple(object_names[i:i + batch_size]) for i in range(0, len(object_names), batch_size)]
+        results, errors = self._run_concurrently(lambda batch: self.delete(bucket_name, batch), batches)
+        deleted = [name for names in results.values() for name in names]
+        return deleted, errors
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_storage_client():
+    """
+    このプロセスの StorageClient を返す（フォーク後は作り直す）
+
+    Returns:
+        StorageClient
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = StorageClient(*_supabase_config())
+            _client_pid = os.getpid()
+        return _client
+
+
+def parse_public_url(url):
+    """
+    ストレージの公開URLからバケット名とオブジェクト名を取り出す
+
+    Returns:
+        (バケット名, オブジェクト名)。ストレージのURLでない場合は None
+    """
+    prefix = get_storage_client().public_url('', '').rstrip('/') + '/'
+    if not (url or '').startswith(prefix):
+        return None
+    bucket_name, _, object_name = unquote(urlparse(url[len(prefix):]).path).partition('/')
+    if not bucket_name or not object_name:
+        return None
+    return bucket_name, object_name
+
+
+def resumable_upload(file, bucket_name, object_name, content_type,
+                     chunk_size=None, upload_url=None, on_progress=None, on_session=None):
+    """
+    TUS 方式で大きなファイルを分割して Supabase ストレージにアップロードする
+
+    StorageClient.resumable_upload を参照。
+
+    Returns:
+        アップロードのURL（再開に使用できる）
+    """
+    return get_storage_client().resumable_upload(
+        file, bucket_name, object_name, content_type,
+        chunk_size=chunk_size, upload_url=upload_url, on_progress=on_progress, on_session=on_session,
+    )
+
+
+def storage_object_name(file_name, file_prefix=""):
+    """
+    ストレージ上のユニークなオブジェクト名を生成する
+
+    Args:
+        file_name: 元のファイル名（拡張子を引き継ぐ）
+        file_prefix: ファイル名のプレフィックス
+
+    Returns:
+        オブジェクト名
+    """
+    extension = Path(file_name).suffix
+    return f"{file_prefix}{uuid.uuid4()}{extension}"
+
+
+def upload_object(file, bucket_name, object_name, content_type=None,
+                  on_progress=None, upload_url=None, on_session=None):
+    """
+    ファイルを指定したオブジェクト名で Supabase ストレージにアップロードする
+
+    StorageClient.upload を参照。
+
+    Returns:
+        公開URL
+    """
+    return get_storage_client().upload(
+        file, bucket_name, object_name, content_type=content_type,
+        on_progress=on_progress, upload_url=upload_url, on_session=on_session,
+    )
+
+
+def upload_to_supabase(file, bucket_name, file_prefix="", on_progress=None):
     """
     Supabaseストレージへのファイルアップロード（requests使用）
     
@@ -15,50 +483,14 @@ def upload_to_supabase(file, bucket_name, file_prefix=""):
         file: アップロードするファイルオブジェクト
         bucket_name: バケット名
         file_prefix: ファイル名のプレフィックス
+        on_progress: 進捗を受け取る関数 on_progress(送信済みバイト数, 全体のバイト数)
     
     Returns:
         公開URL
     """
-    supabase_url = os.environ.get("SUPABASE_URL")
-    supabase_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_ANON_KEY")
-    
-    if not supabase_url or not supabase_key:
-        raise Exception("Supabase環境変数が設定されていません")
-    
     # ユニークなファイル名を生成
-    extension = Path(file.name).suffix
-    storage_file_name = f"{file_prefix}{uuid.uuid4()}{extension}"
-    
-    # ファイルをアップロード
-    file_bytes = file.read()
-
-    # file.content_typeがNoneの場合に備えて、mimetypesで推測
-    content_type, _ = mimetypes.guess_type(file.name)
-    if not file.content_type and content_type:
-        file.content_type = content_type
-
-    if not file.content_type:
-        file.content_type = 'application/octet-stream'  # デフォルトのMIMEタイプ
-    
-    # Supabase Storage APIエンドポイント
-    upload_url = f"{supabase_url}/storage/v1/object/{bucket_name}/{storage_file_name}"
-    
-    headers = {
-        "Authorization": f"Bearer {supabase_key}",
-        "Content-Type": file.content_type,
-    }
-    
-    try:
-        response = requests.post(upload_url, data=file_bytes, headers=headers)
-        response.raise_for_status()
-        
-        # 公開URLを生成
-        public_url = f"{supabase_url}/storage/v1/object/public/{bucket_name}/{storage_file_name}"
-        return public_url
-    except Exception as e:
-        print(f"アップロードエラー: {e}")
-        print(f"レスポンス: {response.text if 'response' in locals() else 'No response'}")
-        raise
+    storage_file_name = storage_object_name(file.name, file_prefix)
+    return upload_object(file, bucket_name, storage_file_name, on_progress=on_progress)
 
 
 def get_bucket_name(file_type):
@@ -156,4 +588,104 @@ def create_archive_map(geographic_records, speakers):
     map_html = m._repr_html_()
     map_html = map_html.replace('<div class="folium-map"', '<div class="folium-map" id="map"')
     
-    return map_html
\ No newline at end of file
+    return map_html
+
+
+def find_nearest_village(lat, lon, max_distance_km=NEAREST_VILLAGE_MAX_DISTANCE_KM):
+    """
+    座標に最も近い集落を返す
+
+    Args:
+        lat: 緯度
+        lon: 経度
+        max_distance_km: これより遠い場合は該当なしとする
+
+    Returns:
+        Village。該当する集落がない場合は None
+    """
+    villages = list(Village.objects.only('id', 'latitude', 'longitude'))
+    if lat is None or lon is None or not villages:
+        return None
+    indices, distances = nearest_points(
+        [lat], [lon],
+        [v.latitude for v in villages], [v.longitude for v in villages],
+    )
+    if distances[0] > max_distance_km:
+        return None
+    return villages[int(indices[0])]
+
+
+def assign_nearest_villages(queryset=None, max_distance_km=NEAREST_VILLAGE_MAX_DISTANCE_KM,
+                            overwrite=False, apply=False, batch_size=1000):
+    """
+    座標を持つ地理環境データに最寄りの集落を一括で割り当てる
+
+    主キー順に batch_size 件ずつ読み込み、その分の地点と全集落の距離を
+    1つの行列で計算して、変更がある行だけを bulk_update で保存する
+    （距離行列のメモリは batch_size × 集落数で、全体の件数によらない）。
+
+    Args:
+        queryset: 対象の GeographicRecord クエリセット（省略時は全件）
+        max_distance_km: これより遠い集落は割り当てない
+        overwrite: True の場合は集落が設定済みのデータも割り当て直す
+        apply: False の場合は結果を返すだけで保存しない
+        batch_size: 一度に読み込み・更新する件数
+
+    Returns:
+        割り当て結果の辞書のリスト
+        （record_id, title, old_village_id, village_id, village_name, distance_km）
+    """
+    if queryset is None:
+        queryset = GeographicRecord.objects.all()
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+    if not overwrite:
+        queryset = queryset.filter(village__isnull=True)
+
+    villages = list(Village.objects.only('id', 'name', 'latitude', 'longitude').order_by('id'))
+    if not villages:
+        return []
+    village_lats = [v.latitude for v in villages]
+    village_lons = [v.longitude for v in villages]
+    records = queryset.only('id', 'title', 'latitude', 'longitude', 'village_id').order_by('id')
+
+    assignments = []
+    updated = 0
+    last_id = None
+    while True:
+        # 更新で対象から外れる行があっても読み飛ばさないよう、主キーの範囲で順に読み込む
+        batch = records if last_id is None else records.filter(id__gt=last_id)
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        indices, distances = nearest_points(
+            [r.latitude for r in batch], [r.longitude for r in batch], village_lats, village_lons,
+        )
+        changed = []
+        for record, index, distance in zip(batch, indices, distances):
+            if distance > max_distance_km:
+                continue
+            village = villages[int(index)]
+            if record.village_id == village.id:
+                continue
+            assignments.append({
+                'record_id': record.id,
+                'title': record.title,
+                'old_village_id': record.village_id,
+                'village_id': village.id,
+                'village_name': village.name,
+                'distance_km': round(float(distance), 3),
+            })
+            record.village_id = village.id
+            changed.append(record)
+
+        if apply and changed:
+            GeographicRecord.objects.bulk_update(changed, ['village'])
+            updated += len(changed)
+
+    if updated:
+        # bulk_update はシグナルを送らないため、キャッシュはここで無効にする
+        bump_data_version()
+
+    return assignments
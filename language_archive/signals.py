@@ -0,0 +1,336 @@
+# language_archive/signals.py
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import LanguageRecord, GeographicRecord, OnomatopoeiaType, Speaker, Village, UploadJob
+from . import search, kana_index, clusters, jobs, geocoding, archive_stats, rollup, documents
+from .caching import bump_data_version
+
+
+@receiver(post_save, sender=LanguageRecord)
+def update_search_index(sender, instance, **kwargs):
+    """言語記録の保存時に検索インデックスを更新"""
+    search.index_record(instance)
+
+
+@receiver(post_delete, sender=LanguageRecord)
+def remove_from_search_index(sender, instance, **kwargs):
+    """言語記録の削除時に検索インデックスから取り除く"""
+    search.remove_record(instance.id)
+
+
+@receiver(pre_save, sender=LanguageRecord)
+def remember_kana_document(sender, instance, update_fields=None, **kwargs):
+    """言語記録の変更前の索引テキストを控えておく（テキストが変わらない保存は追記しない）"""
+    instance._kana_document_before = None
+    if update_fields is not None and not set(kana_index.INDEXED_FIELDS) & set(update_fields):
+        # アップロード状態・サムネイルの更新などは索引に影響しない
+        instance._kana_document_before = False
+        return
+    if instance.pk:
+        values = sender.objects.filter(pk=instance.pk).values_list(*kana_index.INDEXED_FIELDS).first()
+        if values is not None:
+            instance._kana_document_before = kana_index.document_from_values(*values)
+
+
+@receiver(post_save, sender=LanguageRecord)
+def update_kana_index(sender, instance, created=False, **kwargs):
+    """言語記録の保存時にかな正規化インデックスの追記ログへ書き込む"""
+    before = getattr(instance, '_kana_document_before', None)
+    if before is False:
+        return
+    document = kana_index.build_document(instance)
+    if not created and document == before:
+        return
+    transaction.on_commit(lambda: kana_index.record_changed(instance.id, document))
+
+
+@receiver(post_delete, sender=LanguageRecord)
+def remove_from_kana_index(sender, instance, **kwargs):
+    """言語記録の削除時にかな正規化インデックスの追記ログへ書き込む"""
+    record_id = instance.id
+    transaction.on_commit(lambda: kana_index.record_changed(record_id, None))
+
+
+@receiver(post_save, sender=LanguageRecord)
+@receiver(post_delete, sender=LanguageRecord)
+@receiver(post_save, sender=GeographicRecord)
+@receiver(post_delete, sender=GeographicRecord)
+@receiver(post_save, sender=Speaker)
+@receiver(post_delete, sender=Speaker)
+@receiver(post_save, sender=Village)
+@receiver(post_delete, sender=Village)
+@receiver(post_save, sender=OnomatopoeiaType)
+@receiver(post_delete, sender=OnomatopoeiaType)
+def invalidate_cached_fragments(sender, **kwargs):
+    """データ更新時に世代番号を進め、地図HTMLなどのキャッシュを無効にする"""
+    transaction.on_commit(bump_data_version)
+
+
+@receiver(pre_save, sender=GeographicRecord)
+def remember_geographic_point(sender, instance, **kwargs):
+    """地理環境データの変更前の座標を控えておく"""
+    instance._map_point_before = (
+        sender.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=GeographicRecord)
+def update_geographic_cluster(sender, instance, **kwargs):
+    """地理環境データの座標が変わったら地図クラスタを更新"""
+    before = getattr(instance, '_map_point_before', None)
+    after = (instance.latitude, instance.longitude)
+    if before == after:
+        return
+    if before:
+        clusters.remove_point(*before, geo=1)
+    clusters.add_point(*after, geo=1)
+
+
+@receiver(post_delete, sender=GeographicRecord)
+def remove_geographic_cluster(sender, instance, **kwargs):
+    """地理環境データの削除時に地図クラスタから取り除く"""
+    clusters.remove_point(instance.latitude, instance.longitude, geo=1)
+
+
+def _village_point(village_id):
+    if village_id is None:
+        return None
+    return Village.objects.filter(pk=village_id).values_list('latitude', 'longitude').first()
+
+
+@receiver(pre_save, sender=Speaker)
+def remember_speaker_village(sender, instance, **kwargs):
+    """話者の変更前の集落・年代を控えておく"""
+    before = (
+        sender.objects.filter(pk=instance.pk).values_list('village_id', 'age_range').first()
+        if instance.pk else None
+    )
+    instance._village_before, instance._age_range_before = before or (None, None)
+
+
+@receiver(post_save, sender=Speaker)
+def update_speaker_cluster(sender, instance, **kwargs):
+    """話者の集落が変わったら地図クラスタを更新"""
+    before = getattr(instance, '_village_before', None)
+    if before == instance.village_id:
+        return
+    point = _village_point(before)
+    if point:
+        clusters.remove_point(*point, speaker=1)
+    point = _village_point(instance.village_id)
+    if point:
+        clusters.add_point(*point, speaker=1)
+
+
+@receiver(post_delete, sender=Speaker)
+def remove_speaker_cluster(sender, instance, **kwargs):
+    """話者の削除時に地図クラスタから取り除く"""
+    point = _village_point(instance.village_id)
+    if point:
+        clusters.remove_point(*point, speaker=1)
+
+
+@receiver(pre_save, sender=Village)
+def remember_village_point(sender, instance, **kwargs):
+    """集落の変更前の座標を控えておく"""
+    instance._map_point_before = _village_point(instance.pk)
+
+
+@receiver(post_save, sender=Village)
+def update_village_cluster(sender, instance, **kwargs):
+    """集落の座標が変わったら、その集落の話者を地図クラスタ上で移動する"""
+    before = getattr(instance, '_map_point_before', None)
+    after = (instance.latitude, instance.longitude)
+    if not before or before == after:
+        return
+    speaker_count = Speaker.objects.filter(village=instance).count()
+    if speaker_count:
+        clusters.remove_point(*before, speaker=speaker_count)
+        clusters.add_point(*after, speaker=speaker_count)
+
+
+@receiver(pre_delete, sender=Village)
+def remove_village_cluster(sender, instance, **kwargs):
+    """集落の削除時に、その集落の話者を地図クラスタから取り除く（話者の集落は NULL になる）"""
+    speaker_count = Speaker.objects.filter(village=instance).count()
+    if speaker_count:
+        clusters.remove_point(instance.latitude, instance.longitude, speaker=speaker_count)
+
+
+@receiver(post_delete, sender=UploadJob)
+def remove_upload_spool_file(sender, instance, **kwargs):
+    """アップロードジョブの削除時（記録の削除を含む）に一時ファイルを削除する"""
+    transaction.on_commit(lambda: jobs.remove_spool_file(instance))
+
+
+@receiver(post_save, sender=Village)
+@receiver(post_delete, sender=Village)
+def reload_gazetteer(sender, **kwargs):
+    """集落の変更時に、ジオコーディングの代替に使う集落データを読み直させる"""
+    transaction.on_commit(geocoding.villages_changed)
+
+
+# 言語記録の集計（集計値・集計キューブ）に関わるフィールド
+RECORD_AGGREGATE_FIELDS = {
+    'speaker', 'speaker_id', 'file_type', 'language_frequency',
+    'onomatopoeia_type', 'onomatopoeia_type_id', 'recorded_date',
+}
+
+
+def _record_aggregates(speaker, file_type, frequency, type_id, recorded_date):
+    """
+    言語記録の集計値のキーの引数と集計キューブのセルを作る
+
+    Args:
+        speaker: 話者の (集落ID, 年代)。話者なしの場合は None
+    """
+    village_id, age_range = speaker or (None, '')
+    return (
+        (village_id, file_type, frequency),
+        rollup.make_cell(village_id, type_id, frequency, age_range, recorded_date),
+    )
+
+
+def _current_aggregates(instance):
+    speaker = None
+    if instance.speaker_id is not None:
+        speaker = Speaker.objects.filter(pk=instance.speaker_id).values_list('village_id', 'age_range').first()
+    return _record_aggregates(
+        speaker, instance.file_type, instance.language_frequency,
+        instance.onomatopoeia_type_id, instance.recorded_date,
+    )
+
+
+@receiver(pre_save, sender=LanguageRecord)
+def remember_record_aggregates(sender, instance, update_fields=None, **kwargs):
+    """言語記録の変更前の集計キー（話者の集落・年代、ファイル種類、使用頻度、型、収録年）を控えておく"""
+    if update_fields is not None and not RECORD_AGGREGATE_FIELDS & set(update_fields):
+        # アップロード状態の更新などは集計に影響しない
+        instance._aggregates_before = False
+        return
+    row = sender.objects.filter(pk=instance.pk).values_list(
+        'speaker__village_id', 'speaker__age_range', 'speaker_id',
+        'file_type', 'language_frequency', 'onomatopoeia_type_id', 'recorded_date',
+    ).first() if instance.pk else None
+    if row is None:
+        instance._aggregates_before = None
+        return
+    village_id, age_range, speaker_id, *fields = row
+    speaker = (village_id, age_range) if speaker_id is not None else None
+    instance._aggregates_before = _record_aggregates(speaker, *fields)
+
+
+@receiver(post_save, sender=LanguageRecord)
+def update_record_aggregates(sender, instance, **kwargs):
+    """言語記録の登録・変更を集計値と集計キューブに反映する"""
+    before = getattr(instance, '_aggregates_before', None)
+    if before is False:
+        return
+    after = _current_aggregates(instance)
+    if before is None:
+        archive_stats.move_record(None, after[0])
+        rollup.move_record(None, after[1])
+        return
+    if before[0] != after[0]:
+        archive_stats.move_record(before[0], after[0])
+    rollup.move_record(before[1], after[1])
+
+
+@receiver(post_delete, sender=LanguageRecord)
+def remove_record_aggregates(sender, instance, **kwargs):
+    """言語記録の削除を集計値と集計キューブに反映する"""
+    before = _current_aggregates(instance)
+    archive_stats.move_record(before[0], None)
+    rollup.move_record(before[1], None)
+
+
+@receiver(post_save, sender=Speaker)
+def update_speaker_statistics(sender, instance, created, **kwargs):
+    """話者数と、集落が変わった話者の言語記録数を集計値に反映する"""
+    if created:
+        archive_stats.adjust({archive_stats.SPEAKERS: 1})
+        return
+    before = getattr(instance, '_village_before', None)
+    if before == instance.village_id:
+        return
+    record_count = LanguageRecord.objects.filter(speaker=instance).count()
+    if record_count:
+        changes = {}
+        if before is not None:
+            changes[f'{archive_stats.VILLAGE_PREFIX}{before}'] = -record_count
+        if instance.village_id is not None:
+            changes[f'{archive_stats.VILLAGE_PREFIX}{instance.village_id}'] = record_count
+        archive_stats.adjust(changes)
+
+
+@receiver(post_delete, sender=Speaker)
+def remove_speaker_statistics(sender, instance, **kwargs):
+    """話者の削除を集計値に反映する"""
+    archive_stats.adjust({archive_stats.SPEAKERS: -1})
+
+
+@receiver(pre_delete, sender=Village)
+def remove_village_statistics(sender, instance, **kwargs):
+    """集落の削除時に、その集落の言語記録数を集計値から取り除く"""
+    archive_stats.village_removed(instance.pk)
+
+
+@receiver(post_save, sender=Speaker)
+def update_speaker_rollup(sender, instance, created, **kwargs):
+    """話者の集落・年代が変わったら、その話者の言語記録を集計キューブ上で移動する"""
+    if created:
+        return
+    before = (getattr(instance, '_village_before', None), getattr(instance, '_age_range_before', None))
+    rollup.speaker_changed(instance.pk, before, (instance.village_id, instance.age_range))
+
+
+@receiver(pre_delete, sender=Village)
+def remove_village_rollup(sender, instance, **kwargs):
+    """集落の削除時に、その集落のセルを「集落なし」にまとめる（話者の集落は NULL になる）"""
+    rollup.dimension_removed('village_id', instance.pk)
+
+
+@receiver(pre_delete, sender=OnomatopoeiaType)
+def remove_type_rollup(sender, instance, **kwargs):
+    """型の削除時に、その型のセルを「型なし」にまとめる（言語記録の型は NULL になる）"""
+    rollup.dimension_removed('type_id', instance.pk)
+
+
+def _refresh_documents_on_commit(record_ids):
+    if record_ids:
+        transaction.on_commit(lambda: documents.refresh(record_ids))
+
+
+@receiver(post_save, sender=LanguageRecord)
+def update_record_document(sender, instance, **kwargs):
+    """言語記録の保存時にAPI用JSONを作り直す"""
+    _refresh_documents_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Speaker)
+@receiver(post_save, sender=Village)
+@receiver(post_save, sender=OnomatopoeiaType)
+def update_dependent_documents(sender, instance, created, **kwargs):
+    """話者・集落・型の変更時に、それを参照する言語記録のAPI用JSONを作り直す"""
+    if created:
+        return
+    key = {Speaker: 'speaker_id', Village: 'village_id', OnomatopoeiaType: 'type_id'}[sender]
+    _refresh_documents_on_commit(documents.dependent_record_ids(**{key: instance.pk}))
+
+
+@receiver(pre_delete, sender=Village)
+@receiver(pre_delete, sender=OnomatopoeiaType)
+def remember_dependent_documents(sender, instance, **kwargs):
+    """集落・型の削除前に、参照している言語記録を控えておく（削除後は参照が NULL になる）"""
+    key = 'village_id' if sender is Village else 'type_id'
+    instance._dependent_records = documents.dependent_record_ids(**{key: instance.pk})
+
+
+@receiver(post_delete, sender=Village)
+@receiver(post_delete, sender=OnomatopoeiaType)
+def refresh_dependent_documents(sender, instance, **kwargs):
+    """集落・型の削除後に、参照していた言語記録のAPI用JSONを作り直す"""
+    _refresh_documents_on_commit(getattr(instance, '_dependent_records', []))
@@ -1,3 +1,389 @@
-from django.test import TestCase
+import datetime
+import struct
+import tempfile
+import wave
+from pathlib import Path
+from unittest import mock, skipUnless
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .models import GeographicRecord, LanguageRecord, OnomatopoeiaType, Speaker, Village
+from .services import assign_nearest_villages
+from . import archive_stats, clusters, documents, kana_index, rollup, waveforms
 
-# Create your tests here.
+# テストではファイルベースのキャッシュを使わず、プロセス内で完結させる
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'language-archive-tests',
+    }
+}
+
+# 1ページ（24件）を超える件数にして、N+1 があれば件数が大きくずれるようにする
+RECORD_COUNT = 60
+GEOGRAPHIC_RECORD_COUNT = 40
+
+TEXTS = ['ぴかぴか', 'ゴロゴロ', 'さらさら', 'どんどん', 'ふわふわ', 'きらきら']
+
+
+class ArchiveTestData:
+    """集落・話者・型・言語記録・地理環境データを登録する"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.villages = [
+            Village.objects.create(name=name, latitude=28.3 + i * 0.02, longitude=129.9 + i * 0.02)
+            for i, name in enumerate(['湾', '志戸桶', '阿伝'])
+        ]
+        cls.types = [
+            OnomatopoeiaType.objects.create(type_code=code, type_name=name, description=name)
+            for code, name in [('ABAB', '反復'), ('AっB', '促音'), ('ABり', 'り形')]
+        ]
+        ages = [value for value, _ in Speaker.AGE_RANGE_CHOICES]
+        cls.speakers = [
+            Speaker.objects.create(
+                speaker_id=f'SPK{i:03d}', age_range=ages[i % len(ages)], gender='MF'[i % 2],
+                village=cls.villages[i % len(cls.villages)],
+            )
+            for i in range(6)
+        ]
+        file_types = [value for value, _ in LanguageRecord.FILE_TYPE_CHOICES]
+        frequencies = [value for value, _ in LanguageRecord.FREQUENCY_CHOICES]
+        for i in range(RECORD_COUNT):
+            LanguageRecord.objects.create(
+                onomatopoeia_text=TEXTS[i % len(TEXTS)],
+                meaning=f'意味{i}',
+                usage_example=f'用例{i}',
+                language_frequency=frequencies[i % len(frequencies)],
+                file_type=file_types[i % len(file_types)],
+                file_path=f'https://example.supabase.co/storage/v1/object/public/archive/language/{i}.mp3',
+                speaker=cls.speakers[i % len(cls.speakers)],
+                onomatopoeia_type=cls.types[i % len(cls.types)],
+                village=cls.villages[i % len(cls.villages)],
+                recorded_date=datetime.date(2018 + i % 5, 1 + i % 12, 1 + i % 28),
+            )
+        content_types = [value for value, _ in GeographicRecord.CONTENT_TYPE_CHOICES]
+        for i in range(GEOGRAPHIC_RECORD_COUNT):
+            GeographicRecord.objects.create(
+                title=f'映像{i}',
+                content_type=content_types[i % len(content_types)],
+                description=f'説明{i}',
+                file_path=f'https://example.supabase.co/storage/v1/object/public/archive/geographic/{i}.mp4',
+                village=cls.villages[i % len(cls.villages)],
+                latitude=28.3 + i * 0.001,
+                longitude=129.9 + i * 0.001,
+                captured_date=datetime.date(2019 + i % 4, 1 + i % 12, 1 + i % 28),
+            )
+
+
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class QueryBudgetTests(ArchiveTestData, TestCase):
+    """
+    ビューごとのクエリ数の上限
+
+    件数の多いページでもクエリ数が一定であることを確かめる（N+1 が入ると失敗する）。
+    クエリを減らした場合は数値を下げ、増やす場合は理由を確認してから上げること。
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueries(self, budget, url, status=200, **headers):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_index(self):
+        self.assertQueries(1, reverse('index'))
+
+    def test_record_list(self):
+        self.assertQueries(4, reverse('record_list'))
+
+    def test_record_list_filtered(self):
+        village = self.villages[0]
+        url = reverse('record_list') + f'?village={village.id}&file_type=audio&onomatopoeia_type=ABAB'
+        self.assertQueries(4, url)
+
+    def test_record_list_next_page(self):
+        response = self.client.get(reverse('record_list'))
+        cache.clear()
+        self.assertQueries(4, reverse('record_list') + '?' + response.context['page'].next_query)
+
+    def test_search_records(self):
+        self.assertQueries(3, reverse('search_records') + '?q=ぴかぴか')
+
+    def test_record_detail(self):
+        record = LanguageRecord.objects.first()
+        self.assertQueries(2, reverse('record_detail', args=[record.id]))
+
+    def test_geographic_list(self):
+        self.assertQueries(3, reverse('geographic_list') + '?content_type=drone_video')
+
+    def test_village_records(self):
+        self.assertQueries(3, reverse('village_records', args=[self.villages[0].id]))
+
+    def test_speaker_records(self):
+        self.assertQueries(3, reverse('speaker_records', args=[self.speakers[0].id]))
+
+    def test_map_features_api(self):
+        self.assertQueries(2, reverse('api_map_features') + '?year=2020')
+
+    def test_map_clusters_api(self):
+        self.assertQueries(1, reverse('api_map_clusters') + '?z=10&bbox=129,28,131,29')
+
+    def test_village_records_api(self):
+        # TestCase では on_commit が実行されないため、シグナルの代わりに作っておく
+        documents.rebuild()
+        self.assertQueries(2, reverse('api_village_records', args=[self.villages[0].id]))
+
+    def test_stats_api(self):
+        self.assertQueries(3, reverse('api_stats') + '?group_by=age_range,frequency')
+
+    def test_api_v2_records(self):
+        self.assertQueries(1, reverse('api_v2_list', args=['records']) + '?fields=all&limit=500')
+
+    def test_api_v2_not_modified(self):
+        url = reverse('api_v2_list', args=['speakers'])
+        response = self.client.get(url)
+        self.assertQueries(0, url, status=304, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_cached_page(self):
+        self.client.get(reverse('record_list'))
+        self.assertQueries(0, reverse('record_list'))
+
+
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class AggregateTests(ArchiveTestData, TestCase):
+    """シグナルで更新する集計値が、数え直した値と一致すること"""
+
+    def test_statistics_follow_changes(self):
+        archive_stats.reconcile()
+        rollup.reconcile()
+        record = LanguageRecord.objects.first()
+        record.file_type = 'video'
+        record.save()
+        speaker = self.speakers[1]
+        speaker.village = self.villages[2]
+        speaker.age_range = '100+'
+        speaker.save()
+        self.villages[0].delete()
+        self.types[0].delete()
+        LanguageRecord.objects.last().delete()
+
+        self.assertEqual(archive_stats.reconcile(apply=False), {})
+        self.assertEqual(rollup.reconcile(apply=False), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'クエリプランの確認は PostgreSQL のみ')
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class QueryPlanTests(ArchiveTestData, TestCase):
+    """
+    よく使う絞り込み・並び替えが索引を使えること
+
+    テストデータは少なく、プランナーは索引があっても全件走査を選ぶため、
+    enable_seqscan を無効にして「索引で実行できるか」を確かめる。
+    """
+
+    def assertNoSeqScan(self, queryset):
+        with connection.cursor() as cursor:
+            # テストのトランザクションの中だけで有効
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        self.assertNotIn(f'Seq Scan on {table}', plan, plan)
+
+    def test_record_list_ordering(self):
+        self.assertNoSeqScan(LanguageRecord.objects.order_by('-recorded_date', '-id')[:25])
+
+    def test_record_list_file_type(self):
+        self.assertNoSeqScan(LanguageRecord.objects.filter(file_type='audio').order_by('-recorded_date', '-id')[:25])
+
+    def test_record_list_village(self):
+        village = self.villages[0]
+        self.assertNoSeqScan(
+            LanguageRecord.objects.filter(speaker__village=village).order_by('-recorded_date', '-id')[:25]
+        )
+
+    def test_recent_records(self):
+        self.assertNoSeqScan(LanguageRecord.objects.order_by('-created_at')[:6])
+
+    def test_geographic_list_content_type(self):
+        self.assertNoSeqScan(
+            GeographicRecord.objects.filter(content_type='drone_video').order_by('-captured_date', '-id')[:25]
+        )
+
+    def test_map_year(self):
+        self.assertNoSeqScan(GeographicRecord.objects.filter(captured_date__year=2020))
+
+
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class InvalidParameterTests(ArchiveTestData, TestCase):
+    """不正なクエリ文字列は 500 ではなく 400（または 404）になること"""
+
+    def setUp(self):
+        cache.clear()
+
+    def assertStatus(self, status, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status, f'{url}: {response.content[:200]!r}')
+        return response
+
+    def test_api_v2(self):
+        records = reverse('api_v2_list', args=['records'])
+        speakers = reverse('api_v2_list', args=['speakers'])
+        geographic = reverse('api_v2_list', args=['geographic'])
+        for url in [
+            records + '?village=abc',
+            records + '?speaker=1,2',
+            records + '?cursor=99999999999999999999',
+            records + '?ids=99999999999999999999',
+            speakers + '?village=x',
+            geographic + '?village=99999999999999999999999',
+        ]:
+            self.assertStatus(400, url)
+        self.assertStatus(404, reverse('api_v2_detail', args=['records', 10 ** 20]))
+        self.assertStatus(200, records + f'?village={self.villages[0].id}&speaker={self.speakers[0].id}')
+
+    def test_api_v2_ignores_unknown_parameters(self):
+        url = reverse('api_v2_list', args=['villages'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url + '?_=12345')
+        self.assertEqual(response.status_code, 200)
+
+    def test_map_bbox(self):
+        for bbox in ['nan,nan,nan,nan', 'inf,28,131,29', '129,-inf,131,29', '1,2,3']:
+            self.assertStatus(400, reverse('api_map_clusters') + f'?z=10&bbox={bbox}')
+            self.assertStatus(400, reverse('api_map_features') + f'?bbox={bbox}')
+        self.assertStatus(200, reverse('api_map_clusters') + '?z=10&bbox=-500,-100,500,100')
+
+    def test_stats_api(self):
+        response = self.assertStatus(400, reverse('api_stats') + '?year=abc')
+        self.assertEqual(response.json(), {'error': 'year は整数で指定してください'})
+        self.assertStatus(400, reverse('api_stats') + '?village=99999999999999999999999')
+        self.assertStatus(200, reverse('api_stats') + '?group_by=year&type=ABAB,999')
+
+
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class MapClusterTests(ArchiveTestData, TestCase):
+    """サーバー側のクラスタ"""
+
+    def test_single_points_open_popups(self):
+        record = GeographicRecord.objects.create(
+            title='離れた地点', content_type='drone_photo', file_path='https://example.com/far.jpg',
+            latitude=27.5, longitude=128.5, captured_date=datetime.date(2020, 1, 1),
+        )
+        clusters.rebuild()
+        features = clusters.clusters_in_bbox(10, 128, 27, 132, 30)
+        single = [feature['properties'] for feature in features if not feature['properties']['cluster']]
+        self.assertIn({'cluster': False, 'kind': 'geo', 'id': record.id, 'content_type': 'drone_photo'}, single)
+        self.assertTrue(all(feature['properties']['count'] > 1
+                            for feature in features if feature['properties']['cluster']))
+
+    def test_many_single_points(self):
+        # 1回のクエリの上限を超える数の離れた地点も、すべて個別の地点として返す
+        count = clusters.SINGLE_CELL_BATCH * 2 + 5
+        GeographicRecord.objects.bulk_create([
+            GeographicRecord(
+                title=f'離れた地点{i}', content_type='drone_photo', file_path=f'https://example.com/{i}.jpg',
+                latitude=20 + i * 0.05, longitude=140, captured_date=datetime.date(2020, 1, 1),
+            )
+            for i in range(count)
+        ])
+        clusters.rebuild()
+        with self.assertNumQueries(4):
+            features = clusters.clusters_in_bbox(12, 139.9, 19.9, 140.1, 20 + count * 0.05)
+        self.assertEqual(sum(1 for feature in features if feature['properties'].get('kind') == 'geo'), count)
+
+
+class StubDecoder:
+    """どの形式も受け付け、無音を返すデコーダー（デコーダーの順番の確認用）"""
+
+    def can_decode(self, path):
+        return True
+
+    def decode(self, path):
+        return 8000, iter([np.zeros(8000, dtype=np.float32)])
+
+
+def _write_wav(path, format_tag, bits, extra=b''):
+    """fmt チャンクを直接書いた WAV（wave モジュールでは float などを書けないため）"""
+    data = bytes(bits // 8 * 100)
+    fmt = struct.pack('<HHIIHH', format_tag, 1, 8000, 8000 * bits // 8, bits // 8, bits) + extra
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data)) + data
+    path.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+
+@override_settings(AUDIO_DECODERS=['language_archive.waveforms.WavDecoder', 'language_archive.tests.StubDecoder'])
+class AudioDecoderTests(TestCase):
+    """WAV でも標準ライブラリで読めない形式は次のデコーダーに渡すこと"""
+
+    def setUp(self):
+        waveforms.get_decoders.cache_clear()
+        self.addCleanup(waveforms.get_decoders.cache_clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_pcm_wav(self):
+        path = self.directory / 'pcm.wav'
+        with wave.open(str(path), 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(16000)
+            f.writeframes(bytes(3200))
+        self.assertTrue(waveforms.WavDecoder().can_decode(path))
+        self.assertEqual(waveforms.decode_audio(path)[0], 16000)
+
+    def test_float_and_extensible_wav(self):
+        float_path = self.directory / 'float.wav'
+        _write_wav(float_path, 3, 32)
+        extensible_path = self.directory / 'extensible.wav'
+        _write_wav(extensible_path, 0xFFFE, 16, struct.pack('<HHI', 22, 16, 0) + bytes(16))
+        for path in (float_path, extensible_path):
+            self.assertFalse(waveforms.WavDecoder().can_decode(path))
+            self.assertEqual(waveforms.decode_audio(path)[0], 8000)
+
+    def test_falls_back_when_decoder_fails(self):
+        path = self.directory / 'broken.wav'
+        _write_wav(path, 1, 16)
+        path.write_bytes(path.read_bytes()[:30])
+        self.assertEqual(waveforms.decode_audio(path)[0], 8000)
+
+
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class NearestVillageTests(ArchiveTestData, TestCase):
+    """集落の一括割り当て"""
+
+    def test_assign_in_batches(self):
+        GeographicRecord.objects.update(village=None)
+        expected = assign_nearest_villages(batch_size=1000)
+        self.assertEqual(len(expected), GEOGRAPHIC_RECORD_COUNT)
+        # 少ない件数ずつ読み込んでも、保存しながら進めても同じ結果になる
+        self.assertEqual(assign_nearest_villages(batch_size=7, apply=True), expected)
+        self.assertFalse(GeographicRecord.objects.filter(village__isnull=True).exists())
+        self.assertEqual(assign_nearest_villages(batch_size=7), [])
+
+
+@override_settings(CACHES=TEST_CACHES, GEOCODING_OFFLINE=True)
+class KanaIndexSignalTests(ArchiveTestData, TestCase):
+    """索引テキストが変わる保存だけをかな正規化インデックスの追記ログに書くこと"""
+
+    def save(self, record, **kwargs):
+        with mock.patch.object(kana_index, 'record_changed') as record_changed:
+            with self.captureOnCommitCallbacks(execute=True):
+                record.save(**kwargs)
+        return [call.args for call in record_changed.call_args_list]
+
+    def test_only_text_changes_are_logged(self):
+        record = LanguageRecord.objects.first()
+        record.upload_status = 'ready'
+        record.thumbnail_path = 'https://example.com/thumb.jpg'
+        self.assertEqual(self.save(record, update_fields=['upload_status', 'thumbnail_path']), [])
+        record.notes = '備考'
+        self.assertEqual(self.save(record), [])
+        record.meaning = '新しい意味'
+        self.assertEqual(self.save(record), [(record.id, kana_index.build_document(record))])
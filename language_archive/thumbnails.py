@@ -0,0 +1,203 @@
+# language_archive/thumbnails.py
+
+import io
+import mimetypes
+import shutil
+import subprocess
+import tempfile
+from pathlib import PurePosixPath
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.files import File
+from .services import get_storage_client, parse_public_url
+
+# サムネイルの長辺（px）
+THUMBNAIL_MAX_SIZE = 480
+THUMBNAIL_QUALITY = 75
+
+# 動画のポスターフレームを切り出す位置（秒）
+POSTER_FRAME_SECOND = 1.0
+FFMPEG_TIMEOUT = 120
+
+# 既存の画像からサムネイルを作るときにダウンロードする上限（バイト）
+MAX_SOURCE_IMAGE_SIZE = 100 * 1024 * 1024
+
+# サムネイルを作る地理環境データのコンテンツ種類
+GEOGRAPHIC_MEDIA_KINDS = {
+    'drone_photo': 'image',
+    'drone_video': 'video',
+}
+
+
+class ThumbnailError(Exception):
+    """サムネイルを作成できないエラー"""
+
+
+def media_kind(record, file_name=None):
+    """
+    サムネイルの作り方を返す
+
+    Args:
+        record: LanguageRecord または GeographicRecord
+        file_name: 元のファイル名（省略時は file_path から判断する）
+
+    Returns:
+        'image'、'video'、またはサムネイルを作らない場合は None
+    """
+    if record._meta.model_name == 'languagerecord':
+        return record.file_type if record.file_type in ('image', 'video') else None
+    kind = GEOGRAPHIC_MEDIA_KINDS.get(record.content_type)
+    file_name = file_name or urlparse(record.file_path).path
+    if kind is None and file_name:
+        # その他の場合はファイルの拡張子から判断する
+        content_type = mimetypes.guess_type(file_name)[0] or ''
+        kind = content_type.split('/')[0] if content_type.startswith(('image/', 'video/')) else None
+    return kind
+
+
+def thumbnail_object_name(object_name, extension):
+    """元のファイルと同じ場所に置くサムネイルのオブジェクト名（例: a/b.jpg → a/b.thumb.webp）"""
+    return f"{PurePosixPath(object_name).with_suffix('')}.thumb.{extension}"
+
+
+def _encode(image):
+    """Pillow の画像を縮小して WebP（使えない場合は JPEG）にする"""
+    from PIL import features
+
+    image.thumbnail((THUMBNAIL_MAX_SIZE, THUMBNAIL_MAX_SIZE))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    if features.check('webp'):
+        image.save(buffer, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+        return buffer.getvalue(), 'image/webp', 'webp'
+    image.save(buffer, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue(), 'image/jpeg', 'jpg'
+
+
+def image_thumbnail(source):
+    """
+    画像のサムネイルを作る
+
+    Args:
+        source: 画像ファイルのパスまたはファイルオブジェクト
+
+    Returns:
+        (画像データ, MIME タイプ, 拡張子)
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise ThumbnailError(f'サムネイルの作成には Pillow が必要です: {e}')
+
+    try:
+        with Image.open(source) as image:
+            # JPEG は縮小した解像度で直接デコードし、大きな写真でもメモリと時間を抑える
+            image.draft('RGB', (THUMBNAIL_MAX_SIZE * 2, THUMBNAIL_MAX_SIZE * 2))
+            return _encode(ImageOps.exif_transpose(image))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f'画像を読み込めません: {e}')
+
+
+def _extract_frame(source, second):
+    command = [
+        settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+        '-ss', str(second), '-i', str(source),
+        '-frames:v', '1',
+        '-vf', f"scale='min({THUMBNAIL_MAX_SIZE},iw)':-2",
+        '-f', 'image2pipe', '-vcodec', 'png', '-',
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise ThumbnailError('ポスターフレームの切り出しがタイムアウトしました')
+    if result.returncode != 0:
+        raise ThumbnailError(f'ffmpeg がエラーになりました: {result.stderr.decode(errors="replace").strip()[:500]}')
+    return result.stdout
+
+
+def video_poster(source):
+    """
+    動画のポスターフレームを作る
+
+    ffmpeg で POSTER_FRAME_SECOND 秒の位置のフレームを縮小して切り出す。
+    URL を渡した場合、ffmpeg は Range リクエストで必要な部分だけを読み込む。
+
+    Args:
+        source: 動画ファイルのパスまたはURL
+
+    Returns:
+        (画像データ, MIME タイプ, 拡張子)
+    """
+    if not shutil.which(settings.FFMPEG_BINARY):
+        raise ThumbnailError(f'ポスターフレームの作成には ffmpeg が必要です（{settings.FFMPEG_BINARY} が見つかりません）')
+    frame = _extract_frame(source, POSTER_FRAME_SECOND)
+    if not frame:
+        # 指定した位置より短い動画は先頭のフレームを使う
+        frame = _extract_frame(source, 0)
+    if not frame:
+        raise ThumbnailError('動画からフレームを取り出せませんでした')
+    return image_thumbnail(io.BytesIO(frame))
+
+
+def create_thumbnail(source, kind):
+    """
+    画像・動画からサムネイルを作る
+
+    Args:
+        source: ファイルのパス（動画の場合は URL も可）
+        kind: 'image' または 'video'
+
+    Returns:
+        (画像データ, MIME タイプ, 拡張子)
+    """
+    if kind == 'video':
+        return video_poster(source)
+    return image_thumbnail(source)
+
+
+def upload_thumbnail(source, kind, bucket_name, object_name):
+    """
+    サムネイルを作り、元のファイルと同じバケットに置く
+
+    Args:
+        source: 元のファイルのパス（動画の場合は URL も可）
+        kind: 'image' または 'video'
+        bucket_name: 元のファイルのバケット名
+        object_name: 元のファイルのオブジェクト名
+
+    Returns:
+        サムネイルの公開URL
+    """
+    data, content_type, extension = create_thumbnail(source, kind)
+    name = thumbnail_object_name(object_name, extension)
+    return get_storage_client().upload(File(io.BytesIO(data), name=name), bucket_name, name, content_type=content_type)
+
+
+def thumbnail_for_url(file_url, kind):
+    """
+    公開済みのファイルからサムネイルを作ってアップロードする（既存データの補完用）
+
+    動画は URL のまま ffmpeg に渡し、画像は一時ファイルにダウンロードしてから縮小する。
+
+    Args:
+        file_url: 元のファイルの公開URL
+        kind: 'image' または 'video'
+
+    Returns:
+        サムネイルの公開URL
+    """
+    location = parse_public_url(file_url)
+    if location is None:
+        raise ThumbnailError(f'ストレージのURLではありません: {file_url}')
+    bucket_name, object_name = location
+    if kind == 'video':
+        return upload_thumbnail(file_url, kind, bucket_name, object_name)
+
+    with tempfile.TemporaryFile() as f:
+        try:
+            get_storage_client().download(bucket_name, object_name, f, max_size=MAX_SOURCE_IMAGE_SIZE)
+        except ValueError:
+            raise ThumbnailError(f'画像が大きすぎます（{MAX_SOURCE_IMAGE_SIZE // (1024 * 1024)}MB 超）')
+        f.seek(0)
+        return upload_thumbnail(f, kind, bucket_name, object_name)
@@ -1,11 +1,12 @@
 # language_archive/utils.py
 
-import requests
+from . import geocoding
+
 
 def geocode_address(address):
     """
     住所を緯度・経度に変換する（ジオコーディング）
-    国土地理院APIを使用
+    国土地理院APIを使用し、結果はキャッシュする（geocoding.geocode を参照）
     
     Args:
         address: 住所文字列
@@ -13,27 +14,13 @@ def geocode_address(address):
     Returns:
         (緯度, 経度) のタプル。失敗時は (None, None)
     """
-    try:
-        url = f"https://msearch.gsi.go.jp/address-search/AddressSearch?q={address}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        if data and len(data) > 0:
-            # 最初の結果を使用
-            coordinates = data[0]['geometry']['coordinates']
-            # 地理院APIは[経度, 緯度]の順で返すので、順序を入れ替える
-            return coordinates[1], coordinates[0]  # 緯度, 経度
-        else:
-            return None, None
-    except Exception as e:
-        print(f"ジオコーディングエラー: {e}")
-        return None, None
+    return geocoding.geocode(address) or (None, None)
 
 
 def reverse_geocode(lat, lon):
     """
     緯度・経度を住所に変換する（逆ジオコーディング）
-    国土地理院APIを使用
+    国土地理院APIを使用し、結果はキャッシュする（geocoding.reverse_geocode を参照）
     
     Args:
         lat: 緯度
@@ -42,26 +29,7 @@ def reverse_geocode(lat, lon):
     Returns:
         住所文字列。失敗時は座標を文字列で返す
     """
-    try:
-        url = f"https://mreversegeocoder.gsi.go.jp/reverse-geocoder/LonLatToAddress"
-        params = {'lat': lat, 'lon': lon}
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if data and 'results' in data:
-            result = data['results']
-            
-            # 住所情報を組み立て
-            if 'muniCd' in result and 'lv01Nm' in result:
-                address = result.get('lv01Nm', '')
-                return address
-            else:
-                return f"緯度: {lat}, 経度: {lon}"
-        else:
-            return f"緯度: {lat}, 経度: {lon}"
-    except Exception as e:
-        print(f"逆ジオコーディングエラー: {e}")
-        return f"緯度: {lat}, 経度: {lon}"
+    return geocoding.reverse_geocode(lat, lon) or f"緯度: {lat}, 経度: {lon}"
 
 
 def format_speaker_info(speaker):
@@ -82,7 +50,6 @@ def format_speaker_info(speaker):
         'age_range': speaker.age_range,
         'gender': speaker.get_gender_display(),
         'village': speaker.village.name if speaker.village else '不明',
-        'language_frequency': speaker.get_language_frequency_display(),
     }
 
 
@@ -98,14 +65,16 @@ def format_record_for_api(record):
     """
     return {
         'id': record.id,
-        'title': record.title,
         'onomatopoeia': record.onomatopoeia_text,
+        'mora_pattern': record.mora_pattern,
         'meaning': record.meaning,
         'usage_example': record.usage_example,
         'phonetic_notation': record.phonetic_notation,
+        'language_frequency': record.get_language_frequency_display(),
         'file_type': record.file_type,
         'file_path': record.file_path,
         'thumbnail_path': record.thumbnail_path,
+        'upload_status': record.upload_status,
         'speaker': format_speaker_info(record.speaker),
         'village': {
             'id': record.village.id if record.village else None,
@@ -1,25 +1,48 @@
 # language_archive/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import condition
 from django.db.models.functions import TruncYear
 from django.db.models import Count, Q
-from .models import LanguageRecord, GeographicRecord, Village, OnomatopoeiaType, Speaker
+from django.db import transaction
+from .models import LanguageRecord, GeographicRecord, Village, OnomatopoeiaType, Speaker, UploadJob, AudioWaveform
 from .forms import LanguageRecordForm, GeographicRecordForm
-from .services import upload_to_supabase, get_bucket_name, create_archive_map
-from .utils import reverse_geocode, format_record_for_api
+from .services import get_bucket_name, create_archive_map, find_nearest_village, parse_public_url
+from .utils import reverse_geocode
+from .pagination import paginate_by_cursor
+from .search import SearchResults, SEARCH_PAGE_SIZE
+from .caching import cache_page_for_anonymous, get_or_build, versioned_key
+from .jobs import enqueue_upload
+from .waveforms import waveform_levels
+from .archive_stats import get_statistics
+from . import rollup
+from . import api_v2
+from . import documents
+from .exports import (
+    EXPORT_FORMATS, ExportError, export_filename, filter_geographic_records,
+    filter_language_records, stream_export,
+)
+from .media_cache import MediaCacheError, MediaNotCached, media_response, open_media
+from . import clusters
+import logging
+import math
 import requests
 import urllib.parse
 import os
 import datetime
 
+logger = logging.getLogger(__name__)
+
+
+@cache_page_for_anonymous
 def index(request):
     """トップページ"""
-    # 統計情報を取得
-    total_records = LanguageRecord.objects.count()
-    total_villages = LanguageRecord.objects.filter(speaker__village__isnull=False).values('speaker__village').distinct().count()
-    total_speakers = Speaker.objects.count()
+    # 統計情報は集計テーブルから読み込む（記録の登録・削除時にシグナルで更新される）
+    statistics = get_statistics()
     
     # 最近の言語記録
     recent_records = LanguageRecord.objects.select_related(
@@ -27,19 +50,38 @@ def index(request):
     ).order_by('-created_at')[:6]
     
     context = {
-        'total_records': total_records,
-        'total_villages': total_villages,
-        'total_speakers': total_speakers,
+        'total_records': statistics['total_records'],
+        'total_villages': statistics['total_villages'],
+        'total_speakers': statistics['total_speakers'],
+        'file_type_counts': [
+            (label, statistics['file_types'].get(value, 0))
+            for value, label in LanguageRecord.FILE_TYPE_CHOICES
+        ],
         'recent_records': recent_records,
     }
     return render(request, 'language_archive/index.html', context)
 
 
-def map_view(request):
-    """地図ビュー"""
+def _filter_map_data(selected_year):
+    """地図に表示する地理環境データと話者を年で絞り込む"""
     geographic_records = GeographicRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
-    speakers = Speaker.objects.select_related('village').filter(village__isnull=False)
+    speakers = Speaker.objects.filter(village__isnull=False)
+
+    if selected_year:
+        geographic_records = geographic_records.filter(captured_date__year=selected_year)
+        speakers_with_records_in_year = LanguageRecord.objects.filter(recorded_date__year=selected_year).values_list('speaker_id', flat=True)
+        speakers = speakers.filter(id__in=speakers_with_records_in_year)
 
+    return geographic_records, speakers
+
+
+def _selected_year(request):
+    selected_year = request.GET.get('year')
+    return int(selected_year) if selected_year and selected_year.isdigit() else None
+
+
+def map_view(request):
+    """地図ビュー"""
     # データベースから存在する年をすべて取得
     lang_years = LanguageRecord.objects.annotate(year=TruncYear('recorded_date')).values_list('year', flat=True).distinct()
     geo_years = GeographicRecord.objects.annotate(year=TruncYear('captured_date')).values_list('year', flat=True).distinct()
@@ -47,25 +89,122 @@ def map_view(request):
     # setを使って重複をなくし、降順にソート
     all_years = sorted(list(set([y.year for y in lang_years if y] + [y.year for y in geo_years if y])), reverse=True)
 
-    # フィルター処理
-    selected_year = request.GET.get('year')
-    if selected_year:
-        geographic_records = geographic_records.filter(captured_date__year=selected_year)
-        speakers_with_records_in_year = LanguageRecord.objects.filter(recorded_date__year=selected_year).values_list('speaker_id', flat=True)
-        speakers = speakers.filter(id__in=speakers_with_records_in_year)
+    selected_year = _selected_year(request)
 
-    map_html = create_archive_map(
-        geographic_records=geographic_records,
-        speakers=speakers
-    )
+    # 従来のサーバー側描画（folium）は ?renderer=folium で利用できる
+    map_html = None
+    if request.GET.get('renderer') == 'folium':
+        def build_map():
+            geographic_records, speakers = _filter_map_data(selected_year)
+            return create_archive_map(
+                geographic_records=geographic_records,
+                speakers=speakers.select_related('village')
+            )
+
+        # 地図HTMLはデータ世代番号と年ごとにキャッシュする
+        map_html = get_or_build(versioned_key('archive_map', selected_year or 'all'), build_map)
 
     context = {
         'map_html': map_html,
         'all_years': all_years,
-        'selected_year': int(selected_year) if selected_year else None,
+        'selected_year': selected_year,
     }
     return render(request, 'language_archive/map.html', context)
 
+
+def _parse_bbox(value):
+    """
+    「<西>,<南>,<東>,<北>」形式の表示範囲を数値の組に変換する（不正な場合は ValueError）
+
+    nan・inf は受け付けず、経度は ±180、緯度は ±90 の範囲に収める。
+    """
+    west, south, east, north = (float(v) for v in value.split(','))
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        raise ValueError(value)
+    west, east = (min(max(v, -180.0), 180.0) for v in (west, east))
+    south, north = (min(max(v, -90.0), 90.0) for v in (south, north))
+    return west, south, east, north
+
+
+def map_features_api(request):
+    """
+    地図に表示する地点を GeoJSON で返すAPI（ポップアップの内容は含めない）
+
+    ?bbox=<西>,<南>,<東>,<北> を指定すると表示範囲内の地点だけを返す。
+    """
+    geographic_records, speakers = _filter_map_data(_selected_year(request))
+
+    if request.GET.get('bbox'):
+        try:
+            west, south, east, north = _parse_bbox(request.GET['bbox'])
+        except ValueError:
+            return JsonResponse({'error': 'bbox=<西>,<南>,<東>,<北> の形式で指定してください'}, status=400)
+        geographic_records = geographic_records.in_bbox(west, south, east, north)
+        speakers = speakers.filter(
+            village__latitude__gte=south, village__latitude__lte=north,
+            village__longitude__gte=west, village__longitude__lte=east,
+        )
+
+    features = []
+    for record_id, content_type, lat, lon in geographic_records.values_list(
+        'id', 'content_type', 'latitude', 'longitude'
+    ):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+            'properties': {'kind': 'geo', 'id': record_id, 'content_type': content_type},
+        })
+    for speaker_id, lat, lon in speakers.values_list('id', 'village__latitude', 'village__longitude'):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+            'properties': {'kind': 'speaker', 'id': speaker_id},
+        })
+
+    response = JsonResponse({'type': 'FeatureCollection', 'features': features})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def map_clusters_api(request):
+    """
+    表示範囲とズームレベルに応じた地図クラスタを返すAPI
+
+    ?z=<ズームレベル>&bbox=<西>,<南>,<東>,<北>
+    CLUSTER_MAX_ZOOM を超えるズームでは個別の地点を返す。
+    """
+    try:
+        zoom = int(request.GET.get('z', clusters.MIN_ZOOM))
+        west, south, east, north = _parse_bbox(request.GET.get('bbox', ''))
+    except ValueError:
+        return JsonResponse({'error': 'z と bbox=<西>,<南>,<東>,<北> を指定してください'}, status=400)
+
+    if zoom > clusters.CLUSTER_MAX_ZOOM:
+        features = clusters.points_in_bbox(west, south, east, north)
+    else:
+        features = clusters.clusters_in_bbox(zoom, west, south, east, north)
+
+    response = JsonResponse({'type': 'FeatureCollection', 'features': features})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def map_popup(request, kind, object_id):
+    """地図マーカーのポップアップ（クリック時に取得するHTML断片）"""
+    if kind == 'geo':
+        context = {'geo': get_object_or_404(GeographicRecord, id=object_id)}
+    elif kind == 'speaker':
+        context = {'speaker': get_object_or_404(Speaker.objects.select_related('village'), id=object_id)}
+    elif kind == 'village':
+        village = get_object_or_404(Village, id=object_id)
+        context = {'village': village, 'village_speakers': Speaker.objects.filter(village=village).order_by('speaker_id')}
+    else:
+        raise Http404
+    response = render(request, 'language_archive/map_popup.html', context)
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
+
 def upload_language_record(request):
     """言語記録のアップロード"""
     if request.method == 'POST':
@@ -78,17 +217,17 @@ def upload_language_record(request):
                 try:
                     record = form.save(commit=False)
                     
-                    # Supabaseにアップロード
+                    # ファイルは一時保存し、Supabaseへのアップロードはワーカーが行う
                     file_type = form.cleaned_data['file_type']
                     bucket_name = get_bucket_name(file_type)
-                    public_url = upload_to_supabase(file, bucket_name, f"language/{file_type}/")
+                    record.upload_status = 'pending'
+                    with transaction.atomic():
+                        record.save()
+                        form.save_m2m() # ManyToManyフィールドがあれば保存
+                        enqueue_upload(record, file, bucket_name, f"language/{file_type}/")
                     
-                    record.file_path = public_url
-                    record.save()
-                    form.save_m2m() # ManyToManyフィールドがあれば保存
-                    
-                    messages.success(request, '言語記録をアップロードしました。')
-                    return redirect('record_list')
+                    messages.success(request, '言語記録を登録しました。ファイルはバックグラウンドでアップロードされます。')
+                    return redirect('record_detail', record_id=record.id)
                 except Exception as e:
                     messages.error(request, f'アップロードエラー: {str(e)}')
             else:
@@ -122,19 +261,22 @@ def upload_geographic_record(request):
                     if lat and lon:
                         record.latitude = lat
                         record.longitude = lon
+                        # 集落が未選択の場合は座標から最寄りの集落を割り当てる
+                        if not village:
+                            record.village = find_nearest_village(lat, lon)
                     elif village:
                         record.latitude = village.latitude
                         record.longitude = village.longitude
 
-                    # Supabaseにアップロード
+                    # ファイルは一時保存し、Supabaseへのアップロードはワーカーが行う
                     content_type = form.cleaned_data['content_type']
                     bucket_name = get_bucket_name(content_type)
-                    public_url = upload_to_supabase(file, bucket_name, f"geographic/{content_type}/")
-                    
-                    record.file_path = public_url
-                    record.save()
+                    record.upload_status = 'pending'
+                    with transaction.atomic():
+                        record.save()
+                        enqueue_upload(record, file, bucket_name, f"geographic/{content_type}/")
                     
-                    messages.success(request, '地理環境データをアップロードしました。')
+                    messages.success(request, '地理環境データを登録しました。ファイルはバックグラウンドでアップロードされます。')
                     return redirect('geographic_list')
                 except Exception as e:
                     messages.error(request, f'アップロードエラー: {str(e)}')
@@ -149,33 +291,37 @@ def upload_geographic_record(request):
     return render(request, 'language_archive/upload_geographic.html', context)
 
 
+def _export_query(request):
+    """一覧の絞り込み条件を引き継いだダウンロード用のクエリ文字列（format は含めない）"""
+    params = request.GET.copy()
+    for key in ('after', 'before', 'format'):
+        params.pop(key, None)
+    return params.urlencode()
+
+
+@cache_page_for_anonymous
 def record_list(request):
     """言語記録一覧"""
     records = LanguageRecord.objects.select_related(
-        'speaker', 'onomatopoeia_type', 'village'
+        'speaker', 'speaker__village', 'onomatopoeia_type', 'village'
     ).all()
     
-    # フィルタリング
-    village_id = request.GET.get('village')
-    file_type = request.GET.get('file_type')
-    onomatopoeia_type_code = request.GET.get('onomatopoeia_type')
-    
-    if village_id:
-        records = records.filter(speaker__village_id=village_id)
-    if file_type:
-        records = records.filter(file_type=file_type)
-    if onomatopoeia_type_code:
-        records = records.filter(onomatopoeia_type__type_code=onomatopoeia_type_code)
+    # フィルタリング（書き出しと同じ条件）
+    records = filter_language_records(records, request.GET)
     
     village_ids_with_records = LanguageRecord.objects.filter(speaker__village__isnull=False).values_list('speaker__village_id', flat=True).distinct()
     villages = Village.objects.filter(id__in=village_ids_with_records).order_by('-name')
 
     onomatopoeia_types = OnomatopoeiaType.objects.all()
+
+    page = paginate_by_cursor(records, request, 'recorded_date')
     
     context = {
-        'records': records,
+        'records': page.object_list,
+        'page': page,
         'villages': villages,
         'onomatopoeia_types': onomatopoeia_types,
+        'export_query': _export_query(request),
     }
     return render(request, 'language_archive/record_list.html', context)
 
@@ -188,85 +334,274 @@ def record_detail(request, record_id):
     )
     
     context = {'record': record}
+    if record.file_type == 'audio':
+        context['has_waveform'] = AudioWaveform.objects.filter(record_id=record.id).exists()
+    if record.upload_status != 'ready':
+        context['upload_job'] = record.upload_jobs.order_by('-created_at').first()
     return render(request, 'language_archive/record_detail.html', context)
 
 
+@cache_page_for_anonymous
 def geographic_list(request):
     """地理環境データ一覧"""
     geo_records = GeographicRecord.objects.select_related('village').all()
     
-    # フィルタリング
-    content_type = request.GET.get('content_type')
-    village_id = request.GET.get('village')
-    
-    if content_type:
-        geo_records = geo_records.filter(content_type=content_type)
-    if village_id:
-        geo_records = geo_records.filter(village_id=village_id)
+    # フィルタリング（書き出しと同じ条件）
+    geo_records = filter_geographic_records(geo_records, request.GET)
     
     villages = Village.objects.all()
+
+    page = paginate_by_cursor(geo_records, request, 'captured_date')
     
     context = {
-        'geo_records': geo_records,
+        'geo_records': page.object_list,
+        'page': page,
         'villages': villages,
+        'export_query': _export_query(request),
     }
     return render(request, 'language_archive/geographic_list.html', context)
 
 
+@cache_page_for_anonymous
 def village_records(request, village_id):
     """特定集落の言語記録一覧"""
     village = get_object_or_404(Village, id=village_id)
     records = LanguageRecord.objects.filter(speaker__village=village).select_related(
         'speaker', 'onomatopoeia_type'
     )
+    page = paginate_by_cursor(records, request, 'recorded_date')
     
     context = {
         'village': village,
-        'records': records,
+        'records': page.object_list,
+        'page': page,
     }
     return render(request, 'language_archive/village_records.html', context)
 
+@cache_page_for_anonymous
 def speaker_records(request, speaker_id):
     """特定話者の言語記録一覧"""
-    speaker = get_object_or_404(Speaker, id=speaker_id)
+    speaker = get_object_or_404(Speaker.objects.select_related('village'), id=speaker_id)
     records = LanguageRecord.objects.filter(speaker=speaker).select_related(
         'onomatopoeia_type'
     )
+    page = paginate_by_cursor(records, request, 'recorded_date')
     
     context = {
         'speaker': speaker,
-        'records': records,
+        'records': page.object_list,
+        'page': page,
     }
     return render(request, 'language_archive/speaker_records.html', context)
 
 
 def get_village_records_api(request, village_id):
-    """集落の言語記録を取得するAPI"""
-    records = LanguageRecord.objects.filter(speaker__village_id=village_id).select_related(
-        'speaker', 'onomatopoeia_type'
-    )
-    
-    data = [format_record_for_api(record) for record in records]
-    return JsonResponse(data, safe=False)
+    """集落の言語記録を取得するAPI（整形済みのJSONを連結して返す）"""
+    records = LanguageRecord.objects.filter(speaker__village_id=village_id)
+
+    pattern = request.GET.get('pattern', '').strip().upper()
+    if pattern:
+        records = records.filter(mora_pattern=pattern)
+
+    record_ids = list(records.values_list('id', flat=True))
+    return HttpResponse(documents.join_documents(record_ids), content_type='application/json')
 
 
 def search_records(request):
     """言語記録の検索"""
-    query = request.GET.get('q', '')
-    records = LanguageRecord.objects.select_related(
+    query = request.GET.get('q', '').strip()
+
+    results = SearchResults(query, LanguageRecord.objects.select_related(
         'speaker', 'village', 'onomatopoeia_type'
-    )
-    
-    if query:
-        records = records.filter(
-            Q(onomatopoeia_text__icontains=query) |
-            Q(meaning__icontains=query) |
-            Q(title__icontains=query)
-        )
+    ))
+    page = Paginator(results, SEARCH_PAGE_SIZE).get_page(request.GET.get('page'))
     
     context = {
-        'records': records,
+        'records': page.object_list,
+        'page': page,
         'query': query,
     }
     return render(request, 'language_archive/search_results.html', context)
 
+
+def upload_job_status_api(request, job_id):
+    """アップロードジョブの進捗を返すAPI"""
+    job = get_object_or_404(UploadJob, id=job_id)
+    record = job.record
+    response = JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'bytes_sent': job.bytes_sent,
+        'size': job.size,
+        'attempts': job.attempts,
+        'error': job.error if job.status != 'done' else '',
+        'file_path': record.file_path if record and job.status == 'done' else '',
+    })
+    patch_cache_control(response, no_cache=True, no_store=True)
+    return response
+
+
+def _waveform_etag(request, record_id):
+    updated_at = AudioWaveform.objects.filter(record_id=record_id).values_list('updated_at', flat=True).first()
+    return f'{record_id}-{updated_at.timestamp()}' if updated_at else None
+
+
+@condition(etag_func=_waveform_etag)
+def record_waveform_api(request, record_id):
+    """
+    音声の波形ピークを返すAPI
+
+    ?width= を指定すると、その幅以上で最も小さい解像度だけを返す。
+    ピークは -127〜127 の (最小値, 最大値) の組を並べたもの。
+    """
+    waveform = get_object_or_404(AudioWaveform, record_id=record_id)
+    try:
+        width = int(request.GET.get('width', 0))
+    except ValueError:
+        width = 0
+    response = JsonResponse({
+        'duration': waveform.duration,
+        'levels': [
+            {'resolution': resolution, 'peaks': peaks}
+            for resolution, peaks in waveform_levels(waveform, width).items()
+        ],
+    })
+    # 波形は作り直したときだけ変わるため、ETag で再検証させつつ長めにキャッシュする
+    patch_cache_control(response, public=True, max_age=60 * 60)
+    return response
+
+
+def export_records(request, kind):
+    """
+    記録を CSV / JSON Lines / Parquet で一括ダウンロードする
+
+    一覧ページと同じ絞り込み条件（クエリ文字列）を受け付け、
+    少しずつ読み込みながら返すため、件数に関係なくメモリ使用量は一定。
+    """
+    if kind not in ('language', 'geographic'):
+        raise Http404
+    export_format = request.GET.get('format', 'csv')
+    try:
+        content = stream_export(kind, export_format, request.GET)
+    except ExportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, export_format)}"'
+    return response
+
+
+def media_file(request, kind, object_id):
+    """
+    記録のメディアファイルを返す（ストレージの前段のローカルキャッシュから配信）
+
+    Range・ETag・Last-Modified に対応し、?download=1 でダウンロードさせる。
+    ストレージ外のURL（YouTube など）やキャッシュできない大きなファイルは、元のURLへ転送する。
+    キャッシュにないファイルは取得をバックグラウンドで始め、その間は元のURLへ転送する。
+    """
+    models = {'language': LanguageRecord, 'geographic': GeographicRecord}
+    if kind not in models:
+        raise Http404
+    file_path = models[kind].objects.filter(
+        id=object_id, upload_status='ready',
+    ).exclude(file_path='').values_list('file_path', flat=True).first()
+    if file_path is None:
+        raise Http404
+
+    location = parse_public_url(file_path)
+    if location is None:
+        return redirect(file_path)
+    try:
+        media = open_media(*location)
+    except MediaNotCached:
+        return redirect(file_path)
+    except (MediaCacheError, OSError) as e:
+        # キャッシュが使えなくても再生できるよう、ストレージから直接取得させる
+        logger.warning('メディアファイルをキャッシュから返せません: %s: %s', file_path, e)
+        return redirect(file_path)
+    return media_response(request, media, as_attachment=request.GET.get('download') == '1')
+
+
+def _stats_filters(request):
+    """クエリ文字列から集計キューブの絞り込み条件を作る（型は型コードでも指定できる）"""
+    filters = {}
+    for name in rollup.DIMENSIONS:
+        values = [value for value in ','.join(request.GET.getlist(name)).split(',') if value != '']
+        if not values:
+            continue
+        if name == 'type':
+            codes = [value for value in values if not value.isdigit()]
+            ids = dict(OnomatopoeiaType.objects.filter(type_code__in=codes).values_list('type_code', 'id'))
+            values = [str(ids.get(value, -1)) if value in codes else value for value in values]
+        filters[name] = values
+    return filters
+
+
+def stats_api(request):
+    """
+    言語記録のクロス集計API（事前集計した集計キューブから答える）
+
+    ?group_by=age_range,frequency で集計する次元を指定し、
+    village・type・frequency・age_range・year（カンマ区切りで複数可）で絞り込む。
+    例: /api/stats/?group_by=year&type=AABB
+    """
+    group_by = [name for name in request.GET.get('group_by', '').split(',') if name]
+    try:
+        rows = rollup.query(group_by, _stats_filters(request))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    labels = rollup.dimension_labels() if group_by else {}
+    for row in rows:
+        for name in group_by:
+            row[f'{name}_label'] = labels[name].get(row[name], str(row[name]))
+    response = JsonResponse({
+        'group_by': group_by,
+        'total': sum(row['count'] for row in rows),
+        'rows': rows,
+    })
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def _api_v2_response(request, builder, names):
+    """API v2 の本文を ETag 付きで返す（If-None-Match が一致すれば 304）"""
+    try:
+        rendered = api_v2.cached_render(request.path, request.GET, builder, names)
+    except api_v2.ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    etag = rendered['etag']
+    response = get_conditional_response(request, etag=etag) if etag else None
+    if response is None:
+        response = HttpResponse(rendered['content'], status=rendered['status'],
+                                content_type='application/json; charset=utf-8')
+    if etag:
+        response['ETag'] = etag
+    # 公開データなので共有キャッシュにも置かせるが、毎回 ETag で再検証させる
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def api_v2_list(request, resource):
+    """
+    言語記録・話者・集落・地理環境データの一覧API（v2）
+
+    ?fields=id,onomatopoeia,village_name で返す項目を選び（all で全項目）、
+    ?cursor= に前のページの next_cursor を渡して続きを取得する。
+    ?ids=1,2,3 でまとめて取得、?limit= で件数（最大 500）を指定できる。
+    絞り込み条件は一覧ページと同じ（records は village・file_type・onomatopoeia_type・pattern・speaker）。
+    """
+    if resource not in api_v2.API_FIELDS:
+        raise Http404
+    return _api_v2_response(request, lambda: api_v2.build_page(resource, request.GET),
+                            api_v2.query_parameters(resource))
+
+
+def api_v2_detail(request, resource, object_id):
+    """1件分のAPI（v2）。?fields= は一覧と同じ"""
+    if resource not in api_v2.API_FIELDS:
+        raise Http404
+    return _api_v2_response(request, lambda: api_v2.build_detail(resource, object_id, request.GET), ('fields',))
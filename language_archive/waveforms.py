@@ -0,0 +1,319 @@
+# language_archive/waveforms.py
+
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import wave
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .models import AudioWaveform
+
+# 保存する波形の解像度（ピーク数）。表示幅に近いものをクライアントが選ぶ
+WAVEFORM_RESOLUTIONS = (2048, 1024, 512, 256, 128)
+
+# デコード中に集計する細かいブロックの数（1秒あたり）。最後に各解像度へまとめる
+BLOCKS_PER_SECOND = 2000
+
+# 保持するブロック数の上限。超えたら隣り合うブロックを統合してブロックの長さを倍にする
+MAX_BLOCKS = 32 * 1024
+
+# 一度に読み込むフレーム数
+READ_FRAMES = 64 * 1024
+
+# ffmpeg でデコードするときのサンプリング周波数（波形の表示には十分）
+FFMPEG_SAMPLE_RATE = 8000
+# デコード全体の制限時間（秒）。超えたら ffmpeg を終了させる
+FFMPEG_TIMEOUT = 300
+
+
+class AudioDecodeError(Exception):
+    """音声をデコードできないエラー"""
+
+
+class WavDecoder:
+    """非圧縮 PCM の WAV を標準ライブラリで読み込むデコーダー"""
+
+    SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+    # 標準ライブラリの wave が読める形式（整数 PCM）。float・WAVE_FORMAT_EXTENSIBLE は次のデコーダーに任せる
+    WAVE_FORMAT_PCM = 1
+
+    def can_decode(self, path):
+        """fmt チャンクの形式が整数 PCM の WAV だけを受け付ける"""
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return False
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return False
+                chunk_id, size = struct.unpack('<4sI', chunk)
+                if chunk_id == b'fmt ':
+                    data = f.read(2)
+                    return len(data) == 2 and struct.unpack('<H', data)[0] == self.WAVE_FORMAT_PCM
+                # チャンクは偶数バイト境界に揃えられている
+                f.seek(size + size % 2, 1)
+
+    def decode(self, path):
+        """
+        音声をモノラルのサンプル列として順に読み込む
+
+        Returns:
+            (サンプリング周波数, -1.0〜1.0 の float32 配列を順に返すイテレーター)
+        """
+        try:
+            reader = wave.open(str(path), 'rb')
+        except (wave.Error, EOFError) as e:
+            raise AudioDecodeError(f'WAV ファイルを読み込めません: {e}')
+        width = reader.getsampwidth()
+        if width not in self.SAMPLE_TYPES and width != 3:
+            reader.close()
+            raise AudioDecodeError(f'{width * 8} ビットの WAV には対応していません')
+        return reader.getframerate(), self._chunks(reader, width, reader.getnchannels())
+
+    def _chunks(self, reader, width, channels):
+        with reader:
+            while True:
+                data = reader.readframes(READ_FRAMES)
+                if not data:
+                    break
+                if width == 3:
+                    # 24 ビットは下位に 0 を補って 32 ビットとして扱う
+                    raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+                    padded = np.zeros((len(raw), 4), dtype=np.uint8)
+                    padded[:, 1:] = raw
+                    samples = padded.view('<i4').ravel().astype(np.float32) / 2 ** 31
+                elif width == 1:
+                    samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+                else:
+                    dtype = self.SAMPLE_TYPES[width]
+                    samples = np.frombuffer(data, dtype=f'<{np.dtype(dtype).str[1:]}').astype(np.float32) / np.iinfo(dtype).max
+                yield samples.reshape(-1, channels).mean(axis=1)
+
+
+class FFmpegDecoder:
+    """MP3・AAC など WAV 以外の形式を ffmpeg で PCM に変換して読み込むデコーダー"""
+
+    def can_decode(self, path):
+        return shutil.which(settings.FFMPEG_BINARY) is not None
+
+    def decode(self, path):
+        """
+        音声をモノラルのサンプル列として順に読み込む
+
+        Returns:
+            (サンプリング周波数, -1.0〜1.0 の float32 配列を順に返すイテレーター)
+        """
+        command = [
+            settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+            '-i', str(path), '-vn', '-ac', '1', '-ar', str(FFMPEG_SAMPLE_RATE),
+            '-f', 's16le', '-',
+        ]
+        return FFMPEG_SAMPLE_RATE, self._chunks(command)
+
+    def _chunks(self, command):
+        # stderr はパイプにすると読まないうちに詰まって止まるため、一時ファイルに書かせる
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+            # 出力が止まった場合も読み込みが終わるよう、制限時間で ffmpeg を終了させる
+            timed_out = threading.Event()
+
+            def kill():
+                timed_out.set()
+                process.kill()
+
+            timer = threading.Timer(FFMPEG_TIMEOUT, kill)
+            timer.daemon = True
+            timer.start()
+            try:
+                while True:
+                    data = process.stdout.read(READ_FRAMES * 2)
+                    if not data:
+                        break
+                    # 奇数バイトで切れた場合の端数は捨てる（最大1サンプル）
+                    data = data[:len(data) // 2 * 2]
+                    yield np.frombuffer(data, dtype='<i2').astype(np.float32) / 32767
+                process.wait()
+                if timed_out.is_set():
+                    raise AudioDecodeError('音声のデコードがタイムアウトしました')
+                if process.returncode != 0:
+                    stderr.seek(0)
+                    error = stderr.read(500).decode(errors='replace').strip()
+                    raise AudioDecodeError(f'ffmpeg がエラーになりました: {error}')
+            finally:
+                timer.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+
+@lru_cache(maxsize=None)
+def get_decoders():
+    """settings.AUDIO_DECODERS に並べたデコーダーを順に返す"""
+    return tuple(import_string(path)() for path in settings.AUDIO_DECODERS)
+
+
+def decode_audio(path):
+    """
+    対応できるデコーダーで音声を読み込む
+
+    デコーダーが読み込みを始められなかった場合（AudioDecodeError）は次のデコーダーを試し、
+    すべて失敗した場合だけエラーにする。
+
+    Returns:
+        (サンプリング周波数, float32 配列を順に返すイテレーター)
+
+    Raises:
+        AudioDecodeError: どのデコーダーでも読み込めない
+    """
+    errors = []
+    for decoder in get_decoders():
+        if not decoder.can_decode(path):
+            continue
+        try:
+            return decoder.decode(path)
+        except AudioDecodeError as e:
+            errors.append(f'{type(decoder).__name__}: {e}')
+    if errors:
+        raise AudioDecodeError('音声を読み込めません（' + '、'.join(errors) + '）')
+    raise AudioDecodeError('この形式の音声を読み込めるデコーダーがありません')
+
+
+def _reduce(mins, maxs, resolution):
+    """細かいブロックのピークを resolution 個の区間にまとめる"""
+    resolution = min(resolution, len(mins))
+    starts = np.linspace(0, len(mins), resolution + 1).astype(np.int64)[:-1]
+    return np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+
+
+def _merge_pairs(values, reducer):
+    """隣り合う2ブロックを1つにまとめる（奇数個の場合、最後のブロックはそのまま残す）"""
+    even = len(values) // 2 * 2
+    merged = reducer(values[:even:2], values[1:even:2])
+    return np.concatenate([merged, values[even:]])
+
+
+def compute_peaks(sample_rate, chunks, resolutions=WAVEFORM_RESOLUTIONS):
+    """
+    サンプル列から複数解像度の波形ピークを求める
+
+    デコードしながら短いブロックごとの最小値・最大値だけを残し、ブロック数が
+    MAX_BLOCKS を超えるたびに隣り合うブロックを統合するため、
+    数秒の録音でも細かく、長い録音でも一定のメモリで計算できる。
+    ピークは最大振幅で正規化し、-127〜127 の int8 にする。
+
+    Args:
+        sample_rate: サンプリング周波数
+        chunks: float32 のサンプル配列を順に返すイテレーター
+        resolutions: 求める解像度（大きい順）
+
+    Returns:
+        {'duration', 'sample_rate', 'resolutions', 'peaks'} の辞書。peaks は各解像度の
+        (最小値, 最大値) の組を解像度順に連結した int8 のバイト列
+    """
+    block = max(1, sample_rate // BLOCKS_PER_SECOND)
+    mins = np.empty(0, dtype=np.float32)
+    maxs = np.empty(0, dtype=np.float32)
+    carry = np.empty(0, dtype=np.float32)
+    total = 0
+    for samples in chunks:
+        total += len(samples)
+        samples = np.concatenate([carry, samples]) if len(carry) else samples
+        usable = len(samples) // block * block
+        if usable:
+            blocks = samples[:usable].reshape(-1, block)
+            mins = np.concatenate([mins, blocks.min(axis=1)])
+            maxs = np.concatenate([maxs, blocks.max(axis=1)])
+        carry = samples[usable:]
+        while len(mins) > MAX_BLOCKS:
+            mins = _merge_pairs(mins, np.minimum)
+            maxs = _merge_pairs(maxs, np.maximum)
+            block *= 2
+    if len(carry):
+        mins = np.append(mins, carry.min())
+        maxs = np.append(maxs, carry.max())
+    if not total:
+        raise AudioDecodeError('音声にサンプルがありません')
+
+    amplitude = max(float(np.abs(mins).max()), float(np.abs(maxs).max())) or 1.0
+
+    levels = []
+    peaks = []
+    for resolution in resolutions:
+        level_mins, level_maxs = _reduce(mins, maxs, resolution)
+        if levels and len(level_mins) == levels[-1]:
+            # 録音が短く、これ以上細かくできない場合は同じ解像度を重ねて保存しない
+            continue
+        pairs = np.stack([level_mins, level_maxs], axis=1) / amplitude
+        levels.append(len(pairs))
+        peaks.append(np.clip(np.round(pairs * 127), -127, 127).astype(np.int8).tobytes())
+    return {
+        'duration': total / sample_rate,
+        'sample_rate': sample_rate,
+        'resolutions': levels,
+        'peaks': b''.join(peaks),
+    }
+
+
+def waveform_from_file(path):
+    """
+    音声ファイルから波形ピークを求める
+
+    Returns:
+        compute_peaks の戻り値
+    """
+    sample_rate, chunks = decode_audio(path)
+    return compute_peaks(sample_rate, chunks)
+
+
+def save_waveform(record, data):
+    """
+    波形ピークを言語記録に保存する
+
+    Args:
+        record: LanguageRecord
+        data: compute_peaks の戻り値
+
+    Returns:
+        AudioWaveform
+    """
+    waveform, _ = AudioWaveform.objects.update_or_create(
+        record=record,
+        defaults={
+            'duration': data['duration'],
+            'sample_rate': data['sample_rate'],
+            'resolutions': data['resolutions'],
+            'peaks': data['peaks'],
+        },
+    )
+    return waveform
+
+
+def waveform_levels(waveform, width=None):
+    """
+    保存した波形ピークを解像度ごとのリストに戻す
+
+    Args:
+        waveform: AudioWaveform
+        width: 表示幅（指定すると、それ以上で最も小さい解像度だけを返す）
+
+    Returns:
+        {解像度: [最小値, 最大値, 最小値, 最大値, ...]} の辞書
+    """
+    peaks = np.frombuffer(bytes(waveform.peaks), dtype=np.int8)
+    levels = {}
+    offset = 0
+    for resolution in waveform.resolutions:
+        levels[resolution] = peaks[offset:offset + resolution * 2].tolist()
+        offset += resolution * 2
+    if width and levels:
+        fitting = [resolution for resolution in levels if resolution >= width]
+        chosen = min(fitting) if fitting else max(levels)
+        return {chosen: levels[chosen]}
+    return levels